@@ -0,0 +1,174 @@
+# analytics.py - Campaign report metrics from a handful of grouped queries
+"""
+Metrics for the campaign report page. The report used to run one COUNT per
+hour of day, two per day of the trend, one per watch bucket and funnel step,
+well over 100 queries per view. Here each family of metrics is a single
+query.
+
+Counts, funnel steps, watch buckets and the hourly, daily and device
+breakdowns are sums over CampaignHourlyStats (see rollups.py), a few rows
+per hour of the campaign instead of one per scan. Distinct devices are
+estimated from the daily HyperLogLog sketches (device_sketch.py). Averages
+and browsers / OSes still aggregate the scan rows.
+
+Hours and days are bucketed in the current time zone (TIME_ZONE,
+Asia/Kolkata).
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Avg, Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, ExtractHour, Round, TruncDate
+from django.utils import timezone
+
+from .device_sketch import device_count
+from .histogram import bucket_conditions, bucket_index
+from .models import CampaignHourlyStats, ScanTracking
+
+# Half-open video percentage buckets of the watch distribution (see
+# histogram.py); the 50 edge is the "Video 50%+" funnel step
+WATCH_EDGES = (0, 25, 50, 75, 100)
+HALF_WATCHED = WATCH_EDGES.index(50)
+
+# (label, condition, CampaignHourlyStats field) per bucket, in display order
+WATCH_BUCKETS = list(zip(
+    ['0-25%', '25-50%', '50-75%', '75-100%', '100%'],
+    bucket_conditions('video_percentage', WATCH_EDGES),
+    ['watched_0_25', 'watched_25_50', 'watched_50_75', 'watched_75_100', 'watched_100'],
+))
+
+
+def watch_bucket_index(percentage):
+    """Index into WATCH_BUCKETS for a video percentage (Python side of the Qs)"""
+    return max(0, bucket_index(percentage, WATCH_EDGES))
+
+
+TREND_DAYS = 30
+
+
+def percentage(part, total):
+    """SQL expression for ``part`` as a percentage of ``total`` (2 places, 0 when empty)"""
+    return Case(
+        When(**{total: 0}, then=Value(0.0)),
+        default=Round(Cast(F(part), FloatField()) * 100 / F(total), 2),
+        output_field=FloatField(),
+    )
+
+
+def rollup_summary(stats):
+    """Headline counts, funnel steps and watch buckets from the hourly rollup"""
+    counters = ['scans', 'starts', 'completions', 'submissions']
+    counters += [field for _, _, field in WATCH_BUCKETS]
+    totals = stats.aggregate(**{field: Coalesce(Sum(field), 0) for field in counters})
+    return {
+        'total_scans': totals['scans'],
+        'form_submissions': totals['submissions'],
+        'video_completions': totals['completions'],
+        'video_started': totals['starts'],
+        'video_half': sum(totals[field] for _, _, field in WATCH_BUCKETS[HALF_WATCHED:]),
+        'bounces': totals['scans'] - totals['starts'],
+        'watch_distribution': {label: totals[field] for label, _, field in WATCH_BUCKETS},
+    }
+
+
+def scan_details(scans):
+    """The metrics the rollup can't answer: average watch time and depth"""
+    details = scans.aggregate(
+        avg_watch_time=Avg('video_watched', filter=~Q(video_watched=0)),
+        avg_video_percentage=Avg('video_percentage', filter=~Q(video_percentage=0)),
+    )
+    details['avg_watch_time'] = details['avg_watch_time'] or 0
+    details['avg_video_percentage'] = details['avg_video_percentage'] or 0
+    return details
+
+
+def hourly_device_counts(stats):
+    """
+    Scans per local hour of day (all 24 hours) and per device type, from one
+    GROUP BY over the rollup. Returns ({hour: scans}, device_stats).
+    """
+    hours = dict.fromkeys(range(24), 0)
+    devices = Counter()
+    rows = (
+        stats.order_by()
+        .values_list(ExtractHour('hour', tzinfo=timezone.get_current_timezone()), 'device_type')
+        .annotate(count=Sum('scans'))
+    )
+    for hour, device_type, count in rows:
+        hours[hour] += count
+        devices[device_type] += count
+    return hours, [{'device_type': k, 'count': v} for k, v in devices.most_common() if v]
+
+
+def daily_trend(stats, days=TREND_DAYS):
+    """Scans and submissions per local day for the last ``days`` days, today included"""
+    tz = timezone.get_current_timezone()
+    today = timezone.localdate()
+    first_day = today - timedelta(days=days - 1)
+
+    rows = (
+        stats.filter(hour__gte=datetime.combine(first_day, time.min, tzinfo=tz))
+        .order_by()
+        .values(day=TruncDate('hour', tzinfo=tz))
+        .annotate(scans=Sum('scans'), submissions=Sum('submissions'))
+    )
+    by_day = {row['day']: row for row in rows}
+
+    trend = []
+    for i in range(days):
+        day = first_day + timedelta(days=i)
+        row = by_day.get(day, {})
+        trend.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'scans': row.get('scans', 0),
+            'submissions': row.get('submissions', 0),
+        })
+    return trend
+
+
+def platform_stats(scans, top=5):
+    """Top browsers and OSes from one GROUP BY over both, as lists of dicts"""
+    browsers, systems = Counter(), Counter()
+    rows = scans.order_by().values_list('browser', 'os').annotate(count=Count('id'))
+    for browser, os, count in rows:
+        browsers[browser] += count
+        systems[os] += count
+
+    return (
+        [{'browser': k, 'count': v} for k, v in browsers.most_common(top)],
+        [{'os': k, 'count': v} for k, v in systems.most_common(top)],
+    )
+
+
+def reward_summary(submissions):
+    """Submission count, count per reward status and granted amount in one query"""
+    summary = submissions.order_by().aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(reward_status='pending')),
+        granted=Count('id', filter=Q(reward_status='granted')),
+        invalid=Count('id', filter=Q(reward_status='invalid')),
+        granted_amount=Sum('reward_amount', filter=Q(reward_status='granted')),
+    )
+    summary['granted_amount'] = summary['granted_amount'] or Decimal('0')
+    return summary
+
+
+def campaign_report(campaign):
+    """All aggregate metrics of the campaign report page"""
+    stats = CampaignHourlyStats.objects.filter(campaign=campaign)
+    scans = ScanTracking.objects.filter(campaign=campaign)
+
+    summary = rollup_summary(stats)
+    summary.update(scan_details(scans))
+    summary['unique_devices'] = device_count([campaign.id])
+    hourly_scans, device_stats = hourly_device_counts(stats)
+    browser_stats, os_stats = platform_stats(scans)
+    return {
+        'summary': summary,
+        'hourly_scans': hourly_scans,
+        'daily_trend': daily_trend(stats),
+        'device_stats': device_stats,
+        'browser_stats': browser_stats,
+        'os_stats': os_stats,
+    }
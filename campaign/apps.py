@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CampaignConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'campaign'
+
+    def ready(self):
+        # Register cache invalidation signal handlers
+        from . import campaign_cache  # noqa: F401
+        # Register hourly rollup maintenance signal handlers
+        from . import rollups  # noqa: F401
@@ -0,0 +1,225 @@
+# async_views.py - Native async versions of the public scan endpoints
+"""
+Async implementations of adv_landing, create_new_scan, track_video_progress
+and track_video_batch for ASGI deployments (socialz.asgi).
+
+Under ASGI, sync views run in the one thread per worker that thread-sensitive
+sync_to_async shares, and so do Django's async ORM calls (aget, asave, ...),
+so every scan and heartbeat waits behind the others' DB round-trips. These
+views stay on the event loop and run each blocking step (scan lookup and
+INSERT, progress UPDATE, spool writes) on the executor's thread pool with
+thread_sensitive=False, each pool thread using its own connection. SQLite
+still serialises the writes themselves (busy timeout, retry_on_lock); what
+no longer queues is everything around them.
+
+They are routed in place of the sync ones when ASYNC_PUBLIC_VIEWS is enabled.
+Scan cookies, pages and JSON responses are identical to campaign.views; the
+rare form-submission POST reuses the sync view so the duplicate-phone
+transaction stays in one place.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+
+from . import views
+from .campaign_cache import aget_campaign_snapshot
+from .db import retry_on_lock
+from .landing_page import render_landing
+from .models import ScanTracking
+from .scan_tokens import issue_scan_token, read_scan_cookie, set_scan_cookie
+from .scan_spool import scan_spool, spool_enabled, spool_progress, spool_unloaded_progress, spooled_scan
+from .rate_limit import allow_scan, throttled_landing
+from .progress import apply_progress, apply_progress_batch, heartbeat_buffer
+from .user_agents import classify_user_agent
+
+
+async def in_pool(func, *args, **kwargs):
+    """
+    Run a blocking DB or spool call on the thread pool rather than the shared
+    thread-sensitive thread. The pool thread's connection is checked before and
+    after, as at the start and end of a request, so CONN_MAX_AGE still applies.
+    """
+    def call():
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+async def adv_landing(request, unique_id):
+    """Async QR code landing page - same behavior as views.adv_landing"""
+    if request.method == 'POST':
+        return await sync_to_async(views.adv_landing)(request, unique_id)
+
+    try:
+        campaign = await aget_campaign_snapshot(unique_id)
+        if campaign is None:
+            return render(request, 'campaign/invalid_qr.html', {
+                'error': 'Invalid or expired QR code'
+            })
+
+        if not campaign.is_active:
+            return render(request, 'campaign/invalid_qr.html', {
+                'error': 'This campaign has ended or is not yet active'
+            })
+
+        user_agent_string = request.META.get('HTTP_USER_AGENT', '')
+        device_type, browser, os = classify_user_agent(user_agent_string)
+        ip_address = views.get_client_ip(request)
+        device_fingerprint = views.get_device_fingerprint(request, user_agent_string, ip_address)
+
+        token = read_scan_cookie(request, campaign)
+        force_new = request.GET.get('new', '').lower() == 'true'
+        scan = None
+
+        if token and not force_new:
+            if token.submitted:
+                return render_landing(request, campaign, views.SUBMITTED_LANDING_STATE)
+            try:
+                scan = await in_pool(ScanTracking.objects.get, id=token.scan_id, campaign_id=campaign.id)
+
+                if scan.form_submitted:
+                    response = render_landing(request, campaign, views.SUBMITTED_LANDING_STATE)
+                    return set_scan_cookie(response, campaign, issue_scan_token(campaign.id, scan.id, submitted=True))
+            except ScanTracking.DoesNotExist:
+                scan = spooled_scan(campaign, token)
+
+        if not scan:
+            if not allow_scan(campaign, device_fingerprint, ip_address):
+                return throttled_landing()
+            scan = await acreate_new_scan(
+                campaign=campaign,
+                ip_address=ip_address,
+                user_agent_string=user_agent_string,
+                device_fingerprint=device_fingerprint,
+                device_type=device_type,
+                browser=browser,
+                os=os
+            )
+
+        scan_token = issue_scan_token(campaign.id, scan.id)
+        response = render_landing(request, campaign, views.scan_landing_state(scan, scan_token))
+        return set_scan_cookie(response, campaign, scan_token)
+
+    except Exception as e:
+        import traceback
+        print(f"Error in adv_landing: {str(e)}")
+        print(traceback.format_exc())
+        return render(request, 'campaign/invalid_qr.html', {
+            'error': 'An error occurred. Please try again.'
+        })
+
+
+@retry_on_lock
+async def acreate_new_scan(campaign, ip_address, user_agent_string, device_fingerprint,
+                           device_type, browser, os):
+    """Async version of views.create_new_scan"""
+    scan = views.build_new_scan(
+        campaign, ip_address, user_agent_string, device_fingerprint,
+        device_type, browser, os
+    )
+    if spool_enabled():
+        # Reserving a block of ids may query the database
+        return await in_pool(scan_spool.append, scan)
+    await in_pool(scan.save, force_insert=True)
+    return scan
+
+
+@csrf_exempt
+async def track_video_progress(request):
+    """Async AJAX endpoint for video progress tracking"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            scan_id = views.verified_scan_id(data)
+
+            if scan_id is None:
+                return JsonResponse(views.INVALID_TOKEN_RESPONSE, status=403)
+
+            if not scan_id:
+                return JsonResponse({'status': 'skipped'})
+
+            video_duration, watched_seconds, completed = views.parse_progress(data)
+
+            if not views.heartbeat_allowed(request):
+                return views.throttled_progress({scan_id: (watched_seconds, video_duration, completed)})
+
+            if getattr(settings, 'HEARTBEAT_BUFFER_ENABLED', False):
+                tracked = heartbeat_buffer.record(
+                    scan_id, watched_seconds, video_duration, completed
+                )
+                return JsonResponse({
+                    'status': 'success',
+                    'buffered': True,
+                    'tracked': tracked
+                })
+
+            tracked = await in_pool(apply_progress, scan_id, watched_seconds, video_duration, completed)
+            if tracked is None and await in_pool(spool_progress, scan_id, watched_seconds, video_duration, completed):
+                return JsonResponse({'status': 'pending'}, status=202)
+            if tracked is None:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'Scan not found'
+                }, status=404)
+
+            return JsonResponse({
+                'status': 'success',
+                'tracked': views.tracked_values(tracked)
+            })
+
+        except Exception as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+
+    return JsonResponse({
+        'status': 'error',
+        'message': 'Method not allowed'
+    }, status=405)
+
+
+@csrf_exempt
+async def track_video_batch(request):
+    """Async beacon endpoint - same behavior as views.track_video_batch"""
+    if request.method != 'POST':
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Method not allowed'
+        }, status=405)
+
+    try:
+        entries, rejected = views.parse_progress_batch(json.loads(request.body))
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    if not entries:
+        if rejected:
+            return JsonResponse(views.INVALID_TOKEN_RESPONSE, status=403)
+        return JsonResponse({'status': 'skipped'})
+
+    if not views.heartbeat_allowed(request):
+        return views.throttled_progress(entries)
+
+    if getattr(settings, 'HEARTBEAT_BUFFER_ENABLED', False):
+        for scan_id, state in entries.items():
+            heartbeat_buffer.record(scan_id, *state)
+        return JsonResponse({
+            'status': 'success', 'buffered': True, 'scans': len(entries), 'rejected': rejected
+        })
+
+    updated = await in_pool(apply_progress_batch, entries)
+    if updated < len(entries):
+        await in_pool(spool_unloaded_progress, entries)
+    return JsonResponse({'status': 'success', 'scans': updated, 'rejected': rejected})
@@ -0,0 +1,157 @@
+# campaign_cache.py - In-process campaign lookup cache for the QR landing page
+"""
+Every QR scan resolves a campaign by ``unique_id``. The set of live campaigns
+is tiny and rarely changes, so each worker keeps a compact snapshot of the
+campaign (plus its client) in memory and serves landing-page GETs without any
+campaign queries. Unknown codes are cached as negative entries so scrapers
+hammering bogus codes don't reach the database either.
+
+Entries are dropped by post_save/post_delete on AdvCampaign and Client. The
+signals only fire in the process that made the change, so entries also
+expire after CAMPAIGN_CACHE_TTL seconds to bound staleness across workers.
+"""
+import threading
+import time
+from datetime import date
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AdvCampaign, Client
+
+MAX_ENTRIES = 10000
+
+
+class ClientSnapshot:
+    """Read-only subset of Client used by the landing page"""
+    __slots__ = ('id', 'company_name')
+
+    def __init__(self, client):
+        self.id = client.id
+        self.company_name = client.company_name
+
+    def __str__(self):
+        return self.company_name
+
+
+class CampaignSnapshot:
+    """Read-only subset of AdvCampaign used by the landing page"""
+    __slots__ = (
+        'id', 'unique_id', 'camp_name', 'customized_message', 'area_served',
+        'facebook_link', 'website_link', 'instagram_link', 'other_links',
+        'video_url', 'start_date', 'end_date', 'updated_at', 'client_id', 'client',
+        'pages',
+    )
+
+    def __init__(self, campaign):
+        self.id = campaign.id
+        self.unique_id = campaign.unique_id
+        self.camp_name = campaign.camp_name
+        self.customized_message = campaign.customized_message
+        self.area_served = campaign.area_served
+        self.facebook_link = campaign.facebook_link
+        self.website_link = campaign.website_link
+        self.instagram_link = campaign.instagram_link
+        self.other_links = campaign.other_links
+        self.video_url = campaign.video.url if campaign.video else ''
+        self.start_date = campaign.start_date
+        self.end_date = campaign.end_date
+        self.updated_at = campaign.updated_at
+        self.client_id = campaign.client_id
+        self.client = ClientSnapshot(campaign.client)
+        # Pre-rendered landing page layouts (see landing_page)
+        self.pages = {}
+
+    def __str__(self):
+        return self.camp_name
+
+    @property
+    def is_active(self):
+        return self.start_date <= date.today() <= self.end_date
+
+
+_entries = {}
+_lock = threading.Lock()
+
+
+def get_campaign_snapshot(unique_id):
+    """Return the CampaignSnapshot for ``unique_id``, or None if it doesn't exist"""
+    now = time.monotonic()
+    entry = _entries.get(unique_id)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    campaign = (
+        AdvCampaign.objects.select_related('client')
+        .filter(unique_id=unique_id)
+        .first()
+    )
+    snapshot = CampaignSnapshot(campaign) if campaign else None
+    _store(unique_id, snapshot, now)
+    return snapshot
+
+
+async def aget_campaign_snapshot(unique_id):
+    """Async version of get_campaign_snapshot()"""
+    now = time.monotonic()
+    entry = _entries.get(unique_id)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    campaign = await (
+        AdvCampaign.objects.select_related('client')
+        .filter(unique_id=unique_id)
+        .afirst()
+    )
+    snapshot = CampaignSnapshot(campaign) if campaign else None
+    _store(unique_id, snapshot, now)
+    return snapshot
+
+
+def _store(unique_id, snapshot, now):
+    if snapshot is None:
+        ttl = getattr(settings, 'CAMPAIGN_CACHE_NEGATIVE_TTL', 60)
+    else:
+        ttl = getattr(settings, 'CAMPAIGN_CACHE_TTL', 300)
+
+    with _lock:
+        if len(_entries) >= MAX_ENTRIES:
+            # Only a flood of bogus codes can fill the cache; drop the misses
+            for key in [k for k, (_, snap) in _entries.items() if snap is None]:
+                del _entries[key]
+            if len(_entries) >= MAX_ENTRIES:
+                _entries.clear()
+        _entries[unique_id] = (now + ttl, snapshot)
+
+
+def invalidate(unique_id=None, campaign_id=None, client_id=None):
+    """Drop cached entries matching any of the given keys"""
+    with _lock:
+        if unique_id is not None:
+            _entries.pop(unique_id, None)
+        if campaign_id is not None or client_id is not None:
+            stale = [
+                key for key, (_, snap) in _entries.items()
+                if snap is not None and (snap.id == campaign_id or snap.client_id == client_id)
+            ]
+            for key in stale:
+                del _entries[key]
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+# ============== SIGNALS ==============
+@receiver(post_save, sender=AdvCampaign)
+@receiver(post_delete, sender=AdvCampaign)
+def _campaign_changed(sender, instance, **kwargs):
+    invalidate(unique_id=instance.unique_id, campaign_id=instance.id)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def _client_changed(sender, instance, **kwargs):
+    invalidate(client_id=instance.id)
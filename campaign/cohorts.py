@@ -0,0 +1,133 @@
+# cohorts.py - Returning-device and cohort analytics
+"""
+Repeat-scan behaviour per device fingerprint, for the campaign report.
+
+One window-function query reduces each device's scans of the campaign to a
+single row: its first scan, its scan count and the time of its second
+scan. The (campaign, device_fingerprint, scanned_at) index hands the window
+its rows already partitioned and ordered, so there is no sort. Python folds
+those rows into repeat rates, time to return and first-seen-day cohorts,
+picking each device's cohort by bisecting precomputed local midnights. A
+second query counts, per other campaign, the devices shared with this one.
+
+The buckets are not computed in SQL on purpose: on SQLite every timestamp
+difference or TruncDate is a Python function call per row, which made the
+query slower than this fold (see the benchmark_cohorts command).
+
+Every new scan changes the campaign's data generation, so the report would
+recompute this on each load during a launch; COHORT_CACHE_STALE_SECONDS
+lets a result that recent be served instead (see report_cache.py).
+"""
+from bisect import bisect_right
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import Lead, RowNumber
+from django.utils import timezone
+
+from .histogram import histogram_values
+from .models import AdvCampaign, ScanTracking
+
+HOUR = 3600
+
+# Half-open time-to-return buckets (seconds) and their labels
+RETURN_EDGES = (0, HOUR, 6 * HOUR, 24 * HOUR, 72 * HOUR, 168 * HOUR)
+RETURN_LABELS = ['< 1 h', '1-6 h', '6-24 h', '1-3 days', '3-7 days', '7+ days']
+
+COHORT_DAYS = 14
+TOP_OVERLAPS = 5
+
+
+def first_scans(scans):
+    """
+    Each device's first scan, annotated with the device's scan count
+    (``visits``) and the time of its second scan (``returned_at``, NULL when
+    it never came back), from one window-function pass
+    """
+    device = [F('device_fingerprint')]
+    by_time = F('scanned_at').asc()
+    return (
+        scans.order_by()
+        .annotate(
+            visit=Window(RowNumber(), partition_by=device, order_by=by_time),
+            visits=Window(Count('id'), partition_by=device),
+            returned_at=Window(Lead('scanned_at'), partition_by=device, order_by=by_time),
+        )
+        .filter(visit=1)
+    )
+
+
+def device_cohorts(scans, days=COHORT_DAYS):
+    """Repeat rate, scans per device, time to return and first-seen-day cohorts"""
+    devices = returning = total_scans = 0
+    return_seconds = []
+    today = timezone.localdate()
+    cohort_days = [today - timedelta(days=days - 1 - i) for i in range(days)]
+    # Local midnights in UTC, like the scanned_at values: a bisect per device
+    # picks its cohort, instead of converting every first scan to local time
+    bounds = [
+        timezone.make_aware(datetime.combine(day, time.min)).astimezone(dt_timezone.utc)
+        for day in cohort_days + [today + timedelta(days=1)]
+    ]
+    cohort_devices, cohort_returning = [0] * (days + 1), [0] * (days + 1)
+
+    rows = first_scans(scans).values_list('scanned_at', 'returned_at', 'visits')
+    for first_seen, returned_at, visits in rows.iterator(chunk_size=5000):
+        devices += 1
+        total_scans += visits
+        # 0 is "before the first cohort day", days + 1 "after today"
+        cohort = bisect_right(bounds, first_seen)
+        if 0 < cohort <= days:
+            cohort_devices[cohort] += 1
+        if returned_at is not None:
+            returning += 1
+            return_seconds.append((returned_at - first_seen).total_seconds())
+            if 0 < cohort <= days:
+                cohort_returning[cohort] += 1
+
+    cohorts = []
+    for i, day in enumerate(cohort_days, start=1):
+        new, back = cohort_devices[i], cohort_returning[i]
+        cohorts.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'devices': new,
+            'returning': back,
+            'repeat_rate': round(back / new * 100, 2) if new else 0,
+        })
+
+    return {
+        'devices': devices,
+        'returning_devices': returning,
+        'repeat_rate': round(returning / devices * 100, 2) if devices else 0,
+        'scans_per_device': round(total_scans / devices, 2) if devices else 0,
+        'time_to_return': dict(zip(RETURN_LABELS, histogram_values(return_seconds, RETURN_EDGES))),
+        'cohorts': cohorts,
+    }
+
+
+def campaign_overlap(campaign, top=TOP_OVERLAPS):
+    """Other campaigns sharing the most devices with ``campaign``, in one query"""
+    fingerprints = ScanTracking.objects.filter(campaign=campaign).values('device_fingerprint')
+    rows = (
+        ScanTracking.objects.filter(device_fingerprint__in=fingerprints)
+        .exclude(campaign=campaign)
+        .order_by()
+        .values('campaign_id')
+        .annotate(devices=Count('device_fingerprint', distinct=True))
+        .order_by('-devices')[:top]
+    )
+    shared = {row['campaign_id']: row['devices'] for row in rows}
+    names = dict(AdvCampaign.objects.filter(id__in=shared).values_list('id', 'camp_name')) if shared else {}
+    return [
+        {'campaign': names.get(campaign_id, campaign_id), 'devices': devices}
+        for campaign_id, devices in shared.items()
+    ]
+
+
+def campaign_cohorts(campaign):
+    """Returning-device metrics of the campaign report page"""
+    report = device_cohorts(ScanTracking.objects.filter(campaign=campaign))
+    report['overlap'] = campaign_overlap(campaign)
+    for row in report['overlap']:
+        row['share'] = round(row['devices'] / report['devices'] * 100, 2) if report['devices'] else 0
+    return report
@@ -0,0 +1,163 @@
+# db.py - Database helpers shared by the write paths
+import asyncio
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from django.db.models import sql
+
+LOCK_ERRORS = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and any(msg in str(exc) for msg in LOCK_ERRORS)
+
+
+def retry_on_lock(func):
+    """
+    Retry ``func`` on SQLite lock errors, DB_LOCK_RETRIES times with full
+    jitter backoff (a random sleep up to DB_LOCK_RETRY_DELAY * 2**attempt).
+
+    Only retries when called outside a transaction: inside an atomic block
+    the transaction is already broken, so the error goes to the caller.
+    Coroutine functions are retried with asyncio.sleep.
+    """
+    def backoff(attempt):
+        return random.uniform(0, getattr(settings, 'DB_LOCK_RETRY_DELAY', 0.05) * 2 ** attempt)
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            retries = getattr(settings, 'DB_LOCK_RETRIES', 0)
+            attempt = 0
+            while True:
+                try:
+                    return await func(*args, **kwargs)
+                except OperationalError as exc:
+                    if attempt >= retries or not is_lock_error(exc):
+                        raise
+                    await asyncio.sleep(backoff(attempt))
+                    attempt += 1
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = getattr(settings, 'DB_LOCK_RETRIES', 0)
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if (attempt >= retries or not is_lock_error(exc)
+                        or connections['default'].in_atomic_block):
+                    raise
+                time.sleep(backoff(attempt))
+                attempt += 1
+    return wrapper
+
+
+def update_returning(queryset, updates, fields):
+    """
+    Run ``queryset.update(**updates)`` and return the new values of ``fields``
+    for every updated row as a list of dicts.
+
+    Uses ``UPDATE ... RETURNING`` so the write and the read are a single
+    statement. Backends without RETURNING fall back to an UPDATE followed by a
+    SELECT inside one transaction.
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+
+    if not connection.features.can_return_columns_from_insert:
+        with transaction.atomic(using=queryset.db):
+            ids = list(queryset.values_list('pk', flat=True))
+            if not ids:
+                return []
+            queryset.model._base_manager.using(queryset.db).filter(pk__in=ids).update(**updates)
+            return list(
+                queryset.model._base_manager.using(queryset.db)
+                .filter(pk__in=ids).order_by().values(*fields)
+            )
+
+    query = queryset.query.chain(sql.UpdateQuery)
+    query.add_update_values(updates)
+    query.clear_select_clause()
+    update_sql, params = query.get_compiler(queryset.db).as_sql()
+    if not update_sql:
+        return []
+
+    model_fields = [queryset.model._meta.get_field(name) for name in fields]
+    returning = ', '.join(connection.ops.quote_name(f.column) for f in model_fields)
+    converters = [
+        connection.ops.get_db_converters(f.cached_col) + f.get_db_converters(connection)
+        for f in model_fields
+    ]
+
+    with transaction.mark_for_rollback_on_error(using=queryset.db):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{update_sql} RETURNING {returning}', params)
+            rows = cursor.fetchall()
+
+    results = []
+    for row in rows:
+        values = {}
+        for name, value, field, field_converters in zip(fields, row, model_fields, converters):
+            for converter in field_converters:
+                value = converter(value, field.cached_col, connection)
+            values[name] = value
+        results.append(values)
+    return results
+
+
+RESERVE_IDS_VENDORS = ('sqlite', 'postgresql')
+
+
+def supports_reserve_ids(using='default'):
+    """Whether reserve_ids() works on the ``using`` database"""
+    return connections[using].vendor in RESERVE_IDS_VENDORS
+
+
+@retry_on_lock
+def reserve_ids(model, count, using='default'):
+    """
+    Reserve ``count`` primary keys of ``model`` for rows inserted later with
+    explicit ids. Returns the reserved ids as a sequence.
+
+    On SQLite the table's AUTOINCREMENT counter is advanced in one statement,
+    so regular inserts never reuse a reserved id even if it's never loaded.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                'UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s RETURNING seq',
+                [count, table],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                # No row inserted yet, so the counter doesn't exist
+                cursor.execute(
+                    f'SELECT COALESCE(MAX({connection.ops.quote_name(pk)}), 0) '
+                    f'FROM {connection.ops.quote_name(table)}'
+                )
+                end = cursor.fetchone()[0] + count
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, end]
+                )
+            else:
+                end = row[0]
+            return range(end - count + 1, end + 1)
+
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                [table, pk, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    raise NotImplementedError(f'reserve_ids() is not supported on {connection.vendor}')
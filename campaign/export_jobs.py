@@ -0,0 +1,140 @@
+# export_jobs.py - Background CSV exports
+"""
+Exports too large for a request (months of scans, every submission of a big
+campaign) run as ExportJob rows. The dashboard creates a job and polls its
+status; `manage.py run_export_jobs` claims pending jobs, writes the same rows
+as the streamed download to EXPORT_JOB_ROOT chunk by chunk, recording rows
+done after each chunk, and deletes files once EXPORT_JOB_TTL has passed. The
+files are not under MEDIA_ROOT: only download_export_job serves them, to the
+user who started the job.
+
+A job still running EXPORT_JOB_TIMEOUT seconds after it was claimed is
+failed (its worker died or hung), so the dashboard stops polling it; it is
+not re-run, since whatever killed the worker would likely kill the next one.
+Claiming already sets expires_at past the timeout, so even a job nobody
+fails is eventually removed.
+"""
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .csv_export import csv_lines
+from .exports import EXPORTS, export_header, export_queryset, export_rows
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+
+def job_storage():
+    return ExportJob._meta.get_field('file').storage
+
+
+def start_job(export, params, filename, user=None):
+    """Queue ``EXPORTS[export]`` filtered by ``params`` for the worker"""
+    if export not in EXPORTS:
+        raise ValueError(f'Unknown export "{export}"')
+    return ExportJob.objects.create(export=export, params=params, filename=filename, created_by=user)
+
+
+def job_ttl():
+    return timedelta(seconds=getattr(settings, 'EXPORT_JOB_TTL', 60 * 60 * 24))
+
+
+def job_timeout():
+    return timedelta(seconds=getattr(settings, 'EXPORT_JOB_TIMEOUT', 60 * 60))
+
+
+def claim_job():
+    """Oldest pending job, marked running; None when there is none"""
+    for job_id in ExportJob.objects.filter(status='pending').order_by('created_at', 'id').values_list('id', flat=True)[:10]:
+        now = timezone.now()
+        # Compare-and-set, so two workers never run the same job
+        claimed = ExportJob.objects.filter(id=job_id, status='pending').update(
+            status='running', started_at=now, expires_at=now + job_timeout() + job_ttl(),
+        )
+        if claimed:
+            return ExportJob.objects.get(id=job_id)
+    return None
+
+
+def fail_stalled():
+    """Fail running jobs claimed more than EXPORT_JOB_TIMEOUT ago; returns how many"""
+    now = timezone.now()
+    stalled = ExportJob.objects.filter(status='running', started_at__lt=now - job_timeout())
+    count = stalled.update(
+        status='failed', error='Export did not finish in time', finished_at=now, expires_at=now + job_ttl(),
+    )
+    if count:
+        logger.warning('Failed %d stalled export jobs', count)
+    return count
+
+
+def run_job(job):
+    """Write the job's CSV under EXPORT_JOB_ROOT, recording progress per chunk"""
+    spec = EXPORTS[job.export]
+    queryset, _ = export_queryset(spec, job.params)
+    total_rows = queryset.count()
+    ExportJob.objects.filter(id=job.id).update(total_rows=total_rows)
+
+    name = f'{job.id}_{job.filename}'
+    path = job_storage().path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    done = 0
+
+    def counted(rows):
+        nonlocal done
+        for row in rows:
+            done += 1
+            yield row
+
+    try:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            for chunk in csv_lines(export_header(spec), counted(export_rows(spec, job.params)), bom=spec.bom):
+                f.write(chunk)
+                ExportJob.objects.filter(id=job.id).update(rows_done=done)
+    except Exception as e:
+        logger.exception('Export job %s failed', job.id)
+        if os.path.exists(path):
+            os.remove(path)
+        now = timezone.now()
+        ExportJob.objects.filter(id=job.id, status='running').update(
+            status='failed', error=str(e), finished_at=now, expires_at=now + job_ttl(),
+        )
+        return False
+
+    now = timezone.now()
+    finished = ExportJob.objects.filter(id=job.id, status='running').update(
+        status='done', file=name, rows_done=done, finished_at=now, expires_at=now + job_ttl(),
+    )
+    if not finished:
+        # Failed as stalled while this worker was still writing
+        logger.warning('Export job %s finished after it was failed as stalled', job.id)
+        os.remove(path)
+        return False
+    return True
+
+
+def run_pending(limit=None):
+    """Run pending jobs until none is left (or ``limit`` ran); returns how many ran"""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+def cleanup_expired():
+    """Delete expired jobs and their files; returns how many"""
+    expired = list(ExportJob.objects.filter(expires_at__lt=timezone.now()))
+    for job in expired:
+        if job.file and job.file.storage.exists(job.file.name):
+            job.file.storage.delete(job.file.name)
+    ExportJob.objects.filter(id__in=[job.id for job in expired]).delete()
+    return len(expired)
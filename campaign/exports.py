@@ -0,0 +1,197 @@
+# exports.py - Declarative CSV exports of the management tables
+"""
+Each export is an ExportSpec: a base queryset, the list view's filter
+function (or the campaign filter of the scan exports) and a list of Columns. A column's ``source`` is either a field path
+(``'manufacturer__name'``) or a query expression (``Count('orders')``) that
+is annotated onto the queryset; ``format`` optionally turns the value into
+the CSV cell. The engine reads all columns with one ``values_list`` query and
+streams it through csv_export, so every export costs one query whatever its
+size, and a new export is a new entry in EXPORTS. The same rows feed the
+streamed downloads and the background ExportJob files (export_jobs.py).
+"""
+from collections import namedtuple
+
+from django.db.models import Count
+
+from .csv_export import stream_rows, streaming_csv_response
+from .list_filters import filter_manufacturers, filter_orders, filter_suppliers, filter_supplies
+from .models import Manufacturer, Order, ScanTracking, Supplier, Supply
+
+Column = namedtuple('Column', ['header', 'source', 'format'], defaults=[None])
+ExportSpec = namedtuple('ExportSpec', ['filename', 'queryset', 'filter', 'columns', 'bom'], defaults=[False])
+
+
+def date(value):
+    return value.strftime('%Y-%m-%d') if value else ''
+
+
+def timestamp(fmt):
+    return lambda value: value.strftime(fmt) if value else ''
+
+
+def or_default(default):
+    return lambda value: value or default
+
+
+def percent(value):
+    return f"{value:.1f}%" if value else '0%'
+
+
+def yes_no(value):
+    return 'Yes' if value else 'No'
+
+
+def choice_label(choices):
+    """Formatter showing the display label of a choice value"""
+    labels = dict(choices)
+    return lambda value: labels.get(value, value)
+
+
+def campaign_scans(queryset, params):
+    """Scans of ``params['campaign']`` (a campaign id), or of every campaign"""
+    if params.get('campaign'):
+        queryset = queryset.filter(campaign_id=params['campaign'])
+    return queryset
+
+
+def campaign_submissions(queryset, params):
+    return queryset.filter(campaign_id=params['campaign'], form_submitted=True)
+
+
+EXPORTS = {
+    'scans': ExportSpec(
+        filename='scans.csv',
+        queryset=lambda: ScanTracking.objects.order_by('-scanned_at', '-id'),
+        filter=campaign_scans,
+        bom=True,
+        columns=[
+            Column('Campaign Name', 'campaign__camp_name', or_default('N/A')),
+            Column('Campaign ID', 'campaign__unique_id', or_default('N/A')),
+            Column('Scan Date & Time', 'scanned_at', timestamp('%Y-%m-%d %H:%M:%S')),
+            Column('Device Type', 'device_type', or_default('Unknown')),
+            Column('Browser', 'browser', or_default('Unknown')),
+            Column('Operating System', 'os', or_default('Unknown')),
+            Column('IP Address', 'ip_address', or_default('')),
+            Column('Video Watch Percentage', 'video_percentage', percent),
+            Column('User Name', 'user_name', or_default('')),
+            Column('User Phone', 'user_phone', or_default('')),
+            Column('Form Submitted', 'form_submitted', yes_no),
+        ],
+    ),
+    'rewards': ExportSpec(
+        filename='rewards.csv',
+        queryset=lambda: ScanTracking.objects.order_by('-form_submitted_at', '-id'),
+        filter=campaign_submissions,
+        bom=True,
+        columns=[
+            Column('Date Submitted', 'form_submitted_at', timestamp('%Y-%m-%d %H:%M')),
+            Column('Name', 'user_name'),
+            Column('Phone', 'user_phone'),
+            Column('Video Watched %', 'video_percentage', lambda value: f"{value:.1f}%"),
+            Column('Reward Status', 'reward_status', choice_label(ScanTracking.REWARD_STATUS_CHOICES)),
+            Column('Reward Amount', 'reward_amount', or_default('')),
+            Column('Granted Date', 'reward_granted_at', timestamp('%Y-%m-%d %H:%M')),
+            Column('Notes', 'reward_notes', or_default('')),
+        ],
+    ),
+    'manufacturers': ExportSpec(
+        filename='manufacturers.csv',
+        queryset=lambda: Manufacturer.objects.order_by('-created_at', '-id'),
+        filter=filter_manufacturers,
+        columns=[
+            Column('Name', 'name'),
+            Column('Contact Person', 'contact_person'),
+            Column('Contact Number', 'contact_number'),
+            Column('Email', 'email'),
+            Column('City', 'city'),
+            Column('State', 'state'),
+            Column('GST Number', 'gst_number'),
+            Column('Total Orders', Count('orders')),
+            Column('Created Date', 'created_at', date),
+        ],
+    ),
+    'orders': ExportSpec(
+        filename='orders.csv',
+        queryset=lambda: Order.objects.order_by('-order_date', '-id'),
+        filter=filter_orders,
+        columns=[
+            Column('Order Number', 'order_number'),
+            Column('Manufacturer', 'manufacturer__name'),
+            Column('Product', 'product_name'),
+            Column('Quantity', 'quantity'),
+            Column('Unit Price', 'unit_price'),
+            Column('Total Amount', 'total_amount'),
+            Column('Status', 'status'),
+            Column('Order Date', 'order_date', date),
+            Column('Expected Delivery', 'expected_delivery', date),
+        ],
+    ),
+    'suppliers': ExportSpec(
+        filename='suppliers.csv',
+        queryset=lambda: Supplier.objects.order_by('supplier_type', 'name', 'id'),
+        filter=filter_suppliers,
+        columns=[
+            Column('Name', 'name'),
+            Column('Type', 'supplier_type', choice_label(Supplier.SUPPLIER_TYPES)),
+            Column('Contact Person', 'contact_person'),
+            Column('Contact Number', 'contact_number'),
+            Column('Email', 'email'),
+            Column('City', 'city'),
+            Column('State', 'state'),
+            Column('Rating', 'rating'),
+            Column('Total Supplies', Count('supplies')),
+        ],
+    ),
+    'supplies': ExportSpec(
+        filename='supplies.csv',
+        queryset=lambda: Supply.objects.order_by('-supply_date', '-id'),
+        filter=filter_supplies,
+        columns=[
+            Column('Supply Number', 'supply_number'),
+            Column('Supplier', 'supplier__name'),
+            Column('Product', 'product_name'),
+            Column('Quantity', 'quantity_supplied'),
+            Column('Unit Price', 'unit_price'),
+            Column('Total Amount', 'total_amount'),
+            Column('Status', 'status'),
+            Column('Supply Date', 'supply_date', date),
+            Column('Expected Delivery', 'expected_delivery', date),
+            Column('Quality Rating', 'quality_rating'),
+        ],
+    ),
+}
+
+
+def export_queryset(spec, params):
+    """(queryset, values_list fields) of ``spec`` filtered by ``params``"""
+    queryset = spec.filter(spec.queryset(), params)
+    fields, annotations = [], {}
+    for i, column in enumerate(spec.columns):
+        if isinstance(column.source, str):
+            fields.append(column.source)
+        else:
+            annotations[f'col_{i}'] = column.source
+            fields.append(f'col_{i}')
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    return queryset, fields
+
+
+def export_header(spec):
+    return [column.header for column in spec.columns]
+
+
+def export_rows(spec, params):
+    """Formatted CSV rows of ``spec`` filtered by ``params``, from one streamed query"""
+    queryset, fields = export_queryset(spec, params)
+    formats = [column.format for column in spec.columns]
+    for row in stream_rows(queryset, *fields):
+        yield [value if format is None else format(value) for value, format in zip(row, formats)]
+
+
+def export_response(name, params, gzip=False, filename=None):
+    """Streaming CSV (optionally gzipped) of the export called ``name``"""
+    spec = EXPORTS[name]
+    return streaming_csv_response(
+        filename or spec.filename, export_header(spec), export_rows(spec, params), bom=spec.bom, gzip=gzip
+    )
@@ -0,0 +1,97 @@
+# histogram.py - Bucketed counts of scan watch depth
+"""
+Histograms over ScanTracking.video_percentage or video_watched with arbitrary
+bucket edges. Buckets are half-open: edges (0, 25, 50) give [0, 25), [25, 50)
+and [50, +inf); values below the first edge are not counted. So a bucket
+edge at 50 splits exactly where the "Video 50%+" funnel step does, and the
+buckets from an edge onwards always sum to ``Count(filter=Q(field__gte=edge))``.
+
+Counts come from one conditional-aggregate query, optionally grouped (e.g. by
+campaign for comparisons), or from values already in memory, vectorized with
+NumPy when it is installed.
+"""
+from bisect import bisect_right
+
+from django.db.models import Count, Q
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Fields a histogram may be computed over, with their unit for labels
+HISTOGRAM_FIELDS = {
+    'video_percentage': '%',
+    'video_watched': 's',
+}
+MAX_EDGES = 50
+
+
+def parse_edges(edges):
+    """Validate bucket edges (a sequence or a comma-separated string) into a tuple of numbers"""
+    if isinstance(edges, str):
+        edges = [edge for edge in edges.split(',') if edge.strip()]
+    try:
+        edges = tuple(float(edge) for edge in edges)
+    except (TypeError, ValueError):
+        raise ValueError('Bucket edges must be numbers')
+    if not 1 <= len(edges) <= MAX_EDGES:
+        raise ValueError(f'Between 1 and {MAX_EDGES} bucket edges are required')
+    if any(lo >= hi for lo, hi in zip(edges, edges[1:])):
+        raise ValueError('Bucket edges must be strictly increasing')
+    return tuple(int(edge) if edge.is_integer() else edge for edge in edges)
+
+
+def bucket_labels(edges, unit=''):
+    """'lo-hi' for each bucket, 'lo+' for the last one"""
+    labels = [f'{lo}-{hi}{unit}' for lo, hi in zip(edges, edges[1:])]
+    return labels + [f'{edges[-1]}{unit}+']
+
+
+def bucket_conditions(field, edges):
+    """Q per half-open bucket, in edge order"""
+    conditions = [
+        Q(**{f'{field}__gte': lo, f'{field}__lt': hi}) for lo, hi in zip(edges, edges[1:])
+    ]
+    return conditions + [Q(**{f'{field}__gte': edges[-1]})]
+
+
+def bucket_index(value, edges):
+    """Bucket of ``value`` (-1 below the first edge); Python side of bucket_conditions"""
+    return bisect_right(edges, value) - 1
+
+
+def histogram(queryset, field, edges):
+    """Counts per bucket of ``field`` over ``queryset``, in one query"""
+    conditions = bucket_conditions(field, edges)
+    totals = queryset.order_by().aggregate(
+        **{f'bucket_{i}': Count('pk', filter=condition) for i, condition in enumerate(conditions)}
+    )
+    return [totals[f'bucket_{i}'] for i in range(len(conditions))]
+
+
+def grouped_histogram(queryset, field, edges, group_by):
+    """{group value: counts per bucket}, one GROUP BY query for all groups"""
+    conditions = bucket_conditions(field, edges)
+    rows = queryset.order_by().values(group_by).annotate(
+        **{f'bucket_{i}': Count('pk', filter=condition) for i, condition in enumerate(conditions)}
+    )
+    return {
+        row[group_by]: [row[f'bucket_{i}'] for i in range(len(conditions))] for row in rows
+    }
+
+
+def histogram_values(values, edges):
+    """Counts per bucket of in-memory ``values`` (e.g. from a cached snapshot)"""
+    if HAS_NUMPY:
+        indexes = np.searchsorted(np.asarray(edges, dtype=float),
+                                  np.asarray(values, dtype=float), side='right') - 1
+        return np.bincount(indexes[indexes >= 0], minlength=len(edges)).tolist()
+
+    counts = [0] * len(edges)
+    for value in values:
+        index = bucket_index(value, edges)
+        if index >= 0:
+            counts[index] += 1
+    return counts
@@ -0,0 +1,104 @@
+# landing_page.py - Fragment-cached rendering of the QR landing page
+"""
+adv_landing.html is large, but only a handful of values differ between
+viewers of the same campaign: the scan state read by the page script, the
+CSRF token and the (rare) flash messages. Everything else depends only on the
+campaign and on which of three layouts is shown (video, form, submitted).
+
+Each layout is rendered once per campaign snapshot with placeholders for the
+per-scan values and split into literal chunks. A scan then costs a dict lookup
+and a join instead of a template render. The pre-rendered chunks live on the
+CampaignSnapshot, so they are dropped together with it whenever the campaign
+or its client changes (see campaign_cache).
+"""
+import re
+
+from django.contrib import messages
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.html import json_script
+from django.utils.safestring import mark_safe
+
+TEMPLATE = 'campaign/adv_landing.html'
+MESSAGES_TEMPLATE = 'campaign/landing_messages.html'
+
+SCAN_STATE = 'scan_state'
+CSRF_TOKEN = 'csrf_token'
+MESSAGES = 'landing_messages'
+
+# Only our own placeholders split the page; any other @@landing:...@@ text
+# (e.g. in a campaign message) stays literal
+_MARKER_RE = re.compile(r'@@landing:(%s)@@' % '|'.join(map(re.escape, (SCAN_STATE, CSRF_TOKEN, MESSAGES))))
+
+VIDEO = 'video'
+FORM = 'form'
+SUBMITTED = 'submitted'
+
+
+def _marker(name):
+    return mark_safe(f'@@landing:{name}@@')
+
+
+def landing_variant(state):
+    """Which layout a scan state needs"""
+    if state['already_submitted']:
+        return SUBMITTED
+    return FORM if state['show_form'] else VIDEO
+
+
+def render_parts(campaign, variant):
+    """
+    Render one layout with placeholders and split it for substitution.
+
+    Returns a tuple alternating literal HTML and placeholder names, starting
+    and ending with literal HTML.
+    """
+    html = render_to_string(TEMPLATE, {
+        'campaign': campaign,
+        'client': campaign.client,
+        'already_submitted': variant == SUBMITTED,
+        'show_form': variant == FORM,
+        'debug': False,  # Set to True for testing
+        SCAN_STATE: _marker(SCAN_STATE),
+        CSRF_TOKEN: _marker(CSRF_TOKEN),
+        MESSAGES: _marker(MESSAGES),
+    })
+    return tuple(_MARKER_RE.split(html))
+
+
+def get_parts(campaign, variant):
+    """Pre-rendered chunks for ``variant``, rendered on first use per snapshot"""
+    parts = campaign.pages.get(variant)
+    if parts is None:
+        parts = campaign.pages[variant] = render_parts(campaign, variant)
+    return parts
+
+
+def render_messages(request):
+    """Flash messages HTML; empty (and no template render) in the common case"""
+    storage = messages.get_messages(request)
+    if not storage:
+        return ''
+    return render_to_string(MESSAGES_TEMPLATE, {'messages': storage})
+
+
+def render_landing(request, campaign, state):
+    """
+    Landing page response for one scan.
+
+    ``state`` holds the values read by the page script (scan_id,
+    resume_position, show_form, already_submitted and later additions); it is
+    embedded as a JSON island.
+    """
+    values = {
+        SCAN_STATE: json_script(state, 'scanState'),
+        CSRF_TOKEN: get_token(request),
+        MESSAGES: render_messages(request),
+    }
+    parts = get_parts(campaign, landing_variant(state))
+    html = ''.join(
+        part if i % 2 == 0 else values[part]
+        for i, part in enumerate(parts)
+    )
+    return HttpResponse(html)
@@ -0,0 +1,86 @@
+# list_filters.py - Search and status filters of the management tables
+"""
+The GET filters of the manufacturer, order, supplier and supply tables, as
+functions of (queryset, request.GET) so the list views and their CSV
+exports always select the same rows.
+"""
+from django.db.models import Q
+
+
+def filter_manufacturers(queryset, params):
+    search_query = params.get('search', '')
+    status_filter = params.get('status', '')
+
+    if search_query:
+        queryset = queryset.filter(
+            Q(name__icontains=search_query) |
+            Q(contact_person__icontains=search_query) |
+            Q(email__icontains=search_query) |
+            Q(city__icontains=search_query)
+        )
+
+    if status_filter == 'active':
+        queryset = queryset.filter(is_active=True)
+    elif status_filter == 'inactive':
+        queryset = queryset.filter(is_active=False)
+    return queryset
+
+
+def filter_orders(queryset, params):
+    search_query = params.get('search', '')
+    manufacturer_id = params.get('manufacturer', '')
+    status_filter = params.get('status', '')
+    priority_filter = params.get('priority', '')
+
+    if search_query:
+        queryset = queryset.filter(
+            Q(order_number__icontains=search_query) |
+            Q(product_name__icontains=search_query) |
+            Q(manufacturer__name__icontains=search_query)
+        )
+
+    if manufacturer_id:
+        queryset = queryset.filter(manufacturer_id=manufacturer_id)
+
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+
+    if priority_filter:
+        queryset = queryset.filter(priority=priority_filter)
+    return queryset
+
+
+def filter_suppliers(queryset, params):
+    search_query = params.get('search', '')
+    type_filter = params.get('type', '')
+
+    if search_query:
+        queryset = queryset.filter(
+            Q(name__icontains=search_query) |
+            Q(contact_person__icontains=search_query) |
+            Q(city__icontains=search_query)
+        )
+
+    if type_filter:
+        queryset = queryset.filter(supplier_type=type_filter)
+    return queryset
+
+
+def filter_supplies(queryset, params):
+    search_query = params.get('search', '')
+    supplier_id = params.get('supplier', '')
+    status_filter = params.get('status', '')
+
+    if search_query:
+        queryset = queryset.filter(
+            Q(supply_number__icontains=search_query) |
+            Q(product_name__icontains=search_query) |
+            Q(supplier__name__icontains=search_query)
+        )
+
+    if supplier_id:
+        queryset = queryset.filter(supplier_id=supplier_id)
+
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    return queryset
@@ -0,0 +1,128 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.utils import timezone
+
+from campaign.cohorts import campaign_cohorts
+from campaign.models import AdvCampaign, Client, ScanTracking
+from campaign.report_cache import cached_report
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the returning-device metrics of the campaign report (cohorts.py) '
+        'on a campaign with many scans and repeat devices. Runs against a '
+        'throwaway database file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scans', type=int, default=300000)
+        parser.add_argument('--devices', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=30, help='Spread the scans over N days')
+        parser.add_argument('--runs', type=int, default=3)
+
+    def handle(self, *args, **options):
+        db_settings = connections.settings['default']
+        workdir = tempfile.mkdtemp(prefix='socialz-cohortbench-')
+        db_settings['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            start = time.perf_counter()
+            campaign = self._seed(options['scans'], options['devices'], options['days'])
+            self.stdout.write(
+                f"seeded {options['scans']} scans of {options['devices']} devices "
+                f"in {time.perf_counter() - start:.1f} s"
+            )
+            for run in range(options['runs']):
+                self._report(run + 1, campaign)
+            self._cached(campaign)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _seed(self, scans, devices, days):
+        client = Client.objects.create(
+            company_name='Benchmark Co', email='bench@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        campaigns = [
+            AdvCampaign.objects.create(
+                unique_id=f'BC_CH_{i:05d}', camp_name=f'Cohort benchmark {i}', client=client,
+                start_date=date.today() - timedelta(days=days), end_date=date.today() + timedelta(days=30),
+                number_of_bottles=1000, budget_of_rewards=1000000, customized_message='-', area_served='-',
+            )
+            for i in range(3)
+        ]
+        # scanned_at is auto_now_add, which would stamp every row with now
+        scanned_at = ScanTracking._meta.get_field('scanned_at')
+        scanned_at.auto_now_add = False
+        try:
+            self._insert(campaigns, scans, devices, days)
+        finally:
+            scanned_at.auto_now_add = True
+        return campaigns[0]
+
+    def _insert(self, campaigns, scans, devices, days):
+        rnd = random.Random(42)
+        now = timezone.now()
+        span = days * 86400
+        rows = []
+        for i in range(scans):
+            # Nine in ten scans belong to the measured campaign; the others
+            # share its devices so the overlap query has work to do
+            rows.append(ScanTracking(
+                campaign=campaigns[0] if i % 10 else rnd.choice(campaigns[1:]),
+                ip_address='10.0.0.1', user_agent='ua', session_id='s',
+                device_fingerprint=f'fp{rnd.randrange(devices)}',
+                scanned_at=now - timedelta(seconds=rnd.randrange(span)),
+            ))
+            if len(rows) == 5000:
+                ScanTracking.objects.bulk_create(rows)
+                rows = []
+        ScanTracking.objects.bulk_create(rows)
+
+    def _report(self, run, campaign):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            result = campaign_cohorts(campaign)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"run {run}: {elapsed * 1000:8.1f} ms, {queries} queries, "
+            f"{result['devices']} devices, {result['returning_devices']} returning, "
+            f"{len(result['overlap'])} overlapping campaigns"
+        )
+
+    def _cached(self, campaign):
+        """report_detail's cohort lookup right after a new scan of the campaign"""
+        stale_seconds = getattr(settings, 'COHORT_CACHE_STALE_SECONDS', 300)
+
+        def load():
+            campaign.refresh_from_db()
+            start = time.perf_counter()
+            cached_report(campaign, 'cohorts', lambda: campaign_cohorts(campaign), stale_seconds=stale_seconds)
+            return (time.perf_counter() - start) * 1000
+
+        cache.clear()
+        cold = load()
+        ScanTracking.objects.create(
+            campaign=campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp-new', session_id='s',
+        )
+        self.stdout.write(
+            f"report cache: {cold:8.1f} ms cold, {load():8.1f} ms after a new scan "
+            f"(COHORT_CACHE_STALE_SECONDS={stale_seconds})"
+        )
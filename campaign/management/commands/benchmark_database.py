@@ -0,0 +1,139 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.db.models import Avg, Count, Q
+from django.test import override_settings
+
+from campaign.models import AdvCampaign, Client, ScanTracking
+from campaign.progress import apply_progress
+from campaign.views import build_new_scan, create_new_scan
+
+
+class Command(BaseCommand):
+    help = (
+        'Mixed read/write throughput on SQLite for each database profile: writer '
+        'threads create scans and send heartbeats while reader threads run '
+        'dashboard aggregates. Runs against throwaway database files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=list(settings.SQLITE_PROFILES),
+                            default=['basic', 'production'])
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--seed-scans', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['writers']} writers + {options['readers']} readers for {options['seconds']} s"
+        )
+        for profile in options['profiles']:
+            writes, write_errors, reads, read_errors = self._run_profile(profile, options)
+            seconds = options['seconds']
+            self.stdout.write(
+                f'{profile:<11} writes {writes / seconds:8.1f}/s ({write_errors} locked)  '
+                f'reads {reads / seconds:8.1f}/s ({read_errors} locked)'
+            )
+
+    def _run_profile(self, profile, options):
+        config = settings.SQLITE_PROFILES[profile]
+        db_settings = connections.settings['default']
+        saved = {key: db_settings.get(key) for key in ('OPTIONS', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        db_settings['OPTIONS'] = config.get('OPTIONS', {})
+        db_settings['CONN_MAX_AGE'] = config.get('CONN_MAX_AGE', 0)
+        db_settings['CONN_HEALTH_CHECKS'] = config.get('CONN_HEALTH_CHECKS', False)
+        connection.close()
+
+        workdir = tempfile.mkdtemp(prefix='socialz-dbbench-')
+        db_settings['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            campaign_ids = self._seed(options['seed_scans'])
+            retries = 3 if profile == 'production' else 0
+            with override_settings(DB_LOCK_RETRIES=retries):
+                return self._workload(campaign_ids, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+            db_settings.update(saved)
+            connection.close()
+
+    def _seed(self, count):
+        client = Client.objects.create(
+            company_name='Benchmark Co', email='bench@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        campaigns = [
+            AdvCampaign.objects.create(
+                unique_id=f'BC_DB_{i:05d}', camp_name=f'Benchmark {i}', client=client,
+                start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=30),
+                number_of_bottles=1000, budget_of_rewards=1000, customized_message='-', area_served='-',
+            )
+            for i in range(5)
+        ]
+        scans = [
+            build_new_scan(campaigns[i % len(campaigns)], '10.0.0.1', 'Mozilla/5.0 Android', 'f' * 32,
+                           'mobile', 'Chrome', 'Android')
+            for i in range(count)
+        ]
+        ScanTracking.objects.bulk_create(scans, batch_size=1000)
+        return [c.id for c in campaigns]
+
+    def _workload(self, campaign_ids, options):
+        deadline = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        totals = {'writes': 0, 'write_errors': 0, 'reads': 0, 'read_errors': 0}
+
+        def count(key, n=1):
+            with lock:
+                totals[key] += n
+
+        def writer(i):
+            campaign = AdvCampaign.objects.get(id=campaign_ids[i % len(campaign_ids)])
+            while time.monotonic() < deadline:
+                # Each iteration is one "request": scan, then a few heartbeats
+                close_old_connections()
+                try:
+                    scan = create_new_scan(campaign, f'10.1.0.{i}', 'Mozilla/5.0 Android',
+                                           'f' * 32, 'mobile', 'Chrome', 'Android')
+                    count('writes')
+                    for second in (5, 10, 15):
+                        close_old_connections()
+                        apply_progress(scan.id, second, 30, False)
+                        count('writes')
+                except OperationalError:
+                    count('write_errors')
+            connection.close()
+
+        def reader(i):
+            while time.monotonic() < deadline:
+                close_old_connections()
+                try:
+                    ScanTracking.objects.filter(
+                        campaign_id=random.choice(campaign_ids)
+                    ).aggregate(
+                        total=Count('id'),
+                        completed=Count('id', filter=Q(video_completed=True)),
+                        avg_watch=Avg('video_percentage'),
+                    )
+                    count('reads')
+                except OperationalError:
+                    count('read_errors')
+            connection.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return totals['writes'], totals['write_errors'], totals['reads'], totals['read_errors']
@@ -0,0 +1,167 @@
+import asyncio
+import importlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client as TestClient, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import clear_url_caches, reverse
+
+from campaign.models import AdvCampaign, Client
+
+SCAN_TOKEN_RE = re.compile(rb'"token": "([^"]+)"')
+USER_AGENT = 'Mozilla/5.0 (Linux; Android 13; SM-A536E) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36'
+
+MODES = {
+    # name: (handler, use async views)
+    'wsgi-sync': ('wsgi', False),
+    'asgi-sync': ('asgi', False),
+    'asgi-async': ('asgi', True),
+}
+
+
+def route_public_views(async_views):
+    """Re-import the URLconf so ASYNC_PUBLIC_VIEWS takes effect"""
+    clear_url_caches()
+    importlib.reload(importlib.import_module('campaign.urls'))
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+
+
+def viewer_headers(i):
+    return {
+        'user-agent': f'{USER_AGENT} viewer/{i}',
+        'x-forwarded-for': f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}',
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Requests per second of the public scan endpoints with N simultaneous viewers: '
+        'sync views under WSGI vs sync and native async views under ASGI. '
+        'Runs against a throwaway SQLite database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--viewers', type=int, default=500)
+        parser.add_argument('--heartbeats', type=int, default=5, help='Heartbeats sent per viewer')
+        parser.add_argument('--wsgi-threads', type=int, default=64, help='Worker threads serving WSGI')
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        workdir = tempfile.mkdtemp(prefix='socialz-bench-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            unique_id = self._create_campaign()
+            self.stdout.write(
+                f"{options['viewers']} viewers x (1 landing + {options['heartbeats']} heartbeats)"
+            )
+            for mode in options['modes']:
+                handler, use_async = MODES[mode]
+                with override_settings(ASYNC_PUBLIC_VIEWS=use_async):
+                    route_public_views(use_async)
+                    if handler == 'wsgi':
+                        result = self._run_wsgi(unique_id, options)
+                    else:
+                        result = self._run_asgi(unique_id, options)
+                requests, errors, seconds = result
+                self.stdout.write(
+                    f'{mode:<11} {requests:6d} requests  {errors:5d} errors  '
+                    f'{seconds:7.2f} s  {requests / seconds:8.1f} req/s'
+                )
+        finally:
+            route_public_views(getattr(settings, 'ASYNC_PUBLIC_VIEWS', False))
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+            teardown_test_environment()
+
+    def _create_campaign(self):
+        client = Client.objects.create(
+            company_name='Benchmark Co', email='bench@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        campaign = AdvCampaign.objects.create(
+            unique_id='BC_BEN_00001', camp_name='Benchmark', client=client,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=30),
+            number_of_bottles=1000, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+        return campaign.unique_id
+
+    def _heartbeat(self, token, second, duration):
+        return json.dumps({
+            'token': token,
+            'video_duration': duration,
+            'watched_seconds': second,
+            'completed': False,
+        })
+
+    def _run_wsgi(self, unique_id, options):
+        landing_url = reverse('sw:adv_landing', args=[unique_id])
+        track_url = reverse('sw:track_video_progress')
+
+        def viewer(i):
+            requests = errors = 0
+            client = TestClient(headers=viewer_headers(i))
+            try:
+                response = client.get(landing_url)
+                requests += 1
+                match = SCAN_TOKEN_RE.search(response.content)
+                if response.status_code != 200 or not match:
+                    return requests, errors + 1
+                token = match.group(1).decode()
+                for beat in range(options['heartbeats']):
+                    response = client.post(
+                        track_url, self._heartbeat(token, (beat + 1) * 5, 30),
+                        content_type='application/json',
+                    )
+                    requests += 1
+                    errors += response.status_code != 200
+            finally:
+                connection.close()
+            return requests, errors
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['wsgi_threads']) as pool:
+            results = list(pool.map(viewer, range(options['viewers'])))
+        seconds = time.perf_counter() - start
+        return sum(r for r, _ in results), sum(e for _, e in results), seconds
+
+    def _run_asgi(self, unique_id, options):
+        landing_url = reverse('sw:adv_landing', args=[unique_id])
+        track_url = reverse('sw:track_video_progress')
+
+        async def viewer(i):
+            requests = errors = 0
+            client = AsyncClient(headers=viewer_headers(i))
+            response = await client.get(landing_url)
+            requests += 1
+            match = SCAN_TOKEN_RE.search(response.content)
+            if response.status_code != 200 or not match:
+                return requests, errors + 1
+            token = match.group(1).decode()
+            for beat in range(options['heartbeats']):
+                response = await client.post(
+                    track_url, self._heartbeat(token, (beat + 1) * 5, 30),
+                    content_type='application/json',
+                )
+                requests += 1
+                errors += response.status_code != 200
+            return requests, errors
+
+        async def run():
+            return await asyncio.gather(*(viewer(i) for i in range(options['viewers'])))
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        seconds = time.perf_counter() - start
+        return sum(r for r, _ in results), sum(e for _, e in results), seconds
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.utils import timezone
+
+from campaign.models import AdvCampaign, Client, ScanTracking
+from campaign.reward_updates import bulk_update_rewards
+from campaign.rollups import drifted_campaigns, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the rewards_detail bulk update: granting every submission of a '
+        'campaign set-based, and optionally the old get()/save() loop. Runs '
+        'against a throwaway database file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--legacy', action='store_true',
+                            help='Also time the per-row get()/save() loop (slow)')
+
+    def handle(self, *args, **options):
+        db_settings = connections.settings['default']
+        workdir = tempfile.mkdtemp(prefix='socialz-rewardbench-')
+        db_settings['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            campaign, ids = self._seed(options['rows'])
+            self._report('set-based', campaign, lambda: bulk_update_rewards(campaign, ids, 'granted', '25'))
+            if options['legacy']:
+                self._report('get/save', campaign, lambda: self._legacy(campaign, ids, 'pending', None))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _seed(self, count):
+        client = Client.objects.create(
+            company_name='Benchmark Co', email='bench@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        campaign = AdvCampaign.objects.create(
+            unique_id='BC_RW_00001', camp_name='Reward benchmark', client=client,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=30),
+            number_of_bottles=1000, budget_of_rewards=1000000, customized_message='-', area_served='-',
+        )
+        scans = ScanTracking.objects.bulk_create([
+            ScanTracking(
+                campaign=campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint=f'fp{i}',
+                session_id='s', form_submitted=True, form_submitted_at=timezone.now(),
+                user_name='Bench', user_phone=f'9{i:09d}',
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        rebuild_rollups([campaign.id])
+        return campaign, [str(scan.id) for scan in scans]
+
+    def _legacy(self, campaign, ids, status, amount):
+        updated = 0
+        for sid in ids:
+            scan = ScanTracking.objects.get(id=sid, campaign=campaign)
+            scan.reward_status = status
+            if status == 'granted' and amount:
+                scan.reward_amount = Decimal(amount)
+                scan.reward_granted_at = timezone.now()
+            scan.save()
+            updated += 1
+        return {'updated': updated}
+
+    def _report(self, label, campaign, run):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - start
+        drift = 'counters exact' if not drifted_campaigns([campaign.id]) else 'COUNTERS DRIFTED'
+        self.stdout.write(
+            f"{label:<10} {result['updated']} rows in {elapsed * 1000:8.1f} ms, "
+            f"{queries} queries, {drift}"
+        )
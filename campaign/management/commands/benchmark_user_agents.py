@@ -0,0 +1,100 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from campaign.user_agents import classify_user_agent
+
+SAMPLE_USER_AGENTS = [
+    'Mozilla/5.0 (Linux; Android 13; SM-A536E) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 12; Redmi Note 11) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_{v} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (iPad; CPU OS 16_{v} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36 Edg/{v}.0.0.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{v} Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0',
+    'Mozilla/5.0 (Linux; Android 11; CPH2239) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Mobile Safari/537.36 OPR/76.2.4027.73374',
+]
+
+
+def inline_chain(user_agent_string):
+    """The original if/elif chain from adv_landing, kept as the baseline"""
+    device_type, browser, os = 'unknown', 'Unknown', 'Unknown'
+    if user_agent_string:
+        ua = user_agent_string.lower()
+        if 'mobile' in ua or 'android' in ua or 'iphone' in ua:
+            device_type = 'mobile'
+        elif 'ipad' in ua or 'tablet' in ua:
+            device_type = 'tablet'
+        elif 'windows' in ua or 'mac' in ua or 'linux' in ua:
+            device_type = 'desktop'
+
+        if 'chrome' in ua and 'edge' not in ua:
+            browser = 'Chrome'
+        elif 'safari' in ua and 'chrome' not in ua:
+            browser = 'Safari'
+        elif 'firefox' in ua:
+            browser = 'Firefox'
+        elif 'edge' in ua:
+            browser = 'Edge'
+        elif 'opera' in ua:
+            browser = 'Opera'
+
+        if 'android' in ua:
+            os = 'Android'
+        elif 'iphone' in ua or 'ipad' in ua or 'ipod' in ua:
+            os = 'iOS'
+        elif 'windows' in ua:
+            os = 'Windows'
+        elif 'mac' in ua:
+            os = 'macOS'
+        elif 'linux' in ua:
+            os = 'Linux'
+    return device_type, browser, os
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark the memoized user-agent classifier against the inline if/elif chain'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=200000)
+        parser.add_argument('--distinct', type=int, default=300, help='Distinct UA strings in the workload')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        distinct = []
+        for i in range(options['distinct']):
+            template = SAMPLE_USER_AGENTS[i % len(SAMPLE_USER_AGENTS)]
+            distinct.append(template.format(v=100 + i // len(SAMPLE_USER_AGENTS)))
+        # Skewed traffic: a handful of UAs account for most scans
+        weights = [1 / (rank + 1) for rank in range(len(distinct))]
+        workload = rng.choices(distinct, weights=weights, k=options['lookups'])
+
+        mismatches = [ua for ua in distinct if tuple(classify_user_agent(ua)) != inline_chain(ua)]
+        if mismatches:
+            self.stderr.write(self.style.ERROR(f'{len(mismatches)} UAs classified differently, e.g. {mismatches[0]}'))
+
+        results = []
+        results.append(('inline chain', self._time(inline_chain, workload)))
+
+        classify_user_agent.cache_clear()
+        results.append(('classifier (cold cache)', self._time(classify_user_agent, workload)))
+        results.append(('classifier (warm cache)', self._time(classify_user_agent, workload)))
+
+        uncached = classify_user_agent.__wrapped__
+        results.append(('rule table, no cache', self._time(uncached, workload)))
+
+        baseline = results[0][1]
+        self.stdout.write(f"{options['lookups']} lookups over {len(distinct)} distinct UAs")
+        for label, seconds in results:
+            per_call = seconds / len(workload) * 1e9
+            self.stdout.write(f'{label:<26} {seconds * 1000:9.1f} ms  {per_call:7.0f} ns/call  x{baseline / seconds:5.2f}')
+        info = classify_user_agent.cache_info()
+        self.stdout.write(f'cache: {info.hits} hits, {info.misses} misses, {info.currsize} entries')
+
+    def _time(self, func, workload):
+        start = time.perf_counter()
+        for ua in workload:
+            func(ua)
+        return time.perf_counter() - start
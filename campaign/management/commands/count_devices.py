@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from campaign.device_sketch import device_count
+from campaign.models import AdvCampaign
+
+
+class Command(BaseCommand):
+    help = 'Distinct devices for campaigns and a date range, from the HyperLogLog sketches or exactly'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaigns', nargs='+', help='Campaign unique_ids (merged)')
+        parser.add_argument('--start', type=date.fromisoformat, help='First local day, YYYY-MM-DD')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last local day, YYYY-MM-DD')
+        parser.add_argument('--exact', action='store_true',
+                            help='Also run the exact DISTINCT over the scan rows and show the error')
+
+    def handle(self, *args, **options):
+        campaign_ids = list(
+            AdvCampaign.objects.filter(unique_id__in=options['campaigns']).values_list('id', flat=True)
+        )
+        if len(campaign_ids) != len(set(options['campaigns'])):
+            raise CommandError('Unknown campaign unique_id')
+
+        approximate = device_count(campaign_ids, options['start'], options['end'])
+        self.stdout.write(f'approximate: {approximate}')
+        if options['exact']:
+            exact = device_count(campaign_ids, options['start'], options['end'], exact=True)
+            error = (approximate - exact) / exact * 100 if exact else 0
+            self.stdout.write(f'exact:       {exact} ({error:+.2f}%)')
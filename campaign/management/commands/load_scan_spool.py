@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from campaign.scan_spool import load_spool, spool_dir, spool_status
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load spooled scans (SCAN_SPOOL_ENABLED) into ScanTracking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Spool directory (default: SCAN_SPOOL_DIR)')
+        parser.add_argument('--interval', type=float,
+                            help='Keep running, loading every N seconds')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--keep', action='store_true',
+                            help='Move loaded segments to loaded/ instead of deleting them')
+        parser.add_argument('--status', action='store_true',
+                            help='Only print the backlog and loader lag')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or spool_dir()
+
+        if options['status']:
+            self._print_status(directory)
+            return
+
+        while True:
+            stats = load_spool(directory, batch_size=options['batch_size'], keep=options['keep'])
+            if stats is None:
+                self.stderr.write('Another loader holds the spool lock')
+            elif stats['segments'] or options['interval'] is None:
+                self.stdout.write(
+                    f"{stats['segments']} segments, {stats['scans']} scans loaded, "
+                    f"{stats['skipped_lines']} torn lines skipped, {stats['recovered']} recovered, "
+                    f"{stats['progress']} heartbeats replayed ({stats['progress_carried']} carried over, "
+                    f"{stats['progress_dropped']} dropped)"
+                )
+                self._print_status(directory)
+
+            if options['interval'] is None:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    def _print_status(self, directory):
+        status = spool_status(directory)
+        self.stdout.write(
+            f"backlog: {status['ready_segments']} ready / {status['open_segments']} open segments, "
+            f"{status['pending_bytes']} bytes, lag {status['lag_seconds']:.1f} s"
+        )
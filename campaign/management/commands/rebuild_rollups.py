@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from campaign.models import AdvCampaign
+from campaign.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the hourly scan rollup (CampaignHourlyStats) and campaign counters from the scan rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', nargs='+', help='Only rebuild these campaign unique_ids')
+
+    def handle(self, *args, **options):
+        campaign_ids = None
+        if options['campaign']:
+            campaign_ids = list(
+                AdvCampaign.objects.filter(unique_id__in=options['campaign']).values_list('id', flat=True)
+            )
+            if len(campaign_ids) != len(set(options['campaign'])):
+                raise CommandError('Unknown campaign unique_id')
+
+        written = rebuild_rollups(campaign_ids)
+        self.stdout.write(self.style.SUCCESS(f'{written} hourly rollup rows written'))
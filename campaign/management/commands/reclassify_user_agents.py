@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from campaign.models import ScanTracking
+from campaign.rollups import rebuild_rollups
+from campaign.user_agents import reclassify_scans
+
+
+class Command(BaseCommand):
+    help = 'Re-run the user-agent classifier over stored scans and fix device/browser/OS columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', help='Only reclassify scans of this campaign unique_id')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Count changes without writing')
+
+    def handle(self, *args, **options):
+        queryset = ScanTracking.objects.all()
+        if options['campaign']:
+            queryset = queryset.filter(campaign__unique_id=options['campaign'])
+
+        seen, changed = reclassify_scans(
+            queryset, chunk_size=options['chunk_size'], dry_run=options['dry_run']
+        )
+        if changed and not options['dry_run']:
+            # Rollup rows are keyed by device type
+            campaign_ids = None
+            if options['campaign']:
+                campaign_ids = set(queryset.values_list('campaign_id', flat=True).distinct())
+            rebuild_rollups(campaign_ids)
+        verb = 'would change' if options['dry_run'] else 'changed'
+        self.stdout.write(self.style.SUCCESS(f'{seen} scans checked, {changed} {verb}'))
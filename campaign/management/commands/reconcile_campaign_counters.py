@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from campaign.models import AdvCampaign
+from campaign.rollups import drifted_campaigns, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the AdvCampaign scan/submission/reward counters with the scan rows '
+        'and rebuild the counters and hourly rollup of campaigns that drifted'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', nargs='+', help='Only check these campaign unique_ids')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without repairing it')
+
+    def handle(self, *args, **options):
+        campaign_ids = None
+        if options['campaign']:
+            campaign_ids = list(
+                AdvCampaign.objects.filter(unique_id__in=options['campaign']).values_list('id', flat=True)
+            )
+
+        drifted = drifted_campaigns(campaign_ids)
+        for unique_id in AdvCampaign.objects.filter(id__in=drifted).values_list('unique_id', flat=True):
+            self.stdout.write(f'drifted: {unique_id}')
+        if drifted and not options['dry_run']:
+            rebuild_rollups(drifted)
+        verb = 'drifted' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} campaigns {verb}'))
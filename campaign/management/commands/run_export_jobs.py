@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from campaign.export_jobs import cleanup_expired, fail_stalled, run_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Run pending background CSV exports (ExportJob), fail stalled ones and '
+        'delete expired export files'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep running, checking for jobs every N seconds')
+        parser.add_argument('--limit', type=int, help='Run at most N jobs per pass')
+
+    def handle(self, *args, **options):
+        while True:
+            stalled = fail_stalled()
+            ran = run_pending(limit=options['limit'])
+            removed = cleanup_expired()
+            if ran or stalled or removed or options['interval'] is None:
+                self.stdout.write(
+                    f'{ran} export jobs run, {stalled} stalled jobs failed, {removed} expired jobs removed'
+                )
+
+            if options['interval'] is None:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,204 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:40
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Client',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('company_name', models.CharField(max_length=255)),
+                ('email', models.EmailField(max_length=254)),
+                ('address', models.TextField()),
+                ('industry_type', models.CharField(max_length=100)),
+                ('contact_person_name', models.CharField(max_length=100)),
+                ('contact_phone_number', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Client',
+                'verbose_name_plural': 'Clients',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Manufacturer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Manufacturer Name')),
+                ('contact_person', models.CharField(max_length=150, verbose_name='Contact Person')),
+                ('contact_number', models.CharField(max_length=17, validators=[django.core.validators.RegexValidator(message="Phone number must be entered in format: '+999999999'. Up to 15 digits allowed.", regex='^\\+?1?\\d{9,15}$')], verbose_name='Contact Number')),
+                ('address', models.TextField(verbose_name='Address')),
+                ('city', models.CharField(blank=True, max_length=100, null=True)),
+                ('state', models.CharField(blank=True, max_length=100, null=True)),
+                ('postal_code', models.CharField(blank=True, max_length=20, null=True)),
+                ('country', models.CharField(default='India', max_length=100)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True, verbose_name='Email Address')),
+                ('registration_number', models.CharField(blank=True, max_length=100, null=True, verbose_name='Registration No.')),
+                ('gst_number', models.CharField(blank=True, max_length=20, null=True, verbose_name='GST Number')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Manufacturer',
+                'verbose_name_plural': 'Manufacturers',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Supplier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Supplier Name')),
+                ('supplier_type', models.CharField(choices=[('hotel', 'Hotel'), ('event', 'Event Company'), ('distributor', 'Distributor'), ('restaurant', 'Restaurant'), ('catering', 'Catering Service'), ('retailer', 'Retailer'), ('other', 'Other')], max_length=20, verbose_name='Supplier Type')),
+                ('contact_person', models.CharField(max_length=150, verbose_name='Contact Person')),
+                ('contact_number', models.CharField(max_length=17, validators=[django.core.validators.RegexValidator(message="Phone number must be entered in format: '+999999999'. Up to 15 digits allowed.", regex='^\\+?1?\\d{9,15}$')], verbose_name='Contact Number')),
+                ('email', models.EmailField(blank=True, max_length=254, null=True, verbose_name='Email Address')),
+                ('address', models.TextField(verbose_name='Address')),
+                ('city', models.CharField(max_length=100)),
+                ('state', models.CharField(max_length=100)),
+                ('postal_code', models.CharField(max_length=20)),
+                ('country', models.CharField(default='India', max_length=100)),
+                ('business_license', models.CharField(blank=True, max_length=100, null=True, verbose_name='Business License')),
+                ('gst_number', models.CharField(blank=True, max_length=20, null=True, verbose_name='GST Number')),
+                ('rating', models.DecimalField(decimal_places=2, default=0.0, max_digits=3, verbose_name='Rating (out of 5)')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Supplier',
+                'verbose_name_plural': 'Suppliers',
+                'ordering': ['supplier_type', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AdvCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unique_id', models.CharField(blank=True, max_length=50, null=True, unique=True)),
+                ('camp_name', models.CharField(max_length=255)),
+                ('video', models.FileField(blank=True, null=True, upload_to='campaign_videos/')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('number_of_bottles', models.PositiveIntegerField()),
+                ('budget_of_rewards', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('customized_message', models.TextField()),
+                ('area_served', models.TextField()),
+                ('facebook_link', models.URLField(blank=True, null=True)),
+                ('website_link', models.URLField(blank=True, null=True)),
+                ('instagram_link', models.URLField(blank=True, null=True)),
+                ('other_links', models.TextField(blank=True, null=True)),
+                ('qr_code', models.ImageField(blank=True, null=True, upload_to='campaign_qr_codes/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaigns', to='campaign.client')),
+            ],
+            options={
+                'verbose_name': 'Advertisement Campaign',
+                'verbose_name_plural': 'Advertisement Campaigns',
+                'ordering': ['-start_date', '-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_number', models.CharField(max_length=50, unique=True, verbose_name='Order Number')),
+                ('order_date', models.DateField(default=django.utils.timezone.now, verbose_name='Order Date')),
+                ('expected_delivery', models.DateField(verbose_name='Expected Delivery Date')),
+                ('actual_delivery', models.DateField(blank=True, null=True, verbose_name='Actual Delivery Date')),
+                ('product_name', models.CharField(max_length=255, verbose_name='Product Name')),
+                ('product_description', models.TextField(blank=True, null=True, verbose_name='Product Description')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Quantity')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Unit Price')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Total Amount')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('delivered', 'Delivered')], default='pending', max_length=20)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('urgent', 'Urgent')], default='medium', max_length=10)),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Order Notes')),
+                ('terms_conditions', models.TextField(blank=True, null=True, verbose_name='Terms & Conditions')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('manufacturer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='campaign.manufacturer', verbose_name='Manufacturer')),
+            ],
+            options={
+                'verbose_name': 'Order',
+                'verbose_name_plural': 'Orders',
+                'ordering': ['-order_date', '-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Supply',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('supply_number', models.CharField(max_length=50, unique=True, verbose_name='Supply Number')),
+                ('supply_date', models.DateField(default=django.utils.timezone.now, verbose_name='Supply Date')),
+                ('expected_delivery', models.DateField(verbose_name='Expected Delivery Date')),
+                ('actual_delivery', models.DateField(blank=True, null=True, verbose_name='Actual Delivery Date')),
+                ('product_name', models.CharField(max_length=255, verbose_name='Product Name')),
+                ('quantity_supplied', models.PositiveIntegerField(verbose_name='Quantity Supplied')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Unit Price')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Total Amount')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('dispatched', 'Dispatched'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('tracking_number', models.CharField(blank=True, max_length=100, null=True, verbose_name='Tracking Number')),
+                ('delivery_notes', models.TextField(blank=True, null=True, verbose_name='Delivery Notes')),
+                ('quality_rating', models.DecimalField(decimal_places=2, default=0.0, max_digits=3, verbose_name='Quality Rating (out of 5)')),
+                ('feedback', models.TextField(blank=True, null=True, verbose_name='Feedback')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('orders', models.ManyToManyField(blank=True, related_name='supplies', to='campaign.order', verbose_name='Related Orders')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='supplies', to='campaign.supplier', verbose_name='Supplier')),
+            ],
+            options={
+                'verbose_name': 'Supply',
+                'verbose_name_plural': 'Supplies',
+                'ordering': ['-supply_date', '-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScanTracking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', models.GenericIPAddressField()),
+                ('user_agent', models.TextField()),
+                ('device_fingerprint', models.CharField(max_length=64)),
+                ('device_type', models.CharField(choices=[('mobile', 'Mobile'), ('tablet', 'Tablet'), ('desktop', 'Desktop'), ('unknown', 'Unknown')], default='mobile', max_length=20)),
+                ('browser', models.CharField(blank=True, max_length=50)),
+                ('os', models.CharField(blank=True, max_length=50)),
+                ('video_duration', models.IntegerField(default=0, help_text='Total video duration in seconds')),
+                ('video_watched', models.IntegerField(default=0, help_text='Seconds watched')),
+                ('video_completed', models.BooleanField(default=False)),
+                ('video_percentage', models.DecimalField(decimal_places=2, default=0.0, max_digits=5)),
+                ('user_name', models.CharField(blank=True, max_length=100)),
+                ('user_phone', models.CharField(blank=True, max_length=20)),
+                ('form_submitted', models.BooleanField(default=False)),
+                ('scanned_at', models.DateTimeField(auto_now_add=True)),
+                ('form_submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('last_activity', models.DateTimeField(auto_now=True)),
+                ('session_id', models.CharField(help_text='Unique session identifier', max_length=64)),
+                ('reward_status', models.CharField(choices=[('pending', 'Video Watched - Pending'), ('granted', 'Reward Granted'), ('invalid', 'Invalid Details'), ('duplicate', 'Duplicate Number')], default='pending', help_text='Current status of reward for this submission', max_length=20)),
+                ('reward_amount', models.DecimalField(blank=True, decimal_places=2, help_text='Amount of reward granted', max_digits=10, null=True)),
+                ('reward_granted_at', models.DateTimeField(blank=True, help_text='When the reward was granted', null=True)),
+                ('reward_notes', models.TextField(blank=True, help_text='Notes about reward status or issues')),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scans', to='campaign.advcampaign')),
+            ],
+            options={
+                'ordering': ['-scanned_at'],
+                'indexes': [models.Index(fields=['campaign', 'scanned_at'], name='campaign_sc_campaig_5c4587_idx'), models.Index(fields=['device_fingerprint'], name='campaign_sc_device__cae5e1_idx'), models.Index(fields=['session_id'], name='campaign_sc_session_33fd11_idx'), models.Index(fields=['campaign', 'user_phone'], name='campaign_sc_campaig_8f4c51_idx'), models.Index(fields=['campaign', 'form_submitted'], name='campaign_sc_campaig_9d71a3_idx'), models.Index(fields=['campaign', 'reward_status'], name='campaign_sc_campaig_d44ba6_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('form_submitted', True), models.Q(('user_phone', ''), _negated=True)), fields=('campaign', 'user_phone'), name='unique_phone_per_campaign')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scantracking',
+            name='rollup_bucket',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scantracking',
+            name='rollup_state',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scantracking',
+            name='rollup_watched',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CampaignHourlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the local (TIME_ZONE) hour the scans happened in')),
+                ('device_type', models.CharField(max_length=20)),
+                ('scans', models.IntegerField(default=0)),
+                ('starts', models.IntegerField(default=0)),
+                ('completions', models.IntegerField(default=0)),
+                ('submissions', models.IntegerField(default=0)),
+                ('watch_seconds', models.BigIntegerField(default=0)),
+                ('watched_0_25', models.IntegerField(default=0)),
+                ('watched_26_50', models.IntegerField(default=0)),
+                ('watched_51_75', models.IntegerField(default=0)),
+                ('watched_76_99', models.IntegerField(default=0)),
+                ('watched_100', models.IntegerField(default=0)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='campaign.advcampaign')),
+            ],
+            options={
+                'verbose_name': 'Campaign Hourly Stats',
+                'verbose_name_plural': 'Campaign Hourly Stats',
+                'ordering': ['campaign', 'hour'],
+                'constraints': [models.UniqueConstraint(fields=('campaign', 'hour', 'device_type'), name='unique_campaign_hour_device')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0002_scantracking_rollup_bucket_scantracking_rollup_state_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advcampaign',
+            name='granted_reward_amount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='advcampaign',
+            name='granted_rewards',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='advcampaign',
+            name='invalid_rewards',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='advcampaign',
+            name='pending_rewards',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='advcampaign',
+            name='total_completions',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='advcampaign',
+            name='total_scans',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='advcampaign',
+            name='total_submissions',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='scantracking',
+            name='rollup_reward',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0003_advcampaign_granted_reward_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='campaignhourlystats',
+            old_name='watched_26_50',
+            new_name='watched_25_50',
+        ),
+        migrations.RenameField(
+            model_name='campaignhourlystats',
+            old_name='watched_51_75',
+            new_name='watched_50_75',
+        ),
+        migrations.RenameField(
+            model_name='campaignhourlystats',
+            old_name='watched_76_99',
+            new_name='watched_75_100',
+        ),
+    ]
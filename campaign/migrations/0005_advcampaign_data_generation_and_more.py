@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0004_rename_watched_26_50_campaignhourlystats_watched_25_50_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advcampaign',
+            name='data_generation',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='advcampaign',
+            name='reward_generation',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0005_advcampaign_data_generation_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignDeviceSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('registers', models.BinaryField()),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='device_sketches', to='campaign.advcampaign')),
+            ],
+            options={
+                'ordering': ['campaign', 'day'],
+                'constraints': [models.UniqueConstraint(fields=('campaign', 'day'), name='unique_campaign_day_sketch')],
+            },
+        ),
+    ]
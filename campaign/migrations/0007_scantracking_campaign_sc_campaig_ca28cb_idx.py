@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0006_campaigndevicesketch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scantracking',
+            index=models.Index(fields=['campaign', 'device_fingerprint', 'scanned_at'], name='campaign_sc_campaig_ca28cb_idx'),
+        ),
+    ]
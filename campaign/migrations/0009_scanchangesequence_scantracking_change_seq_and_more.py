@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0008_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scantracking',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='scantracking',
+            index=models.Index(fields=['campaign', 'change_seq', 'id'], name='campaign_sc_campaig_1f9af3_idx'),
+        ),
+    ]
@@ -1,5 +1,11 @@
 # models.py
-from django.db import models
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, models, transaction
+
+from .db import update_returning
 
 class Client(models.Model):
     company_name = models.CharField(max_length=255)
@@ -39,10 +45,39 @@ class AdvCampaign(models.Model):
     qr_code = models.ImageField(upload_to='campaign_qr_codes/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    # Denormalized scan counters, moved with F() increments by campaign/rollups.py
+    total_scans = models.PositiveIntegerField(default=0, editable=False)
+    total_submissions = models.PositiveIntegerField(default=0, editable=False)
+    total_completions = models.PositiveIntegerField(default=0, editable=False)
+    pending_rewards = models.PositiveIntegerField(default=0, editable=False)
+    granted_rewards = models.PositiveIntegerField(default=0, editable=False)
+    invalid_rewards = models.PositiveIntegerField(default=0, editable=False)
+    granted_reward_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    
+    # Bumped with the counters; tags cached report results (report_cache.py).
+    # reward_generation only moves on submission / reward changes.
+    data_generation = models.PositiveBigIntegerField(default=0, editable=False)
+    reward_generation = models.PositiveBigIntegerField(default=0, editable=False)
+    
+    COUNTER_FIELDS = (
+        'total_scans', 'total_submissions', 'total_completions',
+        'pending_rewards', 'granted_rewards', 'invalid_rewards', 'granted_reward_amount',
+    )
+    GENERATION_FIELDS = ('data_generation', 'reward_generation')
 
     def __str__(self):
         return self.camp_name
     
+    def save(self, *args, **kwargs):
+        # Saving an edited campaign must not put back the counters it was loaded with
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS + self.GENERATION_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['-start_date', '-created_at']
         verbose_name = 'Advertisement Campaign'
@@ -116,6 +151,9 @@ class ScanTracking(models.Model):
     scanned_at = models.DateTimeField(auto_now_add=True)
     form_submitted_at = models.DateTimeField(null=True, blank=True)
     last_activity = models.DateTimeField(auto_now=True)
+    # Position in the commit order of changes, for the delta export keyset
+    # (see ScanChangeSequence and campaign/delta_export.py)
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)
     
     # Session tracking
     session_id = models.CharField(
@@ -157,15 +195,26 @@ class ScanTracking(models.Model):
         help_text="Notes about reward status or issues"
     )
     
+    # ========== ROLLUP BOOKKEEPING ==========
+    # What this scan currently contributes to CampaignHourlyStats and the
+    # AdvCampaign counters (see campaign/rollups.py); compared-and-swapped
+    # when progress crosses a milestone or the scan is saved
+    rollup_state = models.PositiveSmallIntegerField(default=0)
+    rollup_bucket = models.PositiveSmallIntegerField(default=0)
+    rollup_watched = models.IntegerField(default=0)
+    rollup_reward = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
     class Meta:
         ordering = ['-scanned_at']
         indexes = [
             models.Index(fields=['campaign', 'scanned_at']),
             models.Index(fields=['device_fingerprint']),
+            models.Index(fields=['campaign', 'device_fingerprint', 'scanned_at']),  # Cohort window
             models.Index(fields=['session_id']),
             models.Index(fields=['campaign', 'user_phone']),
             models.Index(fields=['campaign', 'form_submitted']),
             models.Index(fields=['campaign', 'reward_status']),  # New index for reward queries
+            models.Index(fields=['campaign', 'change_seq', 'id']),  # Delta export keyset
         ]
         # Unique constraint for phone number per campaign
         constraints = [
@@ -249,6 +298,8 @@ class ScanTracking(models.Model):
         
         # Update last activity timestamp
         self.last_activity = timezone.now()
+        if kwargs.get('update_fields') is not None and 'change_seq' not in kwargs['update_fields']:
+            kwargs['update_fields'] = [*kwargs['update_fields'], 'change_seq']
         
         # Calculate percentage if duration is known
         if self.video_duration > 0:
@@ -257,7 +308,111 @@ class ScanTracking(models.Model):
                 2
             )
         
-        super().save(*args, **kwargs)
+        # Rollup bookkeeping is only written by campaign/rollups.py; a full
+        # save of a loaded scan must not put back the values it was loaded with
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and not f.name.startswith('rollup_')
+            ]
+        
+        # The rollup hooks run in post_save; commit them with the INSERT so a
+        # failed hook (and a retry_on_lock retry) never leaves a counted scan
+        # whose counters were not applied. The change number must commit with
+        # the row too.
+        with transaction.atomic():
+            self.change_seq = ScanChangeSequence.next_value()
+            super().save(*args, **kwargs)
+
+
+class ScanChangeSequence(models.Model):
+    """
+    Single-row counter that numbers ScanTracking changes in commit order.
+
+    Every write to a delta-exported scan field takes the next value inside its
+    transaction and stores it in ``change_seq``. The UPDATE holds the counter
+    row until commit (SQLite serialises all writers anyway), so a transaction
+    that commits later always carries a larger number, however long it ran
+    or however early it stamped ``last_activity``.
+    """
+    value = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def next_value(cls):
+        """Next change number; call inside the transaction that writes the scans"""
+        rows = update_returning(cls.objects.filter(pk=1), {'value': models.F('value') + 1}, ('value',))
+        if rows:
+            return rows[0]['value']
+        try:
+            with transaction.atomic():
+                cls.objects.create(pk=1, value=1)
+            return 1
+        except IntegrityError:
+            return cls.next_value()
+
+class CampaignHourlyStats(models.Model):
+    """
+    Scan rollup per campaign, local hour of scan and device type.
+    Maintained incrementally by campaign/rollups.py; rebuild with
+    `manage.py rebuild_rollups`.
+    """
+    campaign = models.ForeignKey(
+        'AdvCampaign',
+        on_delete=models.CASCADE,
+        related_name='hourly_stats'
+    )
+    hour = models.DateTimeField(help_text="Start of the local (TIME_ZONE) hour the scans happened in")
+    device_type = models.CharField(max_length=20)
+    
+    scans = models.IntegerField(default=0)
+    starts = models.IntegerField(default=0)
+    completions = models.IntegerField(default=0)
+    submissions = models.IntegerField(default=0)
+    watch_seconds = models.BigIntegerField(default=0)
+    
+    # Watch distribution, same half-open buckets as the campaign report:
+    # [0, 25), [25, 50), [50, 75), [75, 100) and 100%
+    watched_0_25 = models.IntegerField(default=0)
+    watched_25_50 = models.IntegerField(default=0)
+    watched_50_75 = models.IntegerField(default=0)
+    watched_75_100 = models.IntegerField(default=0)
+    watched_100 = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['campaign', 'hour']
+        verbose_name = 'Campaign Hourly Stats'
+        verbose_name_plural = 'Campaign Hourly Stats'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['campaign', 'hour', 'device_type'],
+                name='unique_campaign_hour_device'
+            )
+        ]
+    
+    def __str__(self):
+        return f"{self.campaign_id} - {self.hour:%Y-%m-%d %H:00} - {self.device_type}"
+
+class CampaignDeviceSketch(models.Model):
+    """
+    HyperLogLog sketch of the device fingerprints that scanned a campaign on
+    one local day. Maintained by campaign/device_sketch.py.
+    """
+    campaign = models.ForeignKey(
+        'AdvCampaign',
+        on_delete=models.CASCADE,
+        related_name='device_sketches'
+    )
+    day = models.DateField()
+    registers = models.BinaryField()
+    
+    class Meta:
+        ordering = ['campaign', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'day'], name='unique_campaign_day_sketch')
+        ]
+    
+    def __str__(self):
+        return f"{self.campaign_id} - {self.day}"
 
 # models.py
 
@@ -566,3 +721,108 @@ class Supply(models.Model):
     @property
     def related_orders_count(self):
         return self.orders.count()
+
+
+class PrivateExportStorage(FileSystemStorage):
+    """
+    ExportJob files under EXPORT_JOB_ROOT. They hold phone numbers and form
+    fields, so they live outside MEDIA_ROOT (served without a login) and have
+    no URL: download_export_job is the only way to fetch them.
+    """
+
+    @property
+    def base_location(self):
+        return str(getattr(settings, 'EXPORT_JOB_ROOT', settings.BASE_DIR / 'private' / 'exports'))
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    base_url = None
+
+
+def export_storage():
+    return PrivateExportStorage()
+
+
+class ExportJob(models.Model):
+    """
+    A CSV export written to EXPORT_JOB_ROOT by `manage.py run_export_jobs`,
+    polled by the dashboard until the file is ready. See campaign/export_jobs.py.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    export = models.CharField(max_length=30, help_text="Name of the export in campaign.exports.EXPORTS")
+    params = models.JSONField(default=dict, blank=True)
+    filename = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+
+    rows_done = models.PositiveIntegerField(default=0)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    file = models.FileField(storage=export_storage, blank=True)
+    error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='export_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='exportjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.export} #{self.pk} ({self.status})"
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return 0
+        return round(self.rows_done / self.total_rows * 100, 1)
+
+
+class RewardBulkUpdate(models.Model):
+    """Audit record of one bulk reward status change from rewards_detail"""
+    campaign = models.ForeignKey(
+        'AdvCampaign',
+        on_delete=models.CASCADE,
+        related_name='reward_bulk_updates'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reward_bulk_updates'
+    )
+    reward_status = models.CharField(max_length=20)
+    reward_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    requested = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    scan_ids = models.TextField(blank=True, help_text="Updated scan ids as ranges, e.g. '4-9,12'")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.campaign_id} - {self.reward_status} x{self.updated} ({self.created_at:%Y-%m-%d %H:%M})"
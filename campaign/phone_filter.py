@@ -0,0 +1,83 @@
+# phone_filter.py - Per-campaign membership filter of registered phone numbers
+"""
+The unique_phone_per_campaign constraint is what stops a phone number from
+registering twice; submit_scan_form just writes and turns the IntegrityError
+into the "already registered" message. This module only saves work in front
+of it: each worker keeps a Bloom filter of the phones registered per
+campaign, warmed from the database on first use. A number the filter has
+never seen is almost certainly new and goes straight to the write; only
+possible duplicates pay for a lookup.
+
+The filter never needs invalidating for correctness. Numbers registered
+through other workers are unknown here, so they take the write path and hit
+the constraint; deleted registrations only cost a redundant lookup.
+"""
+import hashlib
+import math
+import threading
+
+from .models import ScanTracking
+
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 1024
+MAX_CAMPAIGNS = 1000
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on blake2b)"""
+
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    @property
+    def saturated(self):
+        return self.count > self.capacity
+
+
+_filters = {}
+_lock = threading.Lock()
+
+
+def registered_phones(campaign_id):
+    """Filter of phones registered for the campaign, warmed from the DB on first use"""
+    phones = _filters.get(campaign_id)
+    if phones is not None and not phones.saturated:
+        return phones
+
+    registered = list(
+        ScanTracking.objects.filter(campaign_id=campaign_id, form_submitted=True)
+        .exclude(user_phone='')
+        .values_list('user_phone', flat=True)
+    )
+    phones = BloomFilter(max(MIN_CAPACITY, len(registered) * 2))
+    for phone in registered:
+        phones.add(phone)
+
+    with _lock:
+        if len(_filters) >= MAX_CAMPAIGNS:
+            _filters.clear()
+        _filters[campaign_id] = phones
+    return phones
+
+
+def clear():
+    with _lock:
+        _filters.clear()
@@ -0,0 +1,294 @@
+# progress.py - Video progress persistence
+"""
+Database-side video progress updates and the write-behind heartbeat buffer.
+
+Every viewer on the landing page sends a heartbeat every 5 seconds. With
+HEARTBEAT_BUFFER_ENABLED the heartbeats are coalesced in memory per scan and
+flushed in batched UPDATEs every HEARTBEAT_FLUSH_INTERVAL seconds, so database
+writes scale with the flush frequency instead of the number of viewers.
+"""
+import atexit
+import logging
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, DecimalField, F, FloatField, Value, When
+from django.db.models.functions import Cast, Greatest, Least, Round
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .db import retry_on_lock, update_returning
+from .models import ScanChangeSequence, ScanTracking
+from .rollups import ROLLUP_FIELDS, SOURCE_FIELDS, sync_rollup_row, sync_rollups
+
+logger = logging.getLogger(__name__)
+
+
+# ============== UPDATE EXPRESSIONS ==============
+def progress_expressions(watched_seconds, video_duration, completed):
+    """
+    Build the UPDATE expressions for one heartbeat.
+
+    Mirrors the rules of the original read-modify-write: the duration is only
+    set once, watched time never goes backwards, completion pins watched time
+    to the duration and the percentage is capped at 100.
+    """
+    def duration():
+        if video_duration > 0:
+            return Case(
+                When(video_duration=0, then=Value(video_duration)),
+                default=F('video_duration'),
+            )
+        return F('video_duration')
+
+    def watched():
+        if completed:
+            return duration()
+        return Greatest(F('video_watched'), Value(watched_seconds))
+
+    percentage = Case(
+        When(
+            GreaterThan(duration(), 0),
+            then=Round(
+                Least(Cast(watched(), FloatField()) * 100 / duration(), Value(100.0)),
+                2,
+            ),
+        ),
+        default=F('video_percentage'),
+        output_field=DecimalField(max_digits=5, decimal_places=2),
+    )
+
+    expressions = {
+        'video_duration': duration(),
+        'video_watched': watched(),
+        'video_percentage': percentage,
+    }
+    if completed:
+        expressions['video_completed'] = Value(True)
+    return expressions
+
+
+def batch_progress_updates(entries):
+    """
+    Build keyword arguments for a single UPDATE covering many scans.
+
+    ``entries`` maps scan_id -> (watched_seconds, video_duration, completed).
+    Each column becomes a CASE over the scan ids so one statement writes the
+    whole batch.
+    """
+    whens = {}
+    for scan_id, (watched_seconds, video_duration, completed) in entries.items():
+        expressions = progress_expressions(watched_seconds, video_duration, completed)
+        for field, expression in expressions.items():
+            whens.setdefault(field, []).append(When(id=scan_id, then=expression))
+
+    updates = {
+        field: Case(*field_whens, default=F(field))
+        for field, field_whens in whens.items()
+    }
+    updates['last_activity'] = timezone.now()
+    return updates
+
+
+PROGRESS_FIELDS = ('video_duration', 'video_watched', 'video_percentage', 'video_completed')
+
+
+@retry_on_lock
+def apply_progress(scan_id, watched_seconds, video_duration, completed):
+    """
+    Apply one heartbeat in a single UPDATE and return the new progress values.
+
+    Only the progress columns and ``last_activity`` are written, and the max /
+    least logic runs inside the database, so two heartbeats for the same scan
+    can no longer overwrite each other. Returns None if the scan doesn't exist.
+    The returned row also carries what the hourly rollup needs, so crossing a
+    milestone costs the rollup writes and no extra read.
+    """
+    updates = progress_expressions(watched_seconds, video_duration, completed)
+    updates['last_activity'] = timezone.now()
+    with transaction.atomic():
+        updates['change_seq'] = ScanChangeSequence.next_value()
+        rows = update_returning(
+            ScanTracking.objects.filter(id=scan_id), updates,
+            ('id',) + PROGRESS_FIELDS + SOURCE_FIELDS + ROLLUP_FIELDS,
+        )
+        if not rows:
+            return None
+        sync_rollup_row(rows[0])
+    return rows[0]
+
+
+@retry_on_lock
+def apply_progress_batch(entries, batch_size=200):
+    """
+    Apply coalesced progress for many scans in one transaction.
+
+    ``entries`` maps scan_id -> (watched_seconds, video_duration, completed);
+    each chunk of ``batch_size`` scans is a single UPDATE, followed by the
+    rollup sync of the chunk. Returns the number of rows updated.
+    """
+    items = list(entries.items())
+    updated = 0
+    with transaction.atomic():
+        change_seq = ScanChangeSequence.next_value()
+        for start in range(0, len(items), batch_size):
+            batch = dict(items[start:start + batch_size])
+            updated += ScanTracking.objects.filter(id__in=batch.keys()).update(
+                **batch_progress_updates(batch), change_seq=change_seq
+            )
+            sync_rollups(batch.keys())
+    return updated
+
+
+def merge_progress(current, watched_seconds, video_duration, completed):
+    """Fold one heartbeat into a coalesced (watched, duration, completed) state"""
+    if current is None:
+        return (watched_seconds, video_duration, bool(completed))
+    watched, duration, done = current
+    return (
+        max(watched, watched_seconds),
+        duration or video_duration,
+        done or bool(completed),
+    )
+
+
+# ============== WRITE-BEHIND BUFFER ==============
+class HeartbeatBuffer:
+    """
+    Coalesce heartbeats per scan and flush them periodically.
+
+    Only the latest state per scan is kept (max watched seconds, first known
+    duration, completed flag), so a viewer costs one row in the next batch no
+    matter how many heartbeats it sent. At most ``flush_interval`` seconds of
+    progress can be lost on a hard crash; a normal worker shutdown flushes
+    through ``atexit``.
+
+    The buffer holds at most ``max_pending`` scans, also while flushes fail
+    and batches are re-queued: beyond that the scans buffered longest ago are
+    shed and counted, and the next flush logs how many. Heartbeats carry the
+    viewer's whole progress, so a shed scan is restored by its next one.
+    Completed scans are never shed, since no heartbeat follows a completion.
+    """
+
+    def __init__(self, flush_interval=5, max_pending=5000, batch_size=200):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._pending = {}
+        self._shed = 0
+        self.shed_total = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def record(self, scan_id, watched_seconds, video_duration, completed):
+        """Merge a heartbeat into the buffer and return the coalesced state"""
+        with self._lock:
+            state = self._merge(scan_id, watched_seconds, video_duration, completed)
+            self._trim()
+            pending = len(self._pending)
+
+        self._ensure_started()
+        if pending >= self.max_pending:
+            self._wakeup.set()
+
+        watched, duration, done = state
+        if done:
+            watched = duration
+        percentage = round(min(watched / duration * 100, 100), 2) if duration > 0 else 0
+        return {
+            'duration': duration,
+            'watched': watched,
+            'percentage': percentage,
+            'completed': done,
+        }
+
+    def flush(self):
+        """Write all pending heartbeats to the database. Returns rows flushed."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._pending = self._pending, {}
+                shed, self._shed = self._shed, 0
+            if shed:
+                logger.warning('Heartbeat buffer full; %d scans shed since the last flush', shed)
+            if not entries:
+                return 0
+
+            try:
+                updated = apply_progress_batch(entries, self.batch_size)
+                if updated < len(entries):
+                    # Scans still in the spool: the loader replays their progress
+                    from .scan_spool import spool_unloaded_progress
+                    spool_unloaded_progress(entries)
+            except Exception:
+                # Put the batch back so the next flush retries it, ahead of
+                # the heartbeats that arrived meanwhile so those are kept
+                with self._lock:
+                    newer, self._pending = self._pending, {}
+                    for pending in (entries, newer):
+                        for scan_id, state in pending.items():
+                            self._merge(scan_id, *state)
+                    self._trim()
+                logger.exception(
+                    'Heartbeat flush failed; %d scans re-queued, %d pending',
+                    len(entries), len(self._pending),
+                )
+                return 0
+            return len(entries)
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def _merge(self, scan_id, watched_seconds, video_duration, completed):
+        state = merge_progress(
+            self._pending.get(scan_id), watched_seconds, video_duration, completed
+        )
+        self._pending[scan_id] = state
+        return state
+
+    def _trim(self):
+        """Shed the longest-buffered unfinished scans beyond max_pending (lock held)"""
+        excess = len(self._pending) - self.max_pending
+        if excess <= 0:
+            return
+        unfinished = (scan_id for scan_id, (_, _, done) in self._pending.items() if not done)
+        shed = list(islice(unfinished, excess))
+        for scan_id in shed:
+            del self._pending[scan_id]
+        self._shed += len(shed)
+        self.shed_total += len(shed)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='heartbeat-flusher', daemon=True
+            )
+            self._thread.start()
+            atexit.register(self._flush_in_thread)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush_in_thread()
+
+    def _flush_in_thread(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+
+heartbeat_buffer = HeartbeatBuffer(
+    flush_interval=getattr(settings, 'HEARTBEAT_FLUSH_INTERVAL', 5),
+    max_pending=getattr(settings, 'HEARTBEAT_MAX_PENDING', 5000),
+)
@@ -0,0 +1,123 @@
+# rate_limit.py - In-memory scan-storm protection for the public endpoints
+"""
+Token buckets keyed by device fingerprint and by IP, checked before
+adv_landing creates a scan and before progress heartbeats are applied.
+``?new=true`` loops and scripted scanners get a pre-rendered 429 response
+instead of new ScanTracking rows; reloads that continue the scan in the
+cookie create no row and are never charged. Throttled heartbeats get a 429
+too, but their progress is coalesced into the heartbeat buffer rather than
+dropped, since beacons are not retried.
+
+Limits are (requests per minute, burst). Landing limits come from
+SCAN_RATE_LIMITS['default'], optionally overridden per campaign unique_id;
+heartbeats use HEARTBEAT_RATE_LIMITS. Buckets and the shed counters are per
+worker and cost no database access. The defaults leave room for venues
+where a crowd shares one carrier-NAT IP (and so, for the same phone model,
+one fingerprint); tighten them per campaign when a code is being abused.
+
+The IP is views.get_client_ip, which only trusts X-Forwarded-For hops added
+by the TRUSTED_PROXY_COUNT proxies in front of the app, so a client cannot
+pick a fresh bucket per request. When the table is full the least recently
+used buckets are evicted, never all of them.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+
+MAX_KEYS = 100000
+
+DEFAULT_SCAN_LIMITS = {'fingerprint': (10, 20), 'ip': (600, 1200)}
+DEFAULT_HEARTBEAT_LIMITS = {'fingerprint': (30, 30), 'ip': (600, 600)}
+
+
+class TokenBuckets:
+    """Thread-safe token buckets, created full on first use of a key"""
+
+    def __init__(self, max_keys=MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def take(self, key, per_minute, burst):
+        """Take one token from ``key``'s bucket; False if it is empty"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * per_minute / 60)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                # Least recently used first: those have refilled the most
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        return allowed
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+buckets = TokenBuckets()
+shed = Counter()
+allowed = Counter()
+
+
+def scan_limits(unique_id):
+    limits = getattr(settings, 'SCAN_RATE_LIMITS', {})
+    return limits.get(unique_id) or limits.get('default', DEFAULT_SCAN_LIMITS)
+
+
+def _check(endpoint, scope, limits, fingerprint, ip_address):
+    if not getattr(settings, 'SCAN_RATE_LIMIT_ENABLED', True):
+        return True
+    for dimension, key in (('fingerprint', fingerprint), ('ip', ip_address)):
+        if dimension in limits and not buckets.take((scope, dimension, key), *limits[dimension]):
+            shed[f'{endpoint}.{dimension}'] += 1
+            return False
+    allowed[endpoint] += 1
+    return True
+
+
+def allow_scan(campaign, fingerprint, ip_address):
+    """Whether a landing page view for ``campaign`` may proceed"""
+    return _check('landing', campaign.id, scan_limits(campaign.unique_id), fingerprint, ip_address)
+
+
+def allow_heartbeat(fingerprint, ip_address):
+    """Whether a progress heartbeat (or beacon batch) may proceed"""
+    limits = getattr(settings, 'HEARTBEAT_RATE_LIMITS', DEFAULT_HEARTBEAT_LIMITS)
+    return _check('heartbeat', 'heartbeat', limits, fingerprint, ip_address)
+
+
+def stats():
+    """Allowed and shed request counts of this worker"""
+    return {'allowed': dict(allowed), 'shed': dict(shed), 'evicted_buckets': buckets.evicted}
+
+
+# ============== SHED RESPONSES ==============
+RETRY_AFTER = '60'
+_landing_page = None
+
+
+def throttled_landing():
+    """429 page rendered once per worker"""
+    global _landing_page
+    if _landing_page is None:
+        _landing_page = render_to_string('campaign/invalid_qr.html', {
+            'error': 'Too many scans from this device. Please wait a minute and try again.'
+        }).encode()
+    response = HttpResponse(_landing_page, status=429)
+    response['Retry-After'] = RETRY_AFTER
+    return response
+
+
+def throttled_heartbeat():
+    response = JsonResponse({'status': 'throttled'}, status=429)
+    response['Retry-After'] = RETRY_AFTER
+    return response
@@ -0,0 +1,74 @@
+# report_cache.py - Report results cached per campaign data generation
+"""
+report_detail and rewards_detail metrics are cached under the campaign's
+``data_generation``, which the rollup sync bumps together with the campaign
+counters on every scan creation, submission, milestone and reward change.
+The campaign row the view loads anyway carries the generation, so a repeat
+load between two writes is a cache hit and costs no metric queries, and any
+write makes the next load recompute.
+
+During a launch spike every scan bumps the generation. With
+REPORT_CACHE_STALE_SECONDS > 0 an entry computed at most that many seconds
+ago is still served after scan and progress changes, but never after a
+submission or reward change: those also bump ``reward_generation``, which
+must match exactly.
+
+Results that only read the scans themselves (the returning-device cohorts)
+pass their own ``stale_seconds``, COHORT_CACHE_STALE_SECONDS: within that
+age they are served whatever changed, since submissions and rewards do not
+affect them.
+
+Entries live in Django's default cache. Without a shared CACHES backend
+each worker has its own entries, which are still correct, only colder.
+"""
+import hashlib
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'report'
+
+counts = Counter()
+
+
+def report_key(campaign_id, kind, params=()):
+    digest = hashlib.blake2b(repr(tuple(params)).encode(), digest_size=8).hexdigest()
+    return f'{KEY_PREFIX}:{campaign_id}:{kind}:{digest}'
+
+
+def cached_report(campaign, kind, compute, params=(), stale_seconds=None):
+    """
+    ``compute()`` for ``campaign``, cached under its data generation. ``kind``
+    and ``params`` (e.g. the page filters) identify the result. With
+    ``stale_seconds`` the result ignores submissions and rewards, and an
+    entry that recent is served after any change.
+    """
+    if not getattr(settings, 'REPORT_CACHE_ENABLED', True):
+        return compute()
+
+    key = report_key(campaign.id, kind, params)
+    entry = cache.get(key)
+    if entry is not None:
+        data_generation, reward_generation, computed_at, result = entry
+        if data_generation == campaign.data_generation:
+            counts['hit'] += 1
+            return result
+        if stale_seconds is None:
+            tolerance = getattr(settings, 'REPORT_CACHE_STALE_SECONDS', 0)
+            rewards_unchanged = reward_generation == campaign.reward_generation
+        else:
+            tolerance, rewards_unchanged = stale_seconds, True
+        if rewards_unchanged and time.time() - computed_at <= tolerance:
+            counts['stale_hit'] += 1
+            return result
+
+    counts['miss'] += 1
+    result = compute()
+    cache.set(
+        key,
+        (campaign.data_generation, campaign.reward_generation, time.time(), result),
+        getattr(settings, 'REPORT_CACHE_TTL', 3600),
+    )
+    return result
@@ -0,0 +1,87 @@
+# reward_updates.py - Set-based bulk reward status changes
+"""
+The "bulk update" action of rewards_detail. The selected ids are validated up
+front, then each chunk of CHUNK_SIZE ids is one ``UPDATE ... WHERE id IN
+(...) AND campaign_id = ...`` (rollups.set_rewards, which also moves the
+campaign's reward counters), all in one transaction together with a
+RewardBulkUpdate audit row. Ids that are malformed, belong to another
+campaign or are not submissions are counted as rejected, never skipped
+silently.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .db import retry_on_lock
+from .models import RewardBulkUpdate, ScanChangeSequence
+from .rollups import REWARD_STATES, set_rewards
+
+CHUNK_SIZE = 500
+
+
+def parse_scan_ids(values):
+    """(sorted distinct ids, number of values that are not ids)"""
+    ids, malformed = set(), 0
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            malformed += 1
+    return sorted(ids), malformed
+
+
+def parse_amount(value):
+    """Reward amount from a form value; None when blank"""
+    if value in (None, ''):
+        return None
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ValueError('Reward amount must be a number')
+    if not amount.is_finite() or amount < 0:
+        raise ValueError('Reward amount must be a positive number')
+    return amount.quantize(Decimal('0.01'))
+
+
+def compact_ids(ids):
+    """Sorted ids as ranges: [1, 2, 3, 7] -> '1-3,7'"""
+    ranges = []
+    for scan_id in ids:
+        if ranges and scan_id == ranges[-1][1] + 1:
+            ranges[-1][1] = scan_id
+        else:
+            ranges.append([scan_id, scan_id])
+    return ','.join(str(lo) if lo == hi else f'{lo}-{hi}' for lo, hi in ranges)
+
+
+@retry_on_lock
+def bulk_update_rewards(campaign, scan_ids, status, amount=None, user=None):
+    """
+    Set ``status`` (and ``amount`` when granting) on the campaign's submitted
+    scans among ``scan_ids``. Returns {'requested', 'updated', 'rejected'};
+    raises ValueError for an unknown status or a bad amount.
+    """
+    if status not in REWARD_STATES:
+        raise ValueError(f'Invalid reward status "{status}"')
+    amount = parse_amount(amount) if status == 'granted' else None
+    ids, malformed = parse_scan_ids(scan_ids)
+
+    updated = []
+    with transaction.atomic():
+        now = timezone.now()
+        change_seq = ScanChangeSequence.next_value()
+        for start in range(0, len(ids), CHUNK_SIZE):
+            updated += set_rewards(
+                campaign.id, ids[start:start + CHUNK_SIZE], status, amount, now=now, change_seq=change_seq,
+            )
+        result = {
+            'requested': len(ids) + malformed,
+            'updated': len(updated),
+            'rejected': len(ids) + malformed - len(updated),
+        }
+        RewardBulkUpdate.objects.create(
+            campaign=campaign, user=user, reward_status=status, reward_amount=amount,
+            scan_ids=compact_ids(sorted(updated)), **result,
+        )
+    return result
@@ -0,0 +1,447 @@
+# rollups.py - Incrementally maintained CampaignHourlyStats and campaign counters
+"""
+Per (campaign, local hour, device type) counters of scans, video starts,
+completions, form submissions, watch seconds and the watch distribution, so
+reports read a few rows per hour instead of every scan of the campaign. The
+same transitions move the per-campaign counters on AdvCampaign (scans,
+submissions, completions, rewards by status, granted amount) that the list
+pages read.
+
+Each scan records what it currently contributes in its ``rollup_state`` (bit
+flags), ``rollup_bucket`` (index into analytics.WATCH_BUCKETS),
+``rollup_watched`` and ``rollup_reward`` columns. A sync compares that with
+what the scan should contribute now, moves the recorded values with a
+compare-and-swap UPDATE and applies only the difference, as F() increments,
+to the stats row and the campaign. A scan is therefore counted exactly once
+however often, and from however many workers, it is synced, and a sync that
+failed is caught up by the next one.
+
+A scan's device is added to the campaign's daily HyperLogLog sketch
+(device_sketch.py) when the scan is first counted.
+
+Cost: a directly inserted scan also updates its campaign's counter row and
+its hourly stats row (plus, until the day's sketch has warmed up, the
+sketch), all committed with the INSERT in one transaction (see
+ScanTracking.save), so a failed hook rolls the scan back with it. Every such
+insert therefore writes the campaign row. For launch spikes, enable
+SCAN_SPOOL_ENABLED: the spool loader inserts scans in batches and applies
+one counter UPDATE per campaign and stats row per chunk of 500 scans.
+
+Syncs happen when a scan is created, when a save touches the tracked columns,
+and when a progress update changes the scan's state or watch bucket. Watch
+seconds between two milestones are not pushed on every heartbeat, so
+``watch_seconds`` trails the raw rows until the next milestone.
+
+Bulk reward status changes go through ``set_rewards``, which updates the
+scans and their recorded reward state together. Scans written by other bulk
+UPDATEs that bypass these hooks, deleted scans and
+changed device types are picked up by ``manage.py rebuild_rollups``;
+``manage.py reconcile_campaign_counters`` finds and rebuilds campaigns whose
+counters drifted.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Trunc
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .analytics import WATCH_BUCKETS, watch_bucket_index
+from .device_sketch import rebuild_sketches, record_device
+from .models import AdvCampaign, CampaignHourlyStats, ScanChangeSequence, ScanTracking
+
+COUNTED = 1
+STARTED = 2
+COMPLETED = 4
+SUBMITTED = 8
+PENDING_REWARD = 16
+GRANTED_REWARD = 32
+INVALID_REWARD = 64
+
+# Reward statuses counted on the campaign (submitted scans only)
+REWARD_STATES = {
+    'pending': PENDING_REWARD,
+    'granted': GRANTED_REWARD,
+    'invalid': INVALID_REWARD,
+}
+
+# (state bit, CampaignHourlyStats counter)
+STATE_COUNTERS = (
+    (COUNTED, 'scans'),
+    (STARTED, 'starts'),
+    (COMPLETED, 'completions'),
+    (SUBMITTED, 'submissions'),
+)
+
+# (state bit, AdvCampaign counter)
+CAMPAIGN_COUNTERS = (
+    (COUNTED, 'total_scans'),
+    (SUBMITTED, 'total_submissions'),
+    (COMPLETED, 'total_completions'),
+    (PENDING_REWARD, 'pending_rewards'),
+    (GRANTED_REWARD, 'granted_rewards'),
+    (INVALID_REWARD, 'invalid_rewards'),
+)
+
+# Counters whose change also bumps AdvCampaign.reward_generation
+REWARD_COUNTERS = {
+    'total_submissions', 'pending_rewards', 'granted_rewards', 'invalid_rewards', 'granted_reward_amount',
+}
+
+# Columns a sync reads; saves that touch none of them skip the sync
+SOURCE_FIELDS = (
+    'campaign_id', 'device_type', 'scanned_at',
+    'video_watched', 'video_percentage', 'video_completed', 'form_submitted',
+    'reward_status', 'reward_amount',
+)
+ROLLUP_FIELDS = ('rollup_state', 'rollup_bucket', 'rollup_watched', 'rollup_reward')
+
+
+def local_hour(dt):
+    """Start of the local hour containing ``dt``"""
+    return timezone.localtime(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def desired(row):
+    """(state, bucket, watched, reward) a scan row should contribute"""
+    state = COUNTED
+    if row['video_watched'] > 0:
+        state |= STARTED
+    if row['video_completed']:
+        state |= COMPLETED
+    if row['form_submitted']:
+        state |= SUBMITTED | REWARD_STATES.get(row['reward_status'], 0)
+    reward = (row['reward_amount'] or Decimal(0)) if state & GRANTED_REWARD else Decimal(0)
+    return state, watch_bucket_index(row['video_percentage']), row['video_watched'], reward
+
+
+def recorded(row):
+    """(state, bucket, watched, reward) the scan currently contributes"""
+    return tuple(row[field] for field in ROLLUP_FIELDS)
+
+
+def contribution(state, bucket, watched, reward):
+    """CampaignHourlyStats counter values for one scan in the given rollup state"""
+    if not state & COUNTED:
+        return {}
+    counters = {field: 1 for bit, field in STATE_COUNTERS if state & bit}
+    counters[WATCH_BUCKETS[bucket][2]] = 1
+    counters['watch_seconds'] = watched
+    return counters
+
+
+def campaign_contribution(state, bucket, watched, reward):
+    """AdvCampaign counter values for one scan in the given rollup state"""
+    counters = {field: 1 for bit, field in CAMPAIGN_COUNTERS if state & bit}
+    if reward:
+        counters['granted_reward_amount'] = reward
+    return counters
+
+
+def delta(old, new, contribution=contribution):
+    """Counter changes moving a scan from rollup state ``old`` to ``new``"""
+    changes = defaultdict(int, contribution(*new))
+    for field, value in contribution(*old).items():
+        changes[field] -= value
+    return {field: value for field, value in changes.items() if value}
+
+
+def rollup_key(row):
+    return row['campaign_id'], local_hour(row['scanned_at']), row['device_type']
+
+
+def apply_deltas(deltas, campaign_deltas=None):
+    """
+    Add ``{(campaign_id, hour, device_type): {counter: change}}`` to the stats
+    rows and ``{campaign_id: {counter: change}}`` to the campaigns, bumping
+    the data generation of every campaign touched
+    """
+    campaign_deltas = {
+        campaign_id: changes for campaign_id, changes in (campaign_deltas or {}).items() if changes
+    }
+    for (campaign_id, _, _), changes in deltas.items():
+        if changes:
+            campaign_deltas.setdefault(campaign_id, {})
+    for campaign_id, changes in campaign_deltas.items():
+        updates = {field: F(field) + value for field, value in changes.items()}
+        updates['data_generation'] = F('data_generation') + 1
+        if not REWARD_COUNTERS.isdisjoint(changes):
+            updates['reward_generation'] = F('reward_generation') + 1
+        AdvCampaign.objects.filter(id=campaign_id).update(**updates)
+    for (campaign_id, hour, device_type), changes in deltas.items():
+        if not changes:
+            continue
+        stats = CampaignHourlyStats.objects.filter(
+            campaign_id=campaign_id, hour=hour, device_type=device_type
+        )
+        updates = {field: F(field) + value for field, value in changes.items()}
+        if stats.update(**updates):
+            continue
+        try:
+            with transaction.atomic():
+                CampaignHourlyStats.objects.create(
+                    campaign_id=campaign_id, hour=hour, device_type=device_type, **changes
+                )
+        except IntegrityError:
+            # Another worker created the row first
+            stats.update(**updates)
+
+
+# ============== SYNC ==============
+def _swap(row, new):
+    """Move the scan's recorded rollup state to ``new``; False if it changed under us"""
+    return ScanTracking.objects.filter(
+        id=row['id'], **dict(zip(ROLLUP_FIELDS, recorded(row)))
+    ).update(**dict(zip(ROLLUP_FIELDS, new)))
+
+
+def is_stale(row, new=None):
+    """Whether the scan crossed a milestone since its last sync"""
+    new = new or desired(row)
+    return (row['rollup_state'], row['rollup_bucket']) != new[:2]
+
+
+def sync_rollup_row(row):
+    """
+    Sync one scan from a row holding SOURCE_FIELDS, ROLLUP_FIELDS and ``id``
+    (e.g. an UPDATE ... RETURNING row). No queries unless a milestone was crossed.
+    """
+    new = desired(row)
+    if not is_stale(row, new):
+        return False
+    old = recorded(row)
+    with transaction.atomic():
+        if not _swap(row, new):
+            return False
+        apply_deltas(
+            {rollup_key(row): delta(old, new)},
+            {row['campaign_id']: delta(old, new, campaign_contribution)},
+        )
+    return True
+
+
+def sync_rollups(scan_ids, force=False):
+    """
+    Sync the given scans in one transaction: one SELECT, one swap per scan that
+    crossed a milestone (any changed scan with ``force``) and one write per
+    stats row. Returns the number of scans synced.
+    """
+    rows = ScanTracking.objects.filter(id__in=list(scan_ids)).order_by().values(
+        'id', 'device_fingerprint', *SOURCE_FIELDS, *ROLLUP_FIELDS
+    )
+    deltas = defaultdict(lambda: defaultdict(int))
+    campaign_deltas = defaultdict(lambda: defaultdict(int))
+    synced = 0
+    with transaction.atomic():
+        for row in rows:
+            new = desired(row)
+            old = recorded(row)
+            if old == new or not (force or is_stale(row, new)):
+                continue
+            if not _swap(row, new):
+                continue
+            for field, value in delta(old, new).items():
+                deltas[rollup_key(row)][field] += value
+            for field, value in delta(old, new, campaign_contribution).items():
+                campaign_deltas[row['campaign_id']][field] += value
+            if not old[0] & COUNTED:
+                record_device(row['campaign_id'], row['scanned_at'], row['device_fingerprint'])
+            synced += 1
+        apply_deltas(deltas, campaign_deltas)
+    return synced
+
+
+# ============== BULK REWARD CHANGES ==============
+REWARD_MASK = PENDING_REWARD | GRANTED_REWARD | INVALID_REWARD
+STATE_MASK = (INVALID_REWARD << 1) - 1
+
+
+def set_rewards(campaign_id, scan_ids, status, amount=None, now=None, change_seq=None):
+    """
+    Set the reward status (and, when granting with ``amount``, the amount) of
+    the campaign's submitted scans among ``scan_ids`` in one UPDATE, moving
+    their recorded reward state with it. Reward bits only feed the campaign
+    counters, so those get one delta from the old states instead of a swap
+    per scan. Call inside a transaction; returns the ids updated.
+    """
+    now = now or timezone.now()
+    bit = REWARD_STATES[status]
+    if change_seq is None:
+        # Before locking the scans, like every other scan writer
+        change_seq = ScanChangeSequence.next_value()
+    ids = list(
+        ScanTracking.objects.select_for_update()
+        .filter(id__in=scan_ids, campaign_id=campaign_id, form_submitted=True)
+        .order_by('id').values_list('id', flat=True)
+    )
+    if not ids:
+        return []
+    scans = ScanTracking.objects.filter(id__in=ids).order_by()
+
+    old = scans.values(bits=F('rollup_state').bitand(REWARD_MASK)).annotate(
+        n=Count('id'), reward=Sum('rollup_reward'), amount=Sum('reward_amount'),
+    )
+    changes = defaultdict(int)
+    granted_amount = Decimal(0)
+    for row in old:
+        for state_bit, field in CAMPAIGN_COUNTERS:
+            if row['bits'] & state_bit:
+                changes[field] -= row['n']
+        changes['granted_reward_amount'] -= row['reward'] or 0
+        granted_amount += row['amount'] or 0
+    changes[dict(CAMPAIGN_COUNTERS)[bit]] += len(ids)
+
+    updates = {
+        'reward_status': status,
+        'last_activity': now,
+        'change_seq': change_seq,
+        'rollup_state': F('rollup_state').bitand(STATE_MASK & ~REWARD_MASK).bitor(bit),
+        'rollup_reward': Value(Decimal(0)),
+    }
+    if status == 'granted':
+        if amount is not None:
+            updates.update(reward_amount=amount, reward_granted_at=now)
+            granted_amount = amount * len(ids)
+        updates['rollup_reward'] = Coalesce('reward_amount', Value(Decimal(0))) if amount is None else Value(amount)
+        changes['granted_reward_amount'] += granted_amount
+    scans.update(**updates)
+
+    apply_deltas({}, {campaign_id: {field: value for field, value in changes.items() if value}})
+    return ids
+
+
+# ============== SIGNALS ==============
+@receiver(pre_save, sender=ScanTracking)
+def _mark_new_scan(sender, instance, raw=False, **kwargs):
+    # New scans are inserted already marked as counted; post_save adds them
+    if instance._state.adding and not raw:
+        new = desired({field: getattr(instance, field) for field in SOURCE_FIELDS})
+        for field, value in zip(ROLLUP_FIELDS, new):
+            setattr(instance, field, value)
+
+
+@receiver(post_save, sender=ScanTracking)
+def _scan_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        row = {field: getattr(instance, field) for field in SOURCE_FIELDS}
+        new = desired(row)
+        apply_deltas({rollup_key(row): contribution(*new)}, {row['campaign_id']: campaign_contribution(*new)})
+        record_device(instance.campaign_id, instance.scanned_at, instance.device_fingerprint)
+    elif update_fields is None or not set(update_fields).isdisjoint(SOURCE_FIELDS + ('campaign',)):
+        sync_rollups([instance.pk], force=True)
+
+
+# ============== REBUILD ==============
+def counter_totals(scans):
+    """{campaign_id: {counter: value}} of the AdvCampaign counters, from the scan rows"""
+    submitted = Q(form_submitted=True)
+    aggregates = {
+        'total_scans': Count('id'),
+        'total_submissions': Count('id', filter=submitted),
+        'total_completions': Count('id', filter=Q(video_completed=True)),
+        'granted_reward_amount': Coalesce(
+            Sum('reward_amount', filter=submitted & Q(reward_status='granted')), Value(Decimal(0)),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    }
+    for status in REWARD_STATES:
+        aggregates[f'{status}_rewards'] = Count('id', filter=submitted & Q(reward_status=status))
+
+    rows = scans.order_by().values('campaign_id').annotate(**aggregates)
+    return {row.pop('campaign_id'): row for row in rows}
+
+
+def rebuild_rollups(campaign_ids=None):
+    """
+    Recompute CampaignHourlyStats, the AdvCampaign counters, the scans'
+    recorded rollup state and the device sketches from the scan rows, for the
+    given campaigns (all when None). Returns the number of stats rows written.
+    """
+    scans = ScanTracking.objects.order_by()
+    stats = CampaignHourlyStats.objects.all()
+    campaigns = AdvCampaign.objects.all()
+    if campaign_ids is not None:
+        scans = scans.filter(campaign_id__in=campaign_ids)
+        stats = stats.filter(campaign_id__in=campaign_ids)
+        campaigns = campaigns.filter(id__in=campaign_ids)
+
+    aggregates = {
+        'scans': Count('id'),
+        'starts': Count('id', filter=Q(video_watched__gt=0)),
+        'completions': Count('id', filter=Q(video_completed=True)),
+        'submissions': Count('id', filter=Q(form_submitted=True)),
+        'watch_seconds': Sum('video_watched'),
+    }
+    for _, condition, field in WATCH_BUCKETS:
+        aggregates[field] = Count('id', filter=condition)
+
+    rows = scans.values(
+        'campaign_id', 'device_type',
+        hour=Trunc('scanned_at', 'hour', tzinfo=timezone.get_current_timezone()),
+    ).annotate(**aggregates)
+
+    conditions = [
+        (STARTED, Q(video_watched__gt=0)),
+        (COMPLETED, Q(video_completed=True)),
+        (SUBMITTED, Q(form_submitted=True)),
+    ]
+    conditions += [
+        (bit, Q(form_submitted=True, reward_status=status)) for status, bit in REWARD_STATES.items()
+    ]
+    state = Value(COUNTED)
+    for bit, condition in conditions:
+        state = state + Case(When(condition, then=Value(bit)), default=Value(0))
+    bucket = Case(
+        *[When(condition, then=Value(i)) for i, (_, condition, _) in enumerate(WATCH_BUCKETS)],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    reward = Case(
+        When(Q(form_submitted=True, reward_status='granted', reward_amount__isnull=False),
+             then=F('reward_amount')),
+        default=Value(Decimal(0)),
+    )
+
+    with transaction.atomic():
+        stats.delete()
+        written = CampaignHourlyStats.objects.bulk_create(
+            [CampaignHourlyStats(**row) for row in rows], batch_size=500
+        )
+        scans.update(
+            rollup_state=state, rollup_bucket=bucket,
+            rollup_watched=F('video_watched'), rollup_reward=reward,
+        )
+
+        totals = counter_totals(scans)
+        zero = dict.fromkeys(AdvCampaign.COUNTER_FIELDS, 0)
+        AdvCampaign.objects.bulk_update(
+            [AdvCampaign(id=campaign_id, **totals.get(campaign_id, zero))
+             for campaign_id in campaigns.values_list('id', flat=True)],
+            AdvCampaign.COUNTER_FIELDS, batch_size=500,
+        )
+        campaigns.update(
+            data_generation=F('data_generation') + 1, reward_generation=F('reward_generation') + 1
+        )
+    rebuild_sketches(campaign_ids)
+    return len(written)
+
+
+def drifted_campaigns(campaign_ids=None):
+    """Ids of campaigns whose stored counters differ from their scan rows"""
+    scans = ScanTracking.objects.all()
+    campaigns = AdvCampaign.objects.all()
+    if campaign_ids is not None:
+        scans = scans.filter(campaign_id__in=campaign_ids)
+        campaigns = campaigns.filter(id__in=campaign_ids)
+
+    totals = counter_totals(scans)
+    zero = dict.fromkeys(AdvCampaign.COUNTER_FIELDS, 0)
+    return [
+        row['id'] for row in campaigns.values('id', *AdvCampaign.COUNTER_FIELDS)
+        if any(row[field] != totals.get(row['id'], zero)[field] for field in AdvCampaign.COUNTER_FIELDS)
+    ]
@@ -0,0 +1,506 @@
+# scan_spool.py - Append-only scan spool and bulk loader
+"""
+Optional ingestion mode for launch spikes (SCAN_SPOOL_ENABLED).
+
+Instead of one INSERT per scan, create_new_scan appends the new row as a JSON
+line to a local spool segment and hands out an id reserved in blocks from the
+table's counter, so the landing page doesn't wait on database writes. The
+load_scan_spool command bulk-inserts sealed segments in large transactions.
+
+Segment files in SCAN_SPOOL_DIR::
+
+    <pid>-<created_ns>-<seq>.open    being written by a live worker
+    <pid>-<created_ns>-<seq>.ready   sealed, waiting for the loader
+
+Every append reaches the OS immediately, so a worker crash loses nothing; a
+background thread fsyncs every SCAN_SPOOL_FSYNC_INTERVAL seconds (bounding
+loss on power failure) and seals segments once they are
+SCAN_SPOOL_SEGMENT_BYTES big or SCAN_SPOOL_SEGMENT_SECONDS old.
+
+The loader inserts with explicit ids and ``ignore_conflicts``, so replaying a
+segment (e.g. after a crash between commit and unlink) is harmless. Open
+segments left behind by dead workers are sealed and loaded; a torn last line
+is skipped.
+
+A scan handed out from the spool is in use before its row exists:
+
+- Heartbeats for it are spooled too, as progress lines, and replayed by the
+  loader once the row is in. Progress whose scan is still in another
+  worker's open segment is carried to the next pass, for up to
+  SCAN_SPOOL_PROGRESS_MAX_AGE seconds.
+- A form submission inserts the row right away with its reserved id
+  (views.insert_spooled_scan); the loader then leaves that row alone.
+
+Spooling needs reserve_ids(), i.e. SQLite or PostgreSQL. On other databases
+spool_enabled() is False and scans are inserted directly.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .db import reserve_ids, retry_on_lock, supports_reserve_ids
+from .models import AdvCampaign, ScanChangeSequence, ScanTracking
+from .progress import apply_progress_batch, merge_progress
+from .rollups import sync_rollups
+
+logger = logging.getLogger(__name__)
+
+OPEN = '.open'
+READY = '.ready'
+LOCK_FILE = '.loader.lock'
+
+# Columns set by views.build_new_scan; everything else keeps its default
+SPOOL_FIELDS = (
+    'id', 'campaign_id', 'ip_address', 'user_agent', 'device_fingerprint',
+    'device_type', 'browser', 'os', 'session_id', 'scanned_at',
+)
+
+
+def spool_enabled():
+    """SCAN_SPOOL_ENABLED, on a database reserve_ids() supports"""
+    if not getattr(settings, 'SCAN_SPOOL_ENABLED', False):
+        return False
+    if supports_reserve_ids():
+        return True
+    global _unsupported_logged
+    if not _unsupported_logged:
+        _unsupported_logged = True
+        logger.warning('SCAN_SPOOL_ENABLED is ignored: reserve_ids() does not support this database')
+    return False
+
+
+_unsupported_logged = False
+
+
+def spool_dir():
+    return str(getattr(settings, 'SCAN_SPOOL_DIR', os.path.join(settings.BASE_DIR, 'spool', 'scans')))
+
+
+def scan_record(scan):
+    """JSON-serializable spool record for an unsaved scan"""
+    record = {name: getattr(scan, name) for name in SPOOL_FIELDS}
+    record['scanned_at'] = scan.scanned_at.isoformat()
+    return record
+
+
+def progress_record(scan_id, state, at):
+    """Spool record for a heartbeat of a scan that isn't loaded yet"""
+    return {'progress': [scan_id, *state], 'at': at.isoformat()}
+
+
+def spool_line(record):
+    return (json.dumps(record, separators=(',', ':')) + '\n').encode()
+
+
+def _segment_created(path):
+    """Creation time (epoch seconds) encoded in a segment file name"""
+    return int(os.path.basename(path).split('-')[1]) / 1e9
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ============== WRITER ==============
+class ScanSpool:
+    """
+    Per-process spool writer.
+
+    ``append`` only does an ``os.write`` (plus one id reservation query every
+    ``id_block`` scans); fsync and segment rotation happen on a daemon thread.
+    """
+
+    def __init__(self, directory, fsync_interval=0.2, segment_bytes=4 * 1024 * 1024,
+                 segment_seconds=10, id_block=500):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.id_block = id_block
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._ids = iter(())
+        self._fd = None
+        self._path = None
+        self._opened_at = 0
+        self._size = 0
+        self._seq = 0
+        self._dirty = False
+        self._thread = None
+
+    def append(self, scan):
+        """Give an unsaved scan a reserved id and spool it. Returns the scan."""
+        scan.scanned_at = timezone.now()
+        with self._lock:
+            self._check_fork()
+            scan.id = self._next_id()
+            self._write(spool_line(scan_record(scan)))
+        return scan
+
+    def append_progress(self, scan_id, watched_seconds, video_duration, completed):
+        """Spool a heartbeat of a scan the loader hasn't inserted yet"""
+        state = (watched_seconds, video_duration, bool(completed))
+        line = spool_line(progress_record(scan_id, state, timezone.now()))
+        with self._lock:
+            self._check_fork()
+            self._write(line)
+
+    def close(self):
+        """Seal the current segment (called at exit)"""
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                self._seal()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Forked worker: ids and file handles belong to the parent
+            self._reset()
+
+    def _write(self, line):
+        os.write(self._segment(), line)
+        self._size += len(line)
+        self._dirty = True
+        if self._size >= self.segment_bytes:
+            self._seal()
+        self._ensure_started()
+
+    def _next_id(self):
+        scan_id = next(self._ids, None)
+        if scan_id is None:
+            self._ids = iter(reserve_ids(ScanTracking, self.id_block))
+            scan_id = next(self._ids)
+        return scan_id
+
+    def _segment(self):
+        if self._fd is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._seq += 1
+            self._path = os.path.join(
+                self.directory, f'{self._pid}-{time.time_ns()}-{self._seq}{OPEN}'
+            )
+            self._fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+            self._opened_at = time.monotonic()
+            self._size = 0
+        return self._fd
+
+    def _seal(self):
+        os.fsync(self._fd)
+        os.close(self._fd)
+        os.rename(self._path, self._path[:-len(OPEN)] + READY)
+        _fsync_dir(self.directory)
+        self._fd = None
+        self._path = None
+        self._dirty = False
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='scan-spool-sync', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            try:
+                self._sync()
+            except Exception:
+                logger.exception('Scan spool fsync failed')
+
+    def _sync(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            if time.monotonic() - self._opened_at >= self.segment_seconds:
+                self._seal()
+                return
+            if not self._dirty:
+                return
+            # fsync a duplicate outside the lock so appends aren't blocked
+            fd = os.dup(self._fd)
+            self._dirty = False
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+scan_spool = ScanSpool(
+    directory=spool_dir(),
+    fsync_interval=getattr(settings, 'SCAN_SPOOL_FSYNC_INTERVAL', 0.2),
+    segment_bytes=getattr(settings, 'SCAN_SPOOL_SEGMENT_BYTES', 4 * 1024 * 1024),
+    segment_seconds=getattr(settings, 'SCAN_SPOOL_SEGMENT_SECONDS', 10),
+    id_block=getattr(settings, 'SCAN_SPOOL_ID_BLOCK', 500),
+)
+
+
+def spooled_scan(campaign, token):
+    """
+    Stand-in for a scan whose signed token is valid but whose row isn't in the
+    database yet because the loader hasn't caught up. None when not spooling.
+    """
+    if not spool_enabled():
+        return None
+    return ScanTracking(id=token.scan_id, campaign_id=campaign.id)
+
+
+def spool_progress(scan_id, watched_seconds, video_duration, completed):
+    """
+    Spool a heartbeat whose scan wasn't found, for the loader to replay.
+    False when not spooling (the scan really doesn't exist).
+    """
+    if not spool_enabled():
+        return False
+    scan_spool.append_progress(scan_id, watched_seconds, video_duration, completed)
+    return True
+
+
+def spool_unloaded_progress(entries):
+    """
+    Spool the heartbeats in ``entries`` (scan_id -> progress state) whose
+    scans aren't in the table yet. Returns how many were spooled.
+    """
+    if not spool_enabled():
+        return 0
+    loaded = set(ScanTracking.objects.filter(id__in=list(entries)).values_list('id', flat=True))
+    unloaded = [scan_id for scan_id in entries if scan_id not in loaded]
+    for scan_id in unloaded:
+        scan_spool.append_progress(scan_id, *entries[scan_id])
+    return len(unloaded)
+
+
+# ============== LOADER ==============
+def _segments(directory, suffix):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(os.path.join(directory, name) for name in names if name.endswith(suffix))
+
+
+def recover_segments(directory, stale_after):
+    """
+    Seal open segments whose writer is gone: its pid no longer exists, or the
+    file hasn't been written for ``stale_after`` seconds (live writers seal
+    every SCAN_SPOOL_SEGMENT_SECONDS). Returns the number recovered.
+    """
+    recovered = 0
+    now = time.time()
+    for path in _segments(directory, OPEN):
+        pid = int(os.path.basename(path).split('-')[0])
+        try:
+            idle = now - os.path.getmtime(path)
+        except FileNotFoundError:
+            continue
+        if _pid_alive(pid) and idle < stale_after:
+            continue
+        os.rename(path, path[:-len(OPEN)] + READY)
+        recovered += 1
+        logger.warning('Recovered abandoned scan spool segment %s', path)
+    return recovered
+
+
+def read_segment(path):
+    """
+    Unsaved scans in a segment, its progress lines as (scan_id, state,
+    spooled at) and the count of unreadable (torn) lines
+    """
+    scans, progress, skipped = [], [], 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                skipped += 1
+                continue
+            try:
+                record = json.loads(line)
+                if 'progress' in record:
+                    scan_id, watched, duration, completed = record['progress']
+                    state = (int(watched), int(duration), bool(completed))
+                    progress.append((int(scan_id), state, datetime.fromisoformat(record['at'])))
+                    continue
+                record['scanned_at'] = datetime.fromisoformat(record['scanned_at'])
+                scans.append(ScanTracking(**record))
+            except (ValueError, KeyError, TypeError):
+                skipped += 1
+    return scans, progress, skipped
+
+
+@retry_on_lock
+def load_scans(scans, batch_size=2000):
+    """
+    Insert spooled scans with their reserved ids; rows that already exist are
+    left alone, so loading the same scans twice is a no-op. Scans of deleted
+    campaigns are dropped. New scans are added to the hourly rollup once their
+    scanned_at is restored. Returns the number of scans considered.
+    """
+    campaign_ids = set(
+        AdvCampaign.objects.filter(id__in={s.campaign_id for s in scans}).values_list('id', flat=True)
+    )
+    scans = [s for s in scans if s.campaign_id in campaign_ids]
+
+    with transaction.atomic():
+        change_seq = ScanChangeSequence.next_value()
+        for start in range(0, len(scans), batch_size):
+            batch = scans[start:start + batch_size]
+            # Rows inserted ahead of the loader (a form submitted before the
+            # load, or a replayed segment) keep their own values
+            loaded = set(ScanTracking.objects.filter(id__in=[s.id for s in batch]).values_list('id', flat=True))
+            batch = [s for s in batch if s.id not in loaded]
+            if not batch:
+                continue
+            scanned_at = {s.id: s.scanned_at for s in batch}
+            for scan in batch:
+                scan.change_seq = change_seq
+            ScanTracking.objects.bulk_create(batch, batch_size=500, ignore_conflicts=True)
+
+            # auto_now_add replaced scanned_at with the load time; restore it
+            ids = list(scanned_at)
+            for chunk in range(0, len(ids), 500):
+                chunk_ids = ids[chunk:chunk + 500]
+                ScanTracking.objects.filter(id__in=chunk_ids).update(scanned_at=Case(
+                    *[When(id=scan_id, then=Value(scanned_at[scan_id])) for scan_id in chunk_ids],
+                    output_field=DateTimeField(),
+                ), last_activity=timezone.now())
+                sync_rollups(chunk_ids)
+    return len(scans)
+
+
+def replay_progress(progress):
+    """
+    Apply spooled heartbeats, merged per scan, to the scans that are loaded.
+    ``progress`` maps scan_id -> (state, first spooled at); returns the
+    entries whose scans are still missing, and how many were applied.
+    """
+    loaded = set(ScanTracking.objects.filter(id__in=list(progress)).values_list('id', flat=True))
+    entries = {scan_id: progress[scan_id][0] for scan_id in loaded}
+    if entries:
+        apply_progress_batch(entries)
+    missing = {scan_id: value for scan_id, value in progress.items() if scan_id not in loaded}
+    return missing, len(entries)
+
+
+def merge_spooled_progress(progress, events):
+    """Fold (scan_id, state, spooled at) events into ``progress``"""
+    for scan_id, state, at in events:
+        current = progress.get(scan_id)
+        if current is None:
+            progress[scan_id] = (merge_progress(None, *state), at)
+        else:
+            progress[scan_id] = (merge_progress(current[0], *state), min(current[1], at))
+    return progress
+
+
+def write_segment(directory, records):
+    """Write ``records`` as a new sealed segment (used by the loader)"""
+    name = f'{os.getpid()}-{time.time_ns()}-0'
+    tmp_path = os.path.join(directory, name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        for record in records:
+            f.write(spool_line(record))
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, os.path.join(directory, name + READY))
+    _fsync_dir(directory)
+
+
+def load_spool(directory=None, batch_size=2000, keep=False):
+    """
+    Load every sealed segment (recovering abandoned ones first), one
+    transaction per segment, replaying spooled progress once its scan is in.
+    Loaded segments are deleted, or moved to ``loaded/`` with ``keep``.
+    Progress of scans not loaded by the end of the pass is written to a new
+    segment for the next one. Returns a stats dict, or None if another loader
+    holds the lock.
+    """
+    directory = directory or spool_dir()
+    os.makedirs(directory, exist_ok=True)
+    stats = {
+        'segments': 0, 'scans': 0, 'skipped_lines': 0, 'recovered': 0,
+        'progress': 0, 'progress_carried': 0, 'progress_dropped': 0,
+    }
+
+    with open(os.path.join(directory, LOCK_FILE), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+
+        segment_seconds = getattr(settings, 'SCAN_SPOOL_SEGMENT_SECONDS', 10)
+        stats['recovered'] = recover_segments(directory, stale_after=max(60, segment_seconds * 6))
+
+        pending = {}
+        for path in _segments(directory, READY):
+            scans, events, skipped = read_segment(path)
+            stats['scans'] += load_scans(scans, batch_size)
+            pending, applied = replay_progress(merge_spooled_progress(pending, events))
+            stats['progress'] += applied
+            stats['skipped_lines'] += skipped
+            stats['segments'] += 1
+            if keep:
+                os.makedirs(os.path.join(directory, 'loaded'), exist_ok=True)
+                os.rename(path, os.path.join(directory, 'loaded', os.path.basename(path)))
+            else:
+                os.unlink(path)
+
+        # The scan may still be in a live worker's open segment: carry its
+        # progress over, unless it has waited too long (scan never spooled)
+        cutoff = timezone.now().timestamp() - getattr(settings, 'SCAN_SPOOL_PROGRESS_MAX_AGE', 3600)
+        carried = [
+            progress_record(scan_id, state, at)
+            for scan_id, (state, at) in pending.items() if at.timestamp() >= cutoff
+        ]
+        if carried:
+            write_segment(directory, carried)
+        stats['progress_carried'] = len(carried)
+        stats['progress_dropped'] = len(pending) - len(carried)
+    return stats
+
+
+def spool_status(directory=None):
+    """
+    Backlog of the spool: pending segments and bytes, and ``lag_seconds``,
+    the age of the oldest segment not yet loaded.
+    """
+    directory = directory or spool_dir()
+    ready = _segments(directory, READY)
+    open_ = _segments(directory, OPEN)
+    pending_bytes = 0
+    for path in ready + open_:
+        try:
+            pending_bytes += os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+    oldest = min((_segment_created(path) for path in ready + open_), default=None)
+    return {
+        'ready_segments': len(ready),
+        'open_segments': len(open_),
+        'pending_bytes': pending_bytes,
+        'lag_seconds': round(time.time() - oldest, 3) if oldest else 0.0,
+    }
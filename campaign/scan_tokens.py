@@ -0,0 +1,73 @@
+# scan_tokens.py - Stateless signed scan tokens
+"""
+Anonymous scanners used to get a Django session holding their scan id, which
+cost a django_session write on every QR scan. Instead each scan is described
+by an HMAC-signed token (campaign id, scan id, submitted flag; the signer adds
+the issue time) that is set as a cookie scoped to the campaign's landing URL
+and embedded in the page for the progress beacons.
+
+Tokens are verified without touching the database, so forged, expired or
+cross-campaign scan ids are rejected before any query.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+SALT = 'campaign.scan_token'
+
+ScanToken = namedtuple('ScanToken', ['campaign_id', 'scan_id', 'submitted'])
+
+
+def token_max_age():
+    return getattr(settings, 'SCAN_TOKEN_MAX_AGE', 60 * 60 * 24 * 14)
+
+
+def issue_scan_token(campaign_id, scan_id, submitted=False):
+    """Signed, timestamped token for one scan"""
+    return signing.dumps([campaign_id, scan_id, int(submitted)], salt=SALT)
+
+
+def read_scan_token(token, campaign_id=None):
+    """
+    Verify ``token`` and return a ScanToken, or None if it is missing,
+    tampered with, expired or (when ``campaign_id`` is given) issued for
+    another campaign.
+    """
+    if not token or not isinstance(token, str):
+        return None
+    try:
+        value = signing.loads(token, salt=SALT, max_age=token_max_age())
+        scan = ScanToken(int(value[0]), int(value[1]), bool(value[2]))
+    except (signing.BadSignature, ValueError, TypeError, IndexError):
+        return None
+    if campaign_id is not None and scan.campaign_id != campaign_id:
+        return None
+    return scan
+
+
+# ============== COOKIE ==============
+def scan_cookie_name(unique_id):
+    return f'scan_{unique_id}'
+
+
+def read_scan_cookie(request, campaign):
+    """ScanToken from the campaign's cookie, or None"""
+    return read_scan_token(
+        request.COOKIES.get(scan_cookie_name(campaign.unique_id)), campaign.id
+    )
+
+
+def set_scan_cookie(response, campaign, token):
+    """Store ``token`` in a cookie only sent back to this campaign's landing page"""
+    response.set_cookie(
+        scan_cookie_name(campaign.unique_id),
+        token,
+        max_age=token_max_age(),
+        path=reverse('sw:adv_landing', args=[campaign.unique_id]),
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite='Lax',
+    )
+    return response
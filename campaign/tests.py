@@ -1,3 +1,1234 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import async_views
+from .analytics import campaign_report
+from . import campaign_cache
+from .campaign_cache import get_campaign_snapshot
+from .cohorts import campaign_cohorts
+from .device_sketch import device_count, empty_registers, estimate, register_of
+from .export_jobs import claim_job, cleanup_expired, fail_stalled, run_job, run_pending, start_job
+from .histogram import histogram, histogram_values
+from .models import (
+    AdvCampaign, CampaignHourlyStats, Client, ExportJob, Manufacturer, Order, RewardBulkUpdate, ScanTracking,
+)
+from . import phone_filter, rate_limit
+from .db import reserve_ids, retry_on_lock
+from .progress import HeartbeatBuffer, apply_progress, apply_progress_batch
+from .reward_updates import bulk_update_rewards
+from .rollups import apply_deltas, drifted_campaigns, rebuild_rollups
+from .scan_spool import ScanSpool, load_spool
+from .scan_tokens import issue_scan_token, read_scan_token
+from .user_agents import classify_user_agent, reclassify_scans
+from .views import create_new_scan, get_client_ip, submit_scan_form
+
+
+class CampaignReportTests(TestCase):
+    """Report page analytics: query budget and local-time bucketing"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', 'staff@example.com', 'password')
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        cls.campaign = AdvCampaign.objects.create(
+            unique_id='AC_REP_00001', camp_name='Report', client=client,
+            start_date=date.today() - timedelta(days=10), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def add_scan(self, scanned_at=None, **fields):
+        scan = ScanTracking.objects.create(
+            campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua',
+            device_fingerprint=fields.pop('device_fingerprint', 'fp'), session_id='s', **fields
+        )
+        if scanned_at is not None:
+            # Moves the scan to another hour, which only a rebuild picks up
+            ScanTracking.objects.filter(id=scan.id).update(scanned_at=scanned_at)
+            rebuild_rollups([self.campaign.id])
+        return scan
+
+    def test_report_detail_query_count(self):
+        for i in range(30):
+            self.add_scan(
+                device_fingerprint=f'fp{i % 7}',
+                device_type=['mobile', 'desktop', 'tablet'][i % 3],
+                video_duration=30, video_watched=i,
+                form_submitted=i % 4 == 0, user_phone=f'98765{i:05d}' if i % 4 == 0 else '',
+                scanned_at=timezone.now() - timedelta(hours=i * 11),
+            )
+        self.client.force_login(self.user)
+        url = reverse('sw:report_detail', args=[self.campaign.unique_id])
+
+        # session + user, campaign, rollup summary, scan details, device
+        # sketches, hourly + devices, daily, browsers + OSes, first scans per
+        # device, campaign overlap, recent submissions, recent scans
+        with self.assertNumQueries(13):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['metrics']['total_scans'], 30)
+        self.assertEqual(response.context['metrics']['unique_devices'], 7)
+
+    def test_repeat_loads_hit_the_cache_until_data_changes(self):
+        scan = self.add_scan(form_submitted=True, user_phone='9876500000')
+        self.client.force_login(self.user)
+        url = reverse('sw:report_detail', args=[self.campaign.unique_id])
+        rewards_url = reverse('sw:rewards_detail', args=[self.campaign.id])
+        self.client.get(url)
+        self.client.get(rewards_url)
+
+        # session + user, campaign, recent submissions, recent scans
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+        # Tolerated staleness never covers a reward change
+        with self.settings(REPORT_CACHE_STALE_SECONDS=3600):
+            self.client.post(rewards_url, {
+                'action': 'update_status', 'scan_id': scan.id,
+                'reward_status': 'granted', 'reward_amount': '50',
+            })
+            response = self.client.get(rewards_url)
+            self.assertEqual(response.context['stats']['granted'], 1)
+            self.assertEqual(response.context['stats']['granted_amount'], Decimal('50'))
+
+            # ...but does cover new scans
+            self.client.get(url)
+            self.add_scan()
+            self.assertEqual(self.client.get(url).context['metrics']['total_scans'], 1)
+        self.assertEqual(self.client.get(url).context['metrics']['total_scans'], 2)
+
+    def test_metrics_match_row_counts(self):
+        for watched in (0, 0, 10, 15, 30):
+            self.add_scan(video_duration=30, video_watched=watched, video_completed=watched == 30)
+        summary = campaign_report(self.campaign)['summary']
+
+        self.assertEqual(summary['total_scans'], 5)
+        self.assertEqual(summary['bounces'], 2)
+        self.assertEqual(summary['video_started'], 3)
+        self.assertEqual(summary['video_half'], 2)
+        self.assertEqual(summary['video_completions'], 1)
+        self.assertEqual(summary['watch_distribution'], {
+            '0-25%': 2, '25-50%': 1, '50-75%': 1, '75-100%': 0, '100%': 1,
+        })
+
+    def test_histogram_edges_agree_with_funnel(self):
+        for watched in (0, 0, 10, 15, 29, 30):
+            self.add_scan(video_duration=30, video_watched=watched)
+        scans = ScanTracking.objects.filter(campaign=self.campaign)
+        summary = campaign_report(self.campaign)['summary']
+
+        counts = histogram(scans, 'video_percentage', (0, 50))
+        self.assertEqual(counts, [3, summary['video_half']])
+        self.assertEqual(counts, histogram_values(scans.values_list('video_percentage', flat=True), (0, 50)))
+        self.assertEqual(histogram(scans, 'video_watched', (0, 1)), [summary['bounces'], summary['video_started']])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('sw:watch_histogram'), {
+            'field': 'video_percentage', 'edges': '0,50,100', 'campaigns': self.campaign.unique_id,
+        })
+        self.assertEqual(response.json()['campaigns'], {self.campaign.unique_id: [3, 2, 1]})
+        self.assertEqual(self.client.get(reverse('sw:watch_histogram'), {'edges': '50,10'}).status_code, 400)
+
+    def test_returning_devices_and_cohorts(self):
+        now = timezone.now()
+        self.add_scan(device_fingerprint='a', scanned_at=now - timedelta(hours=30))
+        self.add_scan(device_fingerprint='a', scanned_at=now - timedelta(hours=28))
+        self.add_scan(device_fingerprint='a', scanned_at=now)
+        self.add_scan(device_fingerprint='b', scanned_at=now - timedelta(hours=5))
+        self.add_scan(device_fingerprint='b', scanned_at=now)
+        self.add_scan(device_fingerprint='c', scanned_at=now)
+        other = AdvCampaign.objects.create(
+            unique_id='AC_REP_00002', camp_name='Other', client=self.campaign.client,
+            start_date=self.campaign.start_date, end_date=self.campaign.end_date,
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+        ScanTracking.objects.create(
+            campaign=other, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='c', session_id='s',
+        )
+        cohorts = campaign_cohorts(self.campaign)
+
+        self.assertEqual((cohorts['devices'], cohorts['returning_devices']), (3, 2))
+        self.assertEqual(cohorts['scans_per_device'], 2)
+        self.assertEqual(cohorts['time_to_return'], {
+            '< 1 h': 0, '1-6 h': 2, '6-24 h': 0, '1-3 days': 0, '3-7 days': 0, '7+ days': 0,
+        })
+        self.assertEqual(sum(c['devices'] for c in cohorts['cohorts']), 3)
+        self.assertEqual(cohorts['overlap'], [{'campaign': 'Other', 'devices': 1, 'share': 33.33}])
+
+    def test_hours_and_days_are_local(self):
+        # 20:00 UTC yesterday is 01:30 IST today
+        yesterday = timezone.localdate() - timedelta(days=1)
+        scanned_at = datetime.combine(yesterday, datetime.min.time(), tzinfo=dt_timezone.utc) + timedelta(hours=20)
+        self.add_scan(scanned_at=scanned_at)
+        report = campaign_report(self.campaign)
+
+        self.assertEqual(report['hourly_scans'][1], 1)
+        self.assertEqual(report['daily_trend'][-1]['date'], timezone.localdate().strftime('%Y-%m-%d'))
+        self.assertEqual(report['daily_trend'][-1]['scans'], 1)
+        self.assertEqual(campaign_cohorts(self.campaign)['cohorts'][-1]['devices'], 1)
+
+    def test_cohorts_tolerate_new_scans_for_their_stale_window(self):
+        self.add_scan(device_fingerprint='a')
+        self.client.force_login(self.user)
+        url = reverse('sw:report_detail', args=[self.campaign.unique_id])
+        self.client.get(url)
+        self.add_scan(device_fingerprint='b')
+
+        with self.settings(COHORT_CACHE_STALE_SECONDS=3600):
+            response = self.client.get(url)
+        self.assertEqual(response.context['metrics']['total_scans'], 2)
+        self.assertEqual(response.context['cohorts']['devices'], 1)
+        with self.settings(COHORT_CACHE_STALE_SECONDS=0):
+            self.assertEqual(self.client.get(url).context['cohorts']['devices'], 2)
+
+
+class HourlyRollupTests(TestCase):
+    """CampaignHourlyStats maintained incrementally matches a full rebuild"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        cls.campaign = AdvCampaign.objects.create(
+            unique_id='AC_ROL_00001', camp_name='Rollup', client=client,
+            start_date=date.today() - timedelta(days=10), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+
+    def rollup(self):
+        return sorted(
+            CampaignHourlyStats.objects.filter(campaign=self.campaign)
+            .values_list('hour', 'device_type', 'scans', 'starts', 'completions', 'submissions',
+                         'watched_0_25', 'watched_25_50', 'watched_50_75', 'watched_75_100', 'watched_100')
+        )
+
+    def test_incremental_matches_rebuild(self):
+        scans = [
+            ScanTracking.objects.create(
+                campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp',
+                session_id='s', device_type=['mobile', 'desktop'][i % 2],
+            )
+            for i in range(6)
+        ]
+        apply_progress(scans[0].id, 10, 40, False)
+        apply_progress(scans[0].id, 40, 40, True)
+        apply_progress(scans[1].id, 25, 40, False)
+        apply_progress_batch({scans[2].id: (5, 40, False), scans[3].id: (0, 40, True)})
+        scans[4].user_name, scans[4].user_phone, scans[4].form_submitted = 'A', '9876500000', True
+        scans[4].save(update_fields=['user_name', 'user_phone', 'form_submitted', 'form_submitted_at'])
+
+        incremental = self.rollup()
+        self.assertEqual(sum(row[2] for row in incremental), 6)
+        rebuild_rollups([self.campaign.id])
+        self.assertEqual(incremental, self.rollup())
+
+    def test_milestone_free_heartbeats_skip_the_rollup(self):
+        scan = ScanTracking.objects.create(
+            campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp', session_id='s',
+        )
+        apply_progress(scan.id, 2, 100, False)
+        # Still in the 0-25% bucket: savepoint, change number, the progress UPDATE
+        with self.assertNumQueries(4):
+            apply_progress(scan.id, 7, 100, False)
+
+
+class CampaignCounterTests(TestCase):
+    """AdvCampaign counters follow scan, submission and reward transitions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        cls.campaign = AdvCampaign.objects.create(
+            unique_id='AC_CNT_00001', camp_name='Counters', client=client,
+            start_date=date.today() - timedelta(days=10), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+
+    def test_transitions_keep_counters_exact(self):
+        stale_campaign = AdvCampaign.objects.get(id=self.campaign.id)
+        scans = [
+            ScanTracking.objects.create(
+                campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp', session_id='s',
+            )
+            for _ in range(4)
+        ]
+        apply_progress(scans[0].id, 30, 30, True)
+        for i, scan in enumerate(scans[:3]):
+            scan.user_name, scan.user_phone, scan.form_submitted = 'A', f'987650000{i}', True
+            scan.save(update_fields=['user_name', 'user_phone', 'form_submitted', 'form_submitted_at', 'reward_status'])
+        granted = ScanTracking.objects.get(id=scans[1].id)
+        granted.reward_status, granted.reward_amount = 'granted', Decimal('25.00')
+        granted.save()
+        invalid = ScanTracking.objects.get(id=scans[2].id)
+        invalid.reward_status = 'invalid'
+        invalid.save()
+        # Editing the campaign must not write back the counters it was loaded with
+        stale_campaign.camp_name = 'Renamed'
+        stale_campaign.save()
+
+        campaign = AdvCampaign.objects.get(id=self.campaign.id)
+        self.assertEqual(
+            (campaign.total_scans, campaign.total_submissions, campaign.total_completions,
+             campaign.pending_rewards, campaign.granted_rewards, campaign.invalid_rewards),
+            (4, 3, 1, 1, 1, 1),
+        )
+        self.assertEqual(campaign.granted_reward_amount, Decimal('25.00'))
+        self.assertEqual(drifted_campaigns(), [])
+
+    def test_reconcile_repairs_bypassed_updates(self):
+        scan = ScanTracking.objects.create(
+            campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp', session_id='s',
+        )
+        ScanTracking.objects.filter(id=scan.id).update(form_submitted=True, user_phone='9876500000')
+        self.assertEqual(drifted_campaigns(), [self.campaign.id])
+
+        call_command('reconcile_campaign_counters', stdout=StringIO())
+        self.assertEqual(drifted_campaigns(), [])
+        self.assertEqual(AdvCampaign.objects.get(id=self.campaign.id).pending_rewards, 1)
+
+    def test_bulk_reward_update_is_set_based_and_audited(self):
+        scans = ScanTracking.objects.bulk_create([
+            ScanTracking(
+                campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp',
+                session_id='s', form_submitted=True, user_phone=f'98765{i:05d}',
+                reward_status='granted' if i == 0 else 'pending', reward_amount=Decimal('10') if i == 0 else None,
+            )
+            for i in range(1200)
+        ])
+        rebuild_rollups([self.campaign.id])
+        not_submitted = ScanTracking.objects.create(
+            campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp', session_id='s',
+        )
+        ids = [scan.id for scan in scans] + [not_submitted.id, 'x']
+
+        # savepoint, change number, 3 chunks x (lock ids, old states, update, counters), audit
+        with self.assertNumQueries(16):
+            result = bulk_update_rewards(self.campaign, ids, 'granted', '25')
+
+        self.assertEqual(result, {'requested': 1202, 'updated': 1200, 'rejected': 2})
+        campaign = AdvCampaign.objects.get(id=self.campaign.id)
+        self.assertEqual((campaign.pending_rewards, campaign.granted_rewards), (0, 1200))
+        self.assertEqual(campaign.granted_reward_amount, Decimal('30000.00'))
+        self.assertEqual(drifted_campaigns(), [])
+        audit = RewardBulkUpdate.objects.get()
+        self.assertEqual((audit.updated, audit.rejected), (1200, 2))
+        self.assertEqual(audit.scan_ids, f'{scans[0].id}-{scans[-1].id}')
+
+        bulk_update_rewards(self.campaign, ids[:5], 'invalid')
+        campaign = AdvCampaign.objects.get(id=self.campaign.id)
+        self.assertEqual((campaign.granted_rewards, campaign.invalid_rewards), (1195, 5))
+        self.assertEqual(drifted_campaigns(), [])
+        with self.assertRaises(ValueError):
+            bulk_update_rewards(self.campaign, ids, 'granted', '-5')
+
+
+class ProgressUpdateTests(TestCase):
+    """Heartbeats are applied by conditional UPDATEs, never read-modify-write"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        cls.campaign = AdvCampaign.objects.create(
+            unique_id='AC_PRG_00001', camp_name='Progress', client=client,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+        cls.scan = ScanTracking.objects.create(
+            campaign=cls.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp', session_id='s',
+        )
+
+    def progress(self, row):
+        return (row['video_duration'], row['video_watched'], row['video_percentage'], row['video_completed'])
+
+    def test_single_update_only_moves_progress_forward(self):
+        row = apply_progress(self.scan.id, 10, 40, False)
+        self.assertEqual(self.progress(row), (40, 10, Decimal('25'), False))
+
+        # A late heartbeat neither rewinds watched time nor changes the duration
+        row = apply_progress(self.scan.id, 5, 90, False)
+        self.assertEqual(self.progress(row), (40, 10, Decimal('25'), False))
+
+        row = apply_progress(self.scan.id, 12, 40, True)
+        self.assertEqual(self.progress(row), (40, 40, Decimal('100'), True))
+        self.scan.refresh_from_db()
+        self.assertEqual((self.scan.video_watched, self.scan.video_completed), (40, True))
+
+        self.assertIsNone(apply_progress(10 ** 6, 1, 40, False))
+
+    def test_batch_coalesces_events_and_rejects_forged_tokens(self):
+        rate_limit.buckets.clear()
+        token = issue_scan_token(self.campaign.id, self.scan.id)
+        events = [
+            {'token': token, 'scan_id': self.scan.id, 't': 2, 'watched': 30, 'duration': 60},
+            {'token': token, 'scan_id': self.scan.id, 't': 1, 'watched': 10, 'duration': 60},
+            {'token': token, 'scan_id': self.scan.id + 1, 'watched': 60, 'duration': 60, 'completed': True},
+        ]
+        response = self.client.post(
+            reverse('sw:track_video_batch'), json.dumps({'events': events}), content_type='application/json',
+        )
+        self.assertEqual(response.json(), {'status': 'success', 'scans': 1, 'rejected': 1})
+        self.scan.refresh_from_db()
+        self.assertEqual((self.scan.video_watched, self.scan.video_completed), (30, False))
+
+        # A batch of nothing but forged events is refused outright
+        response = self.client.post(
+            reverse('sw:track_video_batch'), json.dumps(events[2:]), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class CampaignSnapshotTests(TestCase):
+    """Landing page campaign lookups are cached per worker until the campaign changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_row = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        cls.campaign = AdvCampaign.objects.create(
+            unique_id='AC_SNP_00001', camp_name='Snapshot', client=cls.client_row,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+
+    def setUp(self):
+        campaign_cache.clear()
+
+    def test_snapshots_are_cached_until_campaign_or_client_changes(self):
+        self.assertEqual(get_campaign_snapshot(self.campaign.unique_id).camp_name, 'Snapshot')
+        with self.assertNumQueries(0):
+            snapshot = get_campaign_snapshot(self.campaign.unique_id)
+        self.assertEqual(snapshot.client.company_name, 'Acme')
+
+        self.campaign.camp_name = 'Renamed'
+        self.campaign.save()
+        self.assertEqual(get_campaign_snapshot(self.campaign.unique_id).camp_name, 'Renamed')
+
+        self.client_row.company_name = 'Acme Ltd'
+        self.client_row.save()
+        self.assertEqual(get_campaign_snapshot(self.campaign.unique_id).client.company_name, 'Acme Ltd')
+
+        # Counter updates are queryset UPDATEs: no signal, snapshot kept
+        ScanTracking.objects.create(
+            campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp', session_id='s',
+        )
+        with self.assertNumQueries(0):
+            get_campaign_snapshot(self.campaign.unique_id)
+
+    def test_unknown_codes_are_cached_until_created(self):
+        self.assertIsNone(get_campaign_snapshot('AC_SNP_00002'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_campaign_snapshot('AC_SNP_00002'))
+
+        AdvCampaign.objects.create(
+            unique_id='AC_SNP_00002', camp_name='Later', client=self.client_row,
+            start_date=self.campaign.start_date, end_date=self.campaign.end_date,
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+        self.assertEqual(get_campaign_snapshot('AC_SNP_00002').camp_name, 'Later')
+
+
+class UserAgentTests(TestCase):
+    """Rule-table user-agent classifier and the stored-row reclassification"""
+
+    ANDROID = ('Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 '
+               '(KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36')
+    IPHONE = ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 '
+              '(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1')
+    EDGE = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+            '(KHTML, like Gecko) Chrome/70.0 Safari/537.36 Edge/18.17763')
+
+    def test_first_matching_rule_wins(self):
+        self.assertEqual(classify_user_agent(self.ANDROID), ('mobile', 'Chrome', 'Android'))
+        self.assertEqual(classify_user_agent(self.IPHONE), ('mobile', 'Safari', 'iOS'))
+        # "edge" excludes the Chrome rule even though the UA mentions Chrome
+        self.assertEqual(classify_user_agent(self.EDGE), ('desktop', 'Edge', 'Windows'))
+        self.assertEqual(classify_user_agent(''), ('unknown', 'Unknown', 'Unknown'))
+        self.assertIs(classify_user_agent(self.ANDROID), classify_user_agent(self.ANDROID))
+
+    def test_reclassify_only_writes_changed_rows(self):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        campaign = AdvCampaign.objects.create(
+            unique_id='AC_UAS_00001', camp_name='Agents', client=client,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+        for user_agent, device_type in ((self.ANDROID, 'mobile'), (self.EDGE, 'unknown')):
+            ScanTracking.objects.create(
+                campaign=campaign, ip_address='10.0.0.1', user_agent=user_agent, device_fingerprint='fp',
+                session_id='s', device_type=device_type, browser=classify_user_agent(user_agent).browser,
+                os=classify_user_agent(user_agent).os,
+            )
+
+        self.assertEqual(reclassify_scans(dry_run=True), (2, 1))
+        self.assertEqual(ScanTracking.objects.filter(device_type='unknown').count(), 1)
+        self.assertEqual(reclassify_scans(), (2, 1))
+        self.assertEqual(reclassify_scans(), (2, 0))
+        self.assertFalse(ScanTracking.objects.filter(device_type='unknown').exists())
+
+
+class HeartbeatBufferTests(TestCase):
+    """Write-behind heartbeats coalesce per scan and stay bounded"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        campaign = AdvCampaign.objects.create(
+            unique_id='AC_HBB_00001', camp_name='Heartbeats', client=client,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+        cls.scans = [
+            ScanTracking.objects.create(
+                campaign=campaign, ip_address='10.0.0.1', user_agent='ua',
+                device_fingerprint=f'fp{i}', session_id='s',
+            )
+            for i in range(3)
+        ]
+
+    def buffer(self, **kwargs):
+        buffer = HeartbeatBuffer(**kwargs)
+        # No flusher thread: the tests flush explicitly
+        buffer._ensure_started = lambda: None
+        return buffer
+
+    def test_failed_flush_requeues_and_merges(self):
+        buffer = self.buffer()
+        scan = self.scans[0]
+        buffer.record(scan.id, 10, 40, False)
+        tracked = buffer.record(scan.id, 4, 0, False)
+        self.assertEqual((tracked['watched'], tracked['percentage']), (10, 25))
+
+        with mock.patch('campaign.progress.apply_progress_batch', side_effect=OperationalError('locked')), \
+                self.assertLogs('campaign.progress', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        buffer.record(scan.id, 20, 40, False)
+        self.assertEqual(buffer.pending_count, 1)
+
+        self.assertEqual(buffer.flush(), 1)
+        scan.refresh_from_db()
+        self.assertEqual((scan.video_watched, scan.video_percentage), (20, Decimal('50')))
+        self.assertEqual(buffer.pending_count, 0)
+
+    def test_full_buffer_sheds_the_oldest_scans(self):
+        buffer = self.buffer(max_pending=2)
+        first, second, third = self.scans
+        buffer.record(first.id, 5, 40, False)
+        buffer.record(second.id, 5, 40, False)
+        buffer.record(first.id, 10, 40, False)
+        buffer.record(third.id, 5, 40, False)
+        self.assertEqual((buffer.pending_count, buffer.shed_total), (2, 1))
+
+        # Re-queueing a failed batch does not grow past the bound either
+        with mock.patch('campaign.progress.apply_progress_batch', side_effect=OperationalError('locked')), \
+                self.assertLogs('campaign.progress') as logs:
+            buffer.flush()
+            buffer.record(first.id, 15, 40, False)
+        self.assertIn('1 scans shed', logs.output[0])
+        self.assertEqual(buffer.pending_count, 2)
+
+        with self.assertLogs('campaign.progress', 'WARNING'):
+            self.assertEqual(buffer.flush(), 2)
+        watched = dict(ScanTracking.objects.filter(id__in=[s.id for s in self.scans]).values_list('id', 'video_watched'))
+        self.assertEqual(watched, {first.id: 15, second.id: 0, third.id: 5})
+
+    def test_completed_scans_are_never_shed(self):
+        buffer = self.buffer(max_pending=1)
+        first, second, third = self.scans
+        buffer.record(first.id, 40, 40, True)
+        buffer.record(second.id, 40, 40, True)
+        buffer.record(third.id, 5, 40, False)
+        # Over the bound with completions only: they wait for the flush
+        self.assertEqual((buffer.pending_count, buffer.shed_total), (2, 1))
+
+        with self.assertLogs('campaign.progress', 'WARNING'):
+            self.assertEqual(buffer.flush(), 2)
+        completed = set(ScanTracking.objects.filter(video_completed=True).values_list('id', flat=True))
+        self.assertEqual(completed, {first.id, second.id})
+
+
+class ScanInsertRetryTests(TransactionTestCase):
+    """A scan insert and its rollup hooks commit or retry together"""
+
+    def test_lock_error_in_hook_retries_without_drift(self):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        campaign = AdvCampaign.objects.create(
+            unique_id='AC_RTY_00001', camp_name='Retry', client=client,
+            start_date=date.today(), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+        failures = [OperationalError('database is locked')]
+
+        def flaky_apply_deltas(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return apply_deltas(*args, **kwargs)
+
+        with self.settings(DB_LOCK_RETRIES=2, DB_LOCK_RETRY_DELAY=0), \
+                mock.patch('campaign.rollups.apply_deltas', flaky_apply_deltas):
+            create_new_scan(campaign, '10.0.0.1', 'ua', 'fp', 'mobile', 'Chrome', 'Android')
+
+        self.assertEqual(ScanTracking.objects.count(), 1)
+        self.assertEqual(AdvCampaign.objects.get(id=campaign.id).total_scans, 1)
+        self.assertEqual(drifted_campaigns(), [])
+
+    def test_retry_on_lock_only_retries_lock_errors_outside_transactions(self):
+        calls = []
+
+        def failing(message, times):
+            @retry_on_lock
+            def write():
+                calls.append(message)
+                if len(calls) <= times:
+                    raise OperationalError(message)
+                return 'done'
+            return write
+
+        with self.settings(DB_LOCK_RETRIES=2, DB_LOCK_RETRY_DELAY=0):
+            self.assertEqual(failing('database is locked', 2)(), 'done')
+            self.assertEqual(len(calls), 3)
+
+            calls.clear()
+            with self.assertRaises(OperationalError):
+                failing('database is locked', 3)()
+            self.assertEqual(len(calls), 3)
+
+            calls.clear()
+            with self.assertRaises(OperationalError):
+                failing('no such table: x', 1)()
+            self.assertEqual(len(calls), 1)
+
+            # Inside atomic the transaction is broken: the caller gets the error
+            calls.clear()
+            with self.assertRaises(OperationalError), transaction.atomic():
+                failing('database is locked', 1)()
+            self.assertEqual(len(calls), 1)
+
+            @retry_on_lock
+            async def async_write():
+                calls.append('async')
+                if calls.count('async') == 1:
+                    raise OperationalError('database is busy')
+                return 'done'
+
+            self.assertEqual(asyncio.run(async_write()), 'done')
+            self.assertEqual(calls.count('async'), 2)
+
+
+class PhoneFilterTests(TestCase):
+    """Reward form duplicate checks: Bloom filter in front, unique constraint behind"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        cls.campaign = AdvCampaign.objects.create(
+            unique_id='AC_PHN_00001', camp_name='Phones', client=client,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+
+    def setUp(self):
+        phone_filter.clear()
+        self.addCleanup(phone_filter.clear)
+
+    def scan(self):
+        return ScanTracking.objects.create(
+            campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp', session_id='s',
+        )
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        phones = phone_filter.BloomFilter(1000)
+        for i in range(1000):
+            phones.add(f'98{i:08d}')
+        self.assertTrue(all(f'98{i:08d}' in phones for i in range(1000)))
+        false_positives = sum(f'97{i:08d}' in phones for i in range(10000))
+        self.assertLess(false_positives, 300)
+        self.assertFalse(phones.saturated)
+
+    def test_duplicate_phone_is_refused_by_the_constraint(self):
+        self.assertTrue(submit_scan_form(self.scan(), 'Asha', '9800000001'))
+        self.assertIn('9800000001', phone_filter.registered_phones(self.campaign.id))
+
+        # A worker that never saw the number writes and hits the constraint
+        phone_filter.clear()
+        with mock.patch.object(phone_filter.BloomFilter, '__contains__', return_value=False):
+            second = self.scan()
+            self.assertFalse(submit_scan_form(second, 'Ravi', '9800000001'))
+        second.refresh_from_db()
+        self.assertFalse(second.form_submitted)
+
+        # A warm filter answers possible duplicates with one lookup, no write
+        self.assertIn('9800000001', phone_filter.registered_phones(self.campaign.id))
+        third = self.scan()
+        with self.assertNumQueries(1):
+            self.assertFalse(submit_scan_form(third, 'Ravi', '9800000001'))
+        self.assertTrue(submit_scan_form(third, 'Ravi', '9800000002'))
+        self.assertEqual(ScanTracking.objects.filter(form_submitted=True).count(), 2)
+
+
+class ReportListTests(TestCase):
+    """report_list sorts and paginates in the database"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', 'staff@example.com', 'password')
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        for i in range(15):
+            campaign = AdvCampaign.objects.create(
+                unique_id=f'AC_LST_{i:05d}', camp_name=f'List {i}', client=client,
+                start_date=date.today(), end_date=date.today() + timedelta(days=10),
+                number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+            )
+            AdvCampaign.objects.filter(id=campaign.id).update(total_scans=i * 10, total_submissions=(i * 7) % 15)
+
+    def test_sorted_page_is_one_query(self):
+        self.client.force_login(self.user)
+        # session + user, count, page
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('sw:report_list'), {'sort': 'conversion'})
+
+        reports = list(response.context['reports'])
+        self.assertEqual(len(reports), 10)
+        self.assertEqual(response.context['total_campaigns'], 15)
+        rates = [report.form_conversion_rate for report in reports]
+        self.assertEqual(rates, sorted(rates, reverse=True))
+        self.assertEqual(rates[0], 70.0)
+
+
+class DeviceSketchTests(TestCase):
+    """Distinct devices from the daily HyperLogLog sketches"""
+
+    def test_estimate_error_is_small(self):
+        registers = empty_registers()
+        for i in range(20000):
+            index, rank = register_of(f'device-{i}')
+            registers[index] = max(registers[index], rank)
+        self.assertAlmostEqual(estimate(registers), 20000, delta=20000 * 0.05)
+
+    def test_sketches_follow_scans_and_merge_across_campaigns(self):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        campaigns = [
+            AdvCampaign.objects.create(
+                unique_id=f'AC_HLL_{i:05d}', camp_name='Sketch', client=client,
+                start_date=date.today(), end_date=date.today() + timedelta(days=10),
+                number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+            )
+            for i in range(2)
+        ]
+        for i in range(40):
+            ScanTracking.objects.create(
+                campaign=campaigns[i % 2], ip_address='10.0.0.1', user_agent='ua',
+                device_fingerprint=f'fp{i % 30}', session_id='s',
+            )
+        ids = [c.id for c in campaigns]
+
+        self.assertEqual(device_count(ids, exact=True), 30)
+        self.assertEqual(device_count(ids), 30)
+        self.assertEqual(device_count(ids[:1]), device_count(ids[:1], exact=True))
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.assertEqual(device_count(ids, start=tomorrow), 0)
+
+
+class ExportTests(TestCase):
+    """CSV exports stream values_list rows in chunks"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', 'staff@example.com', 'password')
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        cls.campaign = AdvCampaign.objects.create(
+            unique_id='AC_EXP_00001', camp_name='Export', client=client,
+            start_date=date.today(), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='-', area_served='-',
+        )
+        ScanTracking.objects.bulk_create([
+            ScanTracking(
+                campaign=cls.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint=f'fp{i}',
+                session_id='s', video_percentage=i, form_submitted=i % 2 == 0, user_name=f'user{i}',
+                user_phone=f'98765{i:05d}', reward_status='granted' if i % 4 == 0 else 'pending',
+            )
+            for i in range(25)
+        ])
+
+    def test_scan_export_streams_in_chunks(self):
+        self.client.force_login(self.user)
+        with self.settings(EXPORT_CHUNK_SIZE=10):
+            response = self.client.get(reverse('sw:export_campaign_data', args=[self.campaign.unique_id]))
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+
+        # header, then 10 + 10 + 5 rows
+        self.assertEqual(len(chunks), 4)
+        lines = b''.join(chunks).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 26)
+        self.assertTrue(lines[0].startswith('Campaign Name,'))
+        self.assertIn('Export,AC_EXP_00001,', lines[1])
+
+    def test_reward_export_labels_statuses(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('sw:export_rewards', args=[self.campaign.id]))
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+
+        self.assertEqual(len(lines), 14)
+        self.assertEqual(sum('Reward Granted' in line for line in lines), 7)
+
+    def test_table_export_is_one_query_with_list_filters(self):
+        for i, active in enumerate([True, True, False]):
+            manufacturer = Manufacturer.objects.create(
+                name=f'Maker {i}', contact_person='-', contact_number='9876543210', address='-', is_active=active,
+            )
+            for n in range(i + 1):
+                Order.objects.create(
+                    manufacturer=manufacturer, order_number=f'O{i}{n}', expected_delivery=date.today(),
+                    product_name='Water', quantity=10, unit_price=Decimal('2.50'),
+                )
+        self.client.force_login(self.user)
+        url = reverse('sw:export_manufacturers')
+
+        # session + user, export rows
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'status': 'active'})
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[-2:], ['Total Orders', 'Created Date'])
+        self.assertEqual(sorted(line.split(',')[-2] for line in lines[1:]), ['1', '2'])
+
+        response = self.client.get(url, {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+
+    def test_background_job_writes_file_and_expires(self):
+        self.client.force_login(self.user)
+        with tempfile.TemporaryDirectory() as media, tempfile.TemporaryDirectory() as private, \
+                self.settings(MEDIA_ROOT=media, EXPORT_JOB_ROOT=private, EXPORT_CHUNK_SIZE=10):
+            url = reverse('sw:start_export_job')
+            self.assertEqual(self.client.post(url, {'export': 'rewards', 'campaign': 'x'}).status_code, 400)
+            response = self.client.post(url, {'export': 'rewards', 'campaign': self.campaign.id})
+            self.assertEqual(response.status_code, 202)
+            status_url = response.json()['status_url']
+            self.assertEqual(self.client.get(status_url).json()['status'], 'pending')
+
+            self.assertEqual(run_pending(), 1)
+            job = self.client.get(status_url).json()
+            self.assertEqual((job['status'], job['rows_done'], job['total_rows']), ('done', 13, 13))
+            download = self.client.get(job['download_url'])
+            lines = b''.join(download.streaming_content).decode('utf-8-sig').splitlines()
+            self.assertEqual(len(lines), 14)
+            download.close()
+
+            # Phone numbers never land in the publicly served MEDIA_ROOT
+            job = ExportJob.objects.get()
+            self.assertEqual((os.listdir(media), os.listdir(private)), ([], [job.file.name]))
+            with self.assertRaises(ValueError):
+                job.file.url
+
+            ExportJob.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(cleanup_expired(), 1)
+            self.assertEqual(self.client.get(status_url).status_code, 404)
+
+    def test_stalled_job_is_failed_and_expires(self):
+        with tempfile.TemporaryDirectory() as private, self.settings(EXPORT_JOB_ROOT=private, EXPORT_JOB_TIMEOUT=60):
+            start_job('rewards', {'campaign': self.campaign.id}, 'rewards.csv')
+            job = claim_job()
+            self.assertIsNotNone(job.expires_at)
+            self.assertEqual(fail_stalled(), 0)
+
+            # The worker died: the claim ages past the timeout
+            ExportJob.objects.update(started_at=timezone.now() - timedelta(seconds=61))
+            self.assertEqual(fail_stalled(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'failed')
+
+            # A worker that was only slow does not resurrect the job
+            self.assertFalse(run_job(job))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.file.name), ('failed', ''))
+            self.assertEqual(os.listdir(private), [])
+
+            ExportJob.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(cleanup_expired(), 1)
+
+    def test_delta_export_pages_by_keyset_cursor(self):
+        self.client.force_login(self.user)
+        url = reverse('sw:export_changes', args=[self.campaign.unique_id])
+
+        seen, cursor = [], ''
+        while True:
+            # session + user, campaign, page
+            with self.assertNumQueries(4):
+                page = self.client.get(url, {'cursor': cursor, 'limit': 10}).json()
+            seen += [row['id'] for row in page['results']]
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(sorted(seen), sorted(ScanTracking.objects.values_list('id', flat=True)))
+
+        page = self.client.get(url, {'cursor': cursor}).json()
+        self.assertEqual((page['results'], page['next_cursor']), ([], cursor))
+
+        changed = ScanTracking.objects.order_by('id').first()
+        changed.reward_notes = 'checked'
+        changed.save()
+        response = self.client.get(url, {'cursor': cursor, 'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{changed.id},'))
+        self.assertNotEqual(response['X-Next-Cursor'], cursor)
+
+        self.assertEqual(self.client.get(url, {'cursor': 'bogus'}).status_code, 400)
+
+    def test_delta_export_keeps_changes_of_long_transactions(self):
+        self.client.force_login(self.user)
+        url = reverse('sw:export_changes', args=[self.campaign.unique_id])
+        cursor = self.client.get(url, {'limit': 100}).json()['next_cursor']
+        first, late = ScanTracking.objects.filter(form_submitted=True).order_by('id')[:2]
+
+        # A bulk reward change that stamped last_activity ten minutes ago ...
+        stamped = timezone.now() - timedelta(minutes=10)
+        with mock.patch('campaign.reward_updates.timezone.now', return_value=stamped):
+            with transaction.atomic():
+                bulk_update_rewards(self.campaign, [late.id], 'invalid', user=self.user)
+                # ... and commits after a progress change has moved the cursor on
+                apply_progress(first.id, 5, 10, False)
+        page = self.client.get(url, {'cursor': cursor}).json()
+        self.assertEqual([row['id'] for row in page['results']], [late.id, first.id])
+        self.assertEqual(page['results'][0]['reward_status'], 'invalid')
+
+
+class PublicLandingTests(TestCase):
+    """QR landing page: rate limits, scan tokens and reward form"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        cls.campaign = AdvCampaign.objects.create(
+            unique_id='AC_PUB_00001', camp_name='Landing', client=client,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='Hello', area_served='-',
+        )
+
+    def setUp(self):
+        rate_limit.buckets.clear()
+        rate_limit.shed.clear()
+        self.url = reverse('sw:adv_landing', args=[self.campaign.unique_id])
+
+    def test_spoofed_forwarded_for_does_not_bypass_the_limit(self):
+        with self.settings(SCAN_RATE_LIMITS={'default': {'fingerprint': (2, 5), 'ip': (60, 120)}}):
+            statuses = [
+                self.client.get(self.url, {'new': 'true'}, HTTP_X_FORWARDED_FOR=f'203.0.113.{i}').status_code
+                for i in range(10)
+            ]
+        self.assertEqual(statuses, [200] * 5 + [429] * 5)
+        self.assertEqual(ScanTracking.objects.count(), 5)
+
+        with self.settings(TRUSTED_PROXY_COUNT=1):
+            request = RequestFactory().get(self.url, HTTP_X_FORWARDED_FOR='1.2.3.4, 198.51.100.7')
+            self.assertEqual(get_client_ip(request), '198.51.100.7')
+
+    def test_unknown_landing_markers_stay_literal(self):
+        campaign = AdvCampaign.objects.create(
+            unique_id='AC_PUB_00002', camp_name='Markers', client=self.campaign.client,
+            start_date=self.campaign.start_date, end_date=self.campaign.end_date,
+            number_of_bottles=100, budget_of_rewards=1000, area_served='-',
+            customized_message='Use code @@landing:promo@@ today',
+        )
+        response = self.client.get(reverse('sw:adv_landing', args=[campaign.unique_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Use code @@landing:promo@@ today')
+        self.assertNotContains(response, '@@landing:csrf_token@@')
+
+    def test_scan_tokens_reject_tampering_and_other_campaigns(self):
+        token = issue_scan_token(self.campaign.id, 7, submitted=True)
+        self.assertEqual(read_scan_token(token, self.campaign.id), (self.campaign.id, 7, True))
+        self.assertIsNone(read_scan_token(token, self.campaign.id + 1))
+        self.assertIsNone(read_scan_token(token[:-1] + ('A' if token[-1] != 'A' else 'B')))
+        self.assertIsNone(read_scan_token(issue_scan_token(self.campaign.id, 8).replace(':', ':x', 1)))
+        with self.settings(SCAN_TOKEN_MAX_AGE=-1):
+            self.assertIsNone(read_scan_token(token))
+
+    def test_landing_keeps_the_scan_in_a_signed_cookie(self):
+        cookie = f'scan_{self.campaign.unique_id}'
+        self.client.get(self.url)
+        scan_id = read_scan_token(self.client.cookies[cookie].value).scan_id
+        self.client.get(self.url)
+        self.assertEqual(read_scan_token(self.client.cookies[cookie].value).scan_id, scan_id)
+        self.assertEqual((ScanTracking.objects.count(), Session.objects.count()), (1, 0))
+
+        # A tampered cookie is ignored and starts a new scan
+        self.client.cookies[cookie] = issue_scan_token(self.campaign.id, scan_id)[:-2] + 'xx'
+        self.client.get(self.url)
+        self.assertNotEqual(read_scan_token(self.client.cookies[cookie].value).scan_id, scan_id)
+        self.assertEqual(ScanTracking.objects.count(), 2)
+
+        response = self.client.post(
+            reverse('sw:track_video_progress'),
+            json.dumps({'scan_id': scan_id, 'token': 'forged', 'watched_seconds': 10, 'video_duration': 20}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_buckets_refill_at_the_configured_rate(self):
+        table = rate_limit.TokenBuckets()
+        with mock.patch('campaign.rate_limit.time.monotonic', return_value=100.0) as clock:
+            self.assertEqual([table.take('fp', 2, 3) for _ in range(4)], [True, True, True, False])
+            clock.return_value = 115.0  # half a token at 2 per minute
+            self.assertFalse(table.take('fp', 2, 3))
+            clock.return_value = 130.0
+            self.assertEqual([table.take('fp', 2, 3) for _ in range(2)], [True, False])
+            clock.return_value = 1000.0  # never more than the burst
+            self.assertEqual(sum(table.take('fp', 2, 3) for _ in range(5)), 3)
+
+    def test_only_new_scans_are_charged_and_throttled_progress_is_kept(self):
+        limits = {'default': {'fingerprint': (2, 5)}, self.campaign.unique_id: {'fingerprint': (1, 1)}}
+        buffer = HeartbeatBuffer()
+        buffer._ensure_started = lambda: None
+        with self.settings(SCAN_RATE_LIMITS=limits, HEARTBEAT_RATE_LIMITS={'ip': (1, 2)}), \
+                mock.patch('campaign.views.heartbeat_buffer', buffer):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            # Reloading the scan in the cookie creates no row and is free
+            self.assertEqual([self.client.get(self.url).status_code for _ in range(3)], [200] * 3)
+            response = self.client.get(self.url, {'new': 'true'})
+            self.assertEqual((response.status_code, response['Retry-After']), (429, '60'))
+
+            token = self.client.cookies[f'scan_{self.campaign.unique_id}'].value
+            scan_id = read_scan_token(token).scan_id
+
+            def beacon(watched, completed=False):
+                event = {'token': token, 'scan_id': scan_id, 'watched': watched, 'duration': 60, 'completed': completed}
+                return self.client.post(
+                    reverse('sw:track_video_batch'), json.dumps([event]), content_type='application/json',
+                ).status_code
+
+            self.assertEqual([beacon(10), beacon(20), beacon(60, True)], [200, 200, 429])
+
+        # The throttled completion waits in the buffer instead of being lost
+        self.assertEqual(ScanTracking.objects.get().video_completed, False)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(ScanTracking.objects.get().video_completed, True)
+        self.assertEqual(rate_limit.stats()['shed']['heartbeat.ip'], 1)
+
+    def test_full_bucket_table_evicts_least_recently_used(self):
+        table = rate_limit.TokenBuckets(max_keys=3)
+        self.assertTrue(table.take('busy', 1, 1))
+        for key in ('a', 'b', 'c'):
+            table.take(key, 1, 1)
+        self.assertEqual((table.evicted, table.take('busy', 1, 1)), (1, True))
+        table.take('busy', 1, 1)
+        table.take('d', 1, 1)
+        # 'busy' was used last, so it keeps its empty bucket
+        self.assertFalse(table.take('busy', 1, 1))
+
+
+class AsyncPublicViewTests(TransactionTestCase):
+    """The native async landing and heartbeat views behave like the sync ones"""
+
+    def setUp(self):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        self.campaign = AdvCampaign.objects.create(
+            unique_id='AC_ASY_00001', camp_name='Async', client=client,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='Hello', area_served='-',
+        )
+        rate_limit.buckets.clear()
+        self.factory = AsyncRequestFactory()
+        self.url = reverse('sw:adv_landing', args=[self.campaign.unique_id])
+
+    async def landing(self, token=None):
+        request = self.factory.get(self.url)
+        if token:
+            request.COOKIES[f'scan_{self.campaign.unique_id}'] = token
+        response = await async_views.adv_landing(request, self.campaign.unique_id)
+        return response, response.cookies[f'scan_{self.campaign.unique_id}'].value
+
+    async def test_landing_and_heartbeat(self):
+        response, token = await self.landing()
+        self.assertEqual(response.status_code, 200)
+        scan_id = read_scan_token(token).scan_id
+        # Reloading with the cookie continues the same scan
+        _, again = await self.landing(token)
+        self.assertEqual(read_scan_token(again).scan_id, scan_id)
+        self.assertEqual(await ScanTracking.objects.acount(), 1)
+
+        request = self.factory.post(
+            reverse('sw:track_video_progress'),
+            json.dumps({'scan_id': scan_id, 'token': token, 'watched_seconds': 20, 'video_duration': 40}),
+            content_type='application/json',
+        )
+        threads = []
+
+        def recording_apply_progress(*args):
+            threads.append(threading.current_thread())
+            return apply_progress(*args)
+
+        with mock.patch('campaign.async_views.apply_progress', recording_apply_progress):
+            response = await async_views.track_video_progress(request)
+        self.assertEqual(json.loads(response.content)['tracked']['percentage'], 50.0)
+        # The UPDATE ran on the pool, not the thread sync views share
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+        forged = self.factory.post(
+            reverse('sw:track_video_progress'),
+            json.dumps({'scan_id': scan_id + 1, 'token': token, 'watched_seconds': 40}),
+            content_type='application/json',
+        )
+        self.assertEqual((await async_views.track_video_progress(forged)).status_code, 403)
+
+
+class ScanSpoolTests(TestCase):
+    """Spooled scans: id reservation, sealing, loading and events before the load"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(
+            company_name='Acme', email='acme@example.com', address='-',
+            industry_type='-', contact_person_name='-', contact_phone_number='0',
+        )
+        cls.campaign = AdvCampaign.objects.create(
+            unique_id='AC_SPL_00001', camp_name='Spool', client=client,
+            start_date=date.today() - timedelta(days=1), end_date=date.today() + timedelta(days=10),
+            number_of_bottles=100, budget_of_rewards=1000, customized_message='Hello', area_served='-',
+        )
+
+    def setUp(self):
+        rate_limit.buckets.clear()
+        self.url = reverse('sw:adv_landing', args=[self.campaign.unique_id])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.spool = ScanSpool(self.directory, segment_seconds=3600, id_block=10)
+        # No sync thread: the tests seal explicitly
+        self.spool._ensure_started = lambda: None
+        for target in ('campaign.views.scan_spool', 'campaign.scan_spool.scan_spool'):
+            patcher = mock.patch(target, self.spool)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        spooling = self.settings(SCAN_SPOOL_ENABLED=True)
+        spooling.enable()
+        self.addCleanup(spooling.disable)
+
+    def spooled_landing(self):
+        """Open the landing page; returns (scan id, token) of the spooled scan"""
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        token = self.client.cookies[f'scan_{self.campaign.unique_id}'].value
+        scan_id = read_scan_token(token).scan_id
+        self.assertFalse(ScanTracking.objects.filter(id=scan_id).exists())
+        return scan_id, token
+
+    def test_reserved_ids_are_never_reused(self):
+        first = reserve_ids(ScanTracking, 3)
+        second = reserve_ids(ScanTracking, 2)
+        self.assertEqual(len(set(first) | set(second)), 5)
+        scan = ScanTracking.objects.create(
+            campaign=self.campaign, ip_address='10.0.0.1', user_agent='ua', device_fingerprint='fp', session_id='s',
+        )
+        self.assertGreater(scan.id, max(second))
+
+    def test_heartbeats_before_the_load_are_replayed(self):
+        scan_id, token = self.spooled_landing()
+        response = self.client.post(
+            reverse('sw:track_video_progress'),
+            json.dumps({'scan_id': scan_id, 'token': token, 'watched_seconds': 12, 'video_duration': 40}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 202)
+
+        self.spool.close()
+        self.assertEqual([name.endswith('.ready') for name in os.listdir(self.directory)], [True])
+        stats = load_spool(self.directory)
+        self.assertEqual((stats['scans'], stats['progress'], stats['progress_carried']), (1, 1, 0))
+
+        scan = ScanTracking.objects.get(id=scan_id)
+        self.assertEqual((scan.video_watched, scan.video_percentage), (12, Decimal('30')))
+        self.assertEqual(AdvCampaign.objects.get(id=self.campaign.id).total_scans, 1)
+        # Loading is idempotent
+        self.assertEqual(load_spool(self.directory)['segments'], 0)
+
+    def test_progress_of_a_scan_not_spooled_yet_is_carried_over(self):
+        self.spool.append_progress(10 ** 6, 5, 40, False)
+        self.spool.close()
+        stats = load_spool(self.directory)
+        self.assertEqual((stats['progress'], stats['progress_carried']), (0, 1))
+        with self.settings(SCAN_SPOOL_PROGRESS_MAX_AGE=-1):
+            stats = load_spool(self.directory)
+        self.assertEqual((stats['progress_carried'], stats['progress_dropped']), (0, 1))
+        self.assertEqual(os.listdir(self.directory), ['.loader.lock'])
+
+    def test_form_submitted_before_the_load_inserts_the_scan(self):
+        scan_id, _ = self.spooled_landing()
+        response = self.client.post(self.url, {'name': 'Asha Rao', 'phone': '9876543210'})
+        self.assertEqual(response.status_code, 302)
+        scan = ScanTracking.objects.get(id=scan_id)
+        self.assertTrue(scan.form_submitted)
+
+        self.spool.close()
+        load_spool(self.directory)
+        scan.refresh_from_db()
+        self.assertTrue(scan.form_submitted)
+        self.assertEqual(ScanTracking.objects.count(), 1)
+        self.assertEqual(drifted_campaigns([self.campaign.id]), [])
+
+    def test_unsupported_database_inserts_directly(self):
+        with mock.patch('campaign.scan_spool.supports_reserve_ids', return_value=False), \
+                self.assertLogs('campaign.scan_spool', 'WARNING'):
+            scan = create_new_scan(self.campaign, '10.0.0.1', 'ua', 'fp', 'mobile', 'Chrome', 'Android')
+        self.assertTrue(ScanTracking.objects.filter(id=scan.id).exists())
+        self.assertEqual(os.listdir(self.directory), [])
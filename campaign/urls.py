@@ -1,6 +1,10 @@
 # urls.py - Fixed URL ordering
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Public scan endpoints: native async versions when served under ASGI
+public_views = async_views if getattr(settings, 'ASYNC_PUBLIC_VIEWS', False) else views
 
 app_name = 'sw'
 
@@ -21,6 +25,7 @@ urlpatterns = [
     
     # 4. Reports
     path('reports/', views.report_list, name='report_list'),
+    path('reports/histogram/', views.watch_histogram, name='watch_histogram'),
     path('reports/<str:unique_id>/', views.report_detail, name='report_detail'),
     
     # 5. Manufacturers
@@ -36,19 +41,25 @@ urlpatterns = [
     path('supplies/', views.supply_list, name='supply_list'),
     
     # Export functionality - SPECIFIC PATHS FIRST
-    path('export/manufacturers/', views.export_manufacturers, name='export_manufacturers'),
-    path('export/orders/', views.export_orders, name='export_orders'),
-    path('export/suppliers/', views.export_suppliers, name='export_suppliers'),
-    path('export/supplies/', views.export_supplies, name='export_supplies'),
+    path('export/manufacturers/', views.export_table, {'name': 'manufacturers'}, name='export_manufacturers'),
+    path('export/orders/', views.export_table, {'name': 'orders'}, name='export_orders'),
+    path('export/suppliers/', views.export_table, {'name': 'suppliers'}, name='export_suppliers'),
+    path('export/supplies/', views.export_table, {'name': 'supplies'}, name='export_supplies'),
+    path('export/changes/<str:unique_id>/', views.export_changes, name='export_changes'),
+    path('export/jobs/', views.start_export_job, name='start_export_job'),
+    path('export/jobs/<int:job_id>/', views.export_job_status, name='export_job_status'),
+    path('export/jobs/<int:job_id>/download/', views.download_export_job, name='download_export_job'),
     # GENERIC PATHS LAST
     path('export/', views.export_campaign_data, name='export_all_data'),
     path('export/<str:unique_id>/', views.export_campaign_data, name='export_campaign_data'),
     
     # PUBLIC URLs
-    path('adv/<str:unique_id>/', views.adv_landing, name='adv_landing'),
+    path('adv/<str:unique_id>/', public_views.adv_landing, name='adv_landing'),
     
     # AJAX Endpoints
-    path('track-video/', views.track_video_progress, name='track_video_progress'),
+    path('track-video/', public_views.track_video_progress, name='track_video_progress'),
+    path('track-video/batch/', public_views.track_video_batch, name='track_video_batch'),
+    path('rate-limits/', views.rate_limit_stats, name='rate_limit_stats'),
     path('rewards/', views.rewards_list, name='rewards_list'),
     path('rewards/<int:campaign_id>/', views.rewards_detail, name='rewards_detail'),
     path('rewards/<int:campaign_id>/export/', views.export_rewards, name='export_rewards'),
@@ -0,0 +1,128 @@
+# user_agents.py - User-agent classification for scans
+"""
+Device / browser / OS detection for ScanTracking.
+
+The rules are kept in ordered tables (first match wins) and compiled once at
+import into frozen token sets, so each token is tested once per UA no matter
+how many rules mention it. Results are memoized per raw UA string:
+real traffic is dominated by a few hundred distinct mobile UAs, so nearly
+every lookup on the landing page is a cache hit.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+UNKNOWN_DEVICE = 'unknown'
+UNKNOWN = 'Unknown'
+
+UAClass = namedtuple('UAClass', ['device_type', 'browser', 'os'])
+
+# (label, substrings of which any must match, substrings of which none may match)
+DEVICE_RULES = [
+    ('mobile', ('mobile', 'android', 'iphone'), ()),
+    ('tablet', ('ipad', 'tablet'), ()),
+    ('desktop', ('windows', 'mac', 'linux'), ()),
+]
+
+BROWSER_RULES = [
+    ('Chrome', ('chrome',), ('edge',)),
+    ('Safari', ('safari',), ('chrome',)),
+    ('Firefox', ('firefox',), ()),
+    ('Edge', ('edge',), ()),
+    ('Opera', ('opera',), ()),
+]
+
+OS_RULES = [
+    ('Android', ('android',), ()),
+    ('iOS', ('iphone', 'ipad', 'ipod'), ()),
+    ('Windows', ('windows',), ()),
+    ('macOS', ('mac',), ()),
+    ('Linux', ('linux',), ()),
+]
+
+
+def _compile(rules):
+    return [(label, frozenset(include), frozenset(exclude)) for label, include, exclude in rules]
+
+
+_DEVICE_TABLE = _compile(DEVICE_RULES)
+_BROWSER_TABLE = _compile(BROWSER_RULES)
+_OS_TABLE = _compile(OS_RULES)
+
+# Every token any rule looks at; each is tested once per UA
+_TOKENS = tuple(sorted(
+    {token for rules in (DEVICE_RULES, BROWSER_RULES, OS_RULES)
+     for _, include, exclude in rules for token in include + exclude}
+))
+
+
+def _match(table, present, default):
+    for label, include, exclude in table:
+        if not include.isdisjoint(present) and exclude.isdisjoint(present):
+            return label
+    return default
+
+
+@lru_cache(maxsize=2048)
+def classify_user_agent(user_agent):
+    """Return UAClass(device_type, browser, os) for a raw User-Agent header"""
+    if not user_agent:
+        return UAClass(UNKNOWN_DEVICE, UNKNOWN, UNKNOWN)
+    ua = user_agent.lower()
+    present = {token for token in _TOKENS if token in ua}
+    return UAClass(
+        _match(_DEVICE_TABLE, present, UNKNOWN_DEVICE),
+        _match(_BROWSER_TABLE, present, UNKNOWN),
+        _match(_OS_TABLE, present, UNKNOWN),
+    )
+
+
+def reclassify_scans(queryset=None, chunk_size=5000, dry_run=False):
+    """
+    Re-run the classifier over stored ScanTracking.user_agent values.
+
+    Makes one sequential pass over the table and only writes rows whose
+    classification changed, with one UPDATE per (chunk, new classification).
+    Returns (rows_seen, rows_changed).
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from .models import ScanChangeSequence, ScanTracking
+
+    if queryset is None:
+        queryset = ScanTracking.objects.all()
+    rows = (
+        queryset.order_by('id')
+        .values_list('id', 'user_agent', 'device_type', 'browser', 'os')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    seen = changed = 0
+    pending = {}
+
+    def write(pending):
+        with transaction.atomic():
+            change_seq = ScanChangeSequence.next_value()
+            for result, ids in pending.items():
+                for start in range(0, len(ids), 900):
+                    ScanTracking.objects.filter(id__in=ids[start:start + 900]).update(
+                        device_type=result.device_type,
+                        browser=result.browser[:50],
+                        os=result.os[:50],
+                        last_activity=timezone.now(),
+                        change_seq=change_seq,
+                    )
+
+    for scan_id, user_agent, device_type, browser, os in rows:
+        seen += 1
+        result = classify_user_agent(user_agent)
+        if result != (device_type, browser, os):
+            changed += 1
+            pending.setdefault(result, []).append(scan_id)
+        if seen % chunk_size == 0 and pending:
+            if not dry_run:
+                write(pending)
+            pending = {}
+
+    if pending and not dry_run:
+        write(pending)
+    return seen, changed
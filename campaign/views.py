@@ -1,12 +1,13 @@
 # views.py - Updated Structure
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q, Count, Avg, Sum, Case, When, F, FloatField
-from django.db.models.functions import TruncDate
-from django.http import JsonResponse, HttpResponse
+from django.db.models.functions import Coalesce, TruncDate
+from django.http import FileResponse, Http404, JsonResponse
 from django.core.files.base import ContentFile
 from django.conf import settings
 from django.utils import timezone
@@ -16,11 +17,30 @@ import json
 import random
 import string
 import hashlib
-import csv
 from io import BytesIO
 
-from .models import Client, AdvCampaign, ScanTracking
+from .models import Client, AdvCampaign, CampaignHourlyStats, ExportJob, ScanTracking
 from .forms import ClientForm, AdvCampaignForm
+from .analytics import WATCH_EDGES, campaign_report, percentage, reward_summary
+from .campaign_cache import get_campaign_snapshot
+from .cohorts import campaign_cohorts
+from .csv_export import streaming_csv_response
+from .delta_export import DELTA_FIELDS, changed_scans
+from .export_jobs import start_job
+from .exports import export_response
+from .db import retry_on_lock
+from .histogram import HISTOGRAM_FIELDS, bucket_labels, grouped_histogram, parse_edges
+from .landing_page import render_landing
+from .list_filters import filter_manufacturers, filter_orders, filter_suppliers, filter_supplies
+from .phone_filter import registered_phones
+from . import rate_limit
+from .rate_limit import allow_heartbeat, allow_scan, throttled_heartbeat, throttled_landing
+from .report_cache import cached_report
+from .reward_updates import bulk_update_rewards
+from .scan_tokens import issue_scan_token, read_scan_cookie, read_scan_token, set_scan_cookie
+from .scan_spool import scan_spool, spool_enabled, spool_progress, spool_unloaded_progress, spooled_scan
+from .progress import apply_progress, apply_progress_batch, heartbeat_buffer, merge_progress
+from .user_agents import classify_user_agent
 
 # Try to import qrcode
 try:
@@ -105,17 +125,21 @@ def overview(request):
     )
     total_supplies = supply_stats['total']
     
-    # Campaign engagement statistics
-    scan_stats = ScanTracking.objects.aggregate(
-        total_scans=Count('id'),
-        total_submissions=Count('id', filter=Q(form_submitted=True))
+    # Campaign engagement and reward statistics from the campaign counters
+    scan_stats = AdvCampaign.objects.aggregate(
+        total_scans=Coalesce(Sum('total_scans'), 0),
+        total_submissions=Coalesce(Sum('total_submissions'), 0),
+        total_pending=Coalesce(Sum('pending_rewards'), 0),
+        total_granted=Coalesce(Sum('granted_rewards'), 0),
+        total_reward_amount=Sum('granted_reward_amount'),
     )
     
-    # Today's statistics
-    today = timezone.now().date()
-    today_stats = ScanTracking.objects.filter(scanned_at__date=today).aggregate(
-        scans_today=Count('id'),
-        submissions_today=Count('id', filter=Q(form_submitted=True))
+    # Today's statistics from the hourly rollup
+    today = timezone.localdate()
+    today_start = datetime.combine(today, datetime.min.time(), tzinfo=timezone.get_current_timezone())
+    today_stats = CampaignHourlyStats.objects.filter(hour__gte=today_start).aggregate(
+        scans_today=Coalesce(Sum('scans'), 0),
+        submissions_today=Coalesce(Sum('submissions'), 0),
     )
     
     # Calculate conversion rate
@@ -130,11 +154,8 @@ def overview(request):
         campaign_count=Count('campaigns')
     ).order_by('-created_at')[:5]
     
-    # Recent Campaigns with scan metrics
-    recent_campaigns = AdvCampaign.objects.select_related('client').annotate(
-        scan_count=Count('scans'),
-        submission_count=Count('scans', filter=Q(scans__form_submitted=True))
-    ).order_by('-created_at')[:5]
+    # Recent Campaigns (scan metrics are counter columns)
+    recent_campaigns = AdvCampaign.objects.select_related('client').order_by('-created_at')[:5]
     
     # Recent Manufacturers with order count
     recent_manufacturers = Manufacturer.objects.filter(is_active=True).annotate(
@@ -145,13 +166,6 @@ def overview(request):
     # Recent Orders with manufacturer info
     recent_orders = Order.objects.select_related('manufacturer').order_by('-order_date')[:5]
     
-    # Reward statistics
-    reward_stats = ScanTracking.objects.filter(form_submitted=True).aggregate(
-        total_pending=Count('id', filter=Q(reward_status='pending')),
-        total_granted=Count('id', filter=Q(reward_status='granted')),
-        total_reward_amount=Sum('reward_amount', filter=Q(reward_status='granted'))
-    )
-    
     context = {
         # Page metadata
         'title': 'Dashboard Overview',
@@ -180,9 +194,9 @@ def overview(request):
         'recent_orders': recent_orders,
         
         # Rewards
-        'pending_rewards': reward_stats['total_pending'] or 0,
-        'granted_rewards': reward_stats['total_granted'] or 0,
-        'total_reward_amount': reward_stats['total_reward_amount'] or 0,
+        'pending_rewards': scan_stats['total_pending'],
+        'granted_rewards': scan_stats['total_granted'],
+        'total_reward_amount': scan_stats['total_reward_amount'] or 0,
         
         # User info
         'user': request.user,
@@ -438,12 +452,24 @@ from datetime import datetime, timedelta
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
 
+# ?sort= options of the report list -> ORDER BY (newest first breaks ties)
+REPORT_SORTS = {
+    'recent': ('-created_at', '-id'),
+    'scans': ('-total_scans', '-created_at', '-id'),
+    'conversion': ('-form_conversion_rate', '-total_scans', '-created_at', '-id'),
+    'completion': ('-video_completion_rate', '-total_scans', '-created_at', '-id'),
+}
+
+
 @login_required
 def report_list(request):
     """Reports dashboard - All campaigns overview"""
     
-    # Get search query
+    # Get search query and sort order
     search_query = request.GET.get('search', '')
+    sort = request.GET.get('sort', 'recent')
+    if sort not in REPORT_SORTS:
+        sort = 'recent'
     
     # Get all campaigns with metrics
     campaigns = AdvCampaign.objects.all()
@@ -456,46 +482,23 @@ def report_list(request):
             Q(area_served__icontains=search_query)
         )
     
-    # Annotate campaigns with metrics
+    # Counts are counter columns and the rates SQL expressions, so sorting
+    # and pagination happen in the database and only one page is loaded
     campaigns = campaigns.annotate(
-        total_scans=Count('scans'),
-        total_submissions=Count('scans', filter=Q(scans__form_submitted=True)),
-        total_completions=Count('scans', filter=Q(scans__video_completed=True)),
-        avg_watch_time=Avg('scans__video_watched'),
-        unique_devices=Count('scans__device_fingerprint', distinct=True)
-    ).select_related('client').order_by('-created_at')
-    
-    # Calculate conversion rates for each campaign
-    campaign_list = []
-    for campaign in campaigns:
-        total_scans = campaign.total_scans or 0
-        form_conversion = 0
-        video_completion = 0
-        
-        if total_scans > 0:
-            form_conversion = round((campaign.total_submissions / total_scans) * 100, 2)
-            video_completion = round((campaign.total_completions / total_scans) * 100, 2)
-        
-        campaign_list.append({
-            'campaign': campaign,
-            'total_scans': total_scans,
-            'form_submissions': campaign.total_submissions,
-            'video_completions': campaign.total_completions,
-            'form_conversion_rate': form_conversion,
-            'video_completion_rate': video_completion,
-            'avg_watch_time': round(campaign.avg_watch_time or 0, 1),
-            'unique_devices': campaign.unique_devices
-        })
+        form_conversion_rate=percentage('total_submissions', 'total_scans'),
+        video_completion_rate=percentage('total_completions', 'total_scans'),
+    ).select_related('client').order_by(*REPORT_SORTS[sort])
     
     # Pagination
-    paginator = Paginator(campaign_list, 10)
+    paginator = Paginator(campaigns, 10)
     page_number = request.GET.get('page')
     reports_page = paginator.get_page(page_number)
     
     context = {
         'reports': reports_page,
         'search_query': search_query,
-        'total_campaigns': len(campaign_list),  # Just the count for display
+        'sort': sort,
+        'total_campaigns': paginator.count,
     }
     
     return render(request, 'campaign/reports_list.html', context)
@@ -508,7 +511,7 @@ def report_detail(request, unique_id):
     """
     
     try:
-        campaign = get_object_or_404(AdvCampaign, unique_id=unique_id)
+        campaign = get_object_or_404(AdvCampaign.objects.select_related('client'), unique_id=unique_id)
     except AdvCampaign.DoesNotExist:
         messages.error(request, 'Campaign not found')
         return redirect('sw:report_list')
@@ -516,43 +519,33 @@ def report_detail(request, unique_id):
     # Get all scans for this campaign
     all_scans = ScanTracking.objects.filter(campaign=campaign)
     
+    # All aggregate metrics in a handful of grouped queries, cached until
+    # the campaign's data changes
+    report = cached_report(campaign, 'detail', lambda: campaign_report(campaign))
+    cohorts = cached_report(
+        campaign, 'cohorts', lambda: campaign_cohorts(campaign),
+        stale_seconds=getattr(settings, 'COHORT_CACHE_STALE_SECONDS', 300),
+    )
+    summary = report['summary']
+    
     # ============== BASIC METRICS ==============
-    total_scans = all_scans.count()
-    unique_devices = all_scans.values('device_fingerprint').distinct().count()
-    form_submissions = all_scans.filter(form_submitted=True).count()
-    video_completions = all_scans.filter(video_completed=True).count()
+    total_scans = summary['total_scans']
+    unique_devices = summary['unique_devices']
+    form_submissions = summary['form_submissions']
+    video_completions = summary['video_completions']
     
     # Conversion Rates
     form_conversion_rate = (form_submissions / total_scans * 100) if total_scans else 0
     video_completion_rate = (video_completions / total_scans * 100) if total_scans else 0
     
     # Average Metrics
-    avg_watch_time = all_scans.exclude(
-        video_watched=0
-    ).aggregate(avg=Avg('video_watched'))['avg'] or 0
-    
-    avg_video_percentage = all_scans.exclude(
-        video_percentage=0
-    ).aggregate(avg=Avg('video_percentage'))['avg'] or 0
+    avg_watch_time = summary['avg_watch_time']
+    avg_video_percentage = summary['avg_video_percentage']
     
     # ============== DEVICE & PLATFORM STATISTICS ==============
-    device_stats = list(
-        all_scans.values('device_type')
-        .annotate(count=Count('id'))
-        .order_by('-count')
-    )
-    
-    browser_stats = list(
-        all_scans.values('browser')
-        .annotate(count=Count('id'))
-        .order_by('-count')[:5]  # Top 5 browsers
-    )
-    
-    os_stats = list(
-        all_scans.values('os')
-        .annotate(count=Count('id'))
-        .order_by('-count')[:5]  # Top 5 OS
-    )
+    device_stats = report['device_stats']
+    browser_stats = report['browser_stats']  # Top 5 browsers
+    os_stats = report['os_stats']  # Top 5 OS
     
     # ============== RECENT ACTIVITY ==============
     recent_submissions = all_scans.filter(
@@ -562,54 +555,31 @@ def report_detail(request, unique_id):
     recent_scans = all_scans.order_by('-scanned_at')[:10]
     
     # ============== TIME-BASED ANALYTICS ==============
-    # Hourly Distribution
-    hourly_scans = {}
-    for hour in range(24):
-        hourly_scans[hour] = all_scans.filter(
-            scanned_at__hour=hour
-        ).count()
-    
-    # Daily Trend (Last 30 days)
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=30)
-    daily_trend = []
-    
-    for i in range(30):
-        date = start_date + timedelta(days=i)
-        day_scans = all_scans.filter(
-            scanned_at__date=date.date()
-        )
-        daily_trend.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'scans': day_scans.count(),
-            'submissions': day_scans.filter(form_submitted=True).count()
-        })
+    # Hourly Distribution (local time)
+    hourly_scans = report['hourly_scans']
+    
+    # Daily Trend (last 30 local days, today included)
+    daily_trend = report['daily_trend']
     
     # Peak hours analysis
     peak_hours = sorted(hourly_scans.items(), key=lambda x: x[1], reverse=True)[:3]
     
     # ============== VIDEO ENGAGEMENT ==============
     # Video Watch Distribution
-    watch_distribution = {
-        '0-25%': all_scans.filter(video_percentage__lte=25).count(),
-        '26-50%': all_scans.filter(video_percentage__gt=25, video_percentage__lte=50).count(),
-        '51-75%': all_scans.filter(video_percentage__gt=50, video_percentage__lte=75).count(),
-        '76-99%': all_scans.filter(video_percentage__gt=75, video_percentage__lt=100).count(),
-        '100%': all_scans.filter(video_percentage=100).count(),
-    }
+    watch_distribution = summary['watch_distribution']
     
     # Engagement Funnel
     engagement_funnel = {
         'Total Scans': total_scans,
-        'Video Started': all_scans.filter(video_watched__gt=0).count(),
-        'Video 50%+': all_scans.filter(video_percentage__gte=50).count(),
+        'Video Started': summary['video_started'],
+        'Video 50%+': summary['video_half'],
         'Video Completed': video_completions,
         'Form Submitted': form_submissions
     }
     
     # ============== PERFORMANCE INDICATORS ==============
     # Calculate bounce rate (scanned but didn't watch video)
-    bounce_rate = all_scans.filter(video_watched=0).count()
+    bounce_rate = summary['bounces']
     bounce_percentage = (bounce_rate / total_scans * 100) if total_scans else 0
     
     # Performance classification
@@ -669,6 +639,7 @@ def report_detail(request, unique_id):
         'daily_trend': daily_trend,
         'watch_distribution': watch_distribution,
         'engagement_funnel': engagement_funnel,
+        'cohorts': cohorts,
         'peak_hours': peak_hours,
         'performance': performance,
         'performance_level': performance_level,
@@ -678,6 +649,37 @@ def report_detail(request, unique_id):
     
     return render(request, 'campaign/campaign_report.html', context)
 
+
+@login_required
+def watch_histogram(request):
+    """
+    Watch-depth histogram per campaign as JSON, for cross-campaign comparison.
+    ?field=video_percentage|video_watched, ?edges=0,25,50 (half-open buckets,
+    default: the report's watch buckets), ?campaigns=<unique_id>,... (default: all).
+    """
+    field = request.GET.get('field', 'video_percentage')
+    if field not in HISTOGRAM_FIELDS:
+        return JsonResponse({'status': 'error', 'message': 'Unknown field'}, status=400)
+    try:
+        edges = parse_edges(request.GET.get('edges') or WATCH_EDGES)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    scans = ScanTracking.objects.all()
+    campaign_ids = [uid for uid in request.GET.get('campaigns', '').split(',') if uid]
+    if campaign_ids:
+        scans = scans.filter(campaign__unique_id__in=campaign_ids)
+    
+    campaigns = grouped_histogram(scans, field, edges, 'campaign__unique_id')
+    return JsonResponse({
+        'status': 'success',
+        'field': field,
+        'edges': edges,
+        'labels': bucket_labels(edges, HISTOGRAM_FIELDS[field]),
+        'campaigns': campaigns,
+        'total': [sum(counts) for counts in zip(*campaigns.values())] or [0] * len(edges),
+    })
+
 # Add these imports to your existing views.py
 from decimal import Decimal
 from .models import Manufacturer, Order, Supplier, Supply  # Add these to existing imports
@@ -688,105 +690,9 @@ from .models import Manufacturer, Order, Supplier, Supply  # Add these to existi
 
 # ============== EXPORT FUNCTIONS ==============
 @login_required
-def export_manufacturers(request):
-    """Export manufacturers to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="manufacturers.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'Contact Person', 'Contact Number', 'Email', 'City', 'State', 'GST Number', 'Total Orders', 'Created Date'])
-    
-    manufacturers = Manufacturer.objects.all()
-    for manufacturer in manufacturers:
-        writer.writerow([
-            manufacturer.name,
-            manufacturer.contact_person,
-            manufacturer.contact_number,
-            manufacturer.email,
-            manufacturer.city,
-            manufacturer.state,
-            manufacturer.gst_number,
-            manufacturer.total_orders,
-            manufacturer.created_at.strftime('%Y-%m-%d'),
-        ])
-    
-    return response
-
-@login_required
-def export_orders(request):
-    """Export orders to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="orders.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Order Number', 'Manufacturer', 'Product', 'Quantity', 'Unit Price', 'Total Amount', 'Status', 'Order Date', 'Expected Delivery'])
-    
-    orders = Order.objects.select_related('manufacturer')
-    for order in orders:
-        writer.writerow([
-            order.order_number,
-            order.manufacturer.name,
-            order.product_name,
-            order.quantity,
-            order.unit_price,
-            order.total_amount,
-            order.status,
-            order.order_date.strftime('%Y-%m-%d'),
-            order.expected_delivery.strftime('%Y-%m-%d'),
-        ])
-    
-    return response
-
-@login_required
-def export_suppliers(request):
-    """Export suppliers to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="suppliers.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'Type', 'Contact Person', 'Contact Number', 'Email', 'City', 'State', 'Rating', 'Total Supplies'])
-    
-    suppliers = Supplier.objects.all()
-    for supplier in suppliers:
-        writer.writerow([
-            supplier.name,
-            supplier.get_supplier_type_display(),
-            supplier.contact_person,
-            supplier.contact_number,
-            supplier.email,
-            supplier.city,
-            supplier.state,
-            supplier.rating,
-            supplier.total_supplies,
-        ])
-    
-    return response
-
-@login_required
-def export_supplies(request):
-    """Export supplies to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="supplies.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Supply Number', 'Supplier', 'Product', 'Quantity', 'Unit Price', 'Total Amount', 'Status', 'Supply Date', 'Expected Delivery', 'Quality Rating'])
-    
-    supplies = Supply.objects.select_related('supplier')
-    for supply in supplies:
-        writer.writerow([
-            supply.supply_number,
-            supply.supplier.name,
-            supply.product_name,
-            supply.quantity_supplied,
-            supply.unit_price,
-            supply.total_amount,
-            supply.status,
-            supply.supply_date.strftime('%Y-%m-%d'),
-            supply.expected_delivery.strftime('%Y-%m-%d'),
-            supply.quality_rating,
-        ])
-    
-    return response
+def export_table(request, name):
+    """Export a management table to CSV, with the table's filters; ?gzip=1 compresses it"""
+    return export_response(name, request.GET, gzip=request.GET.get('gzip') == '1')
 
 
 # ============== PUBLIC QR LANDING PAGE ==============
@@ -798,7 +704,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Q, Count, Avg
-from django.db import transaction
+from django.db import IntegrityError, transaction
 import uuid
 
 def adv_landing(request, unique_id):
@@ -808,7 +714,12 @@ def adv_landing(request, unique_id):
     - Refresh = No new entry (continue with existing scan)
     """
     try:
-        campaign = AdvCampaign.objects.get(unique_id=unique_id)
+        # Cached snapshot - no campaign/client queries on the hot path
+        campaign = get_campaign_snapshot(unique_id)
+        if campaign is None:
+            return render(request, 'campaign/invalid_qr.html', {
+                'error': 'Invalid or expired QR code'
+            })
         
         # Check if campaign is active
         if not campaign.is_active:
@@ -816,67 +727,33 @@ def adv_landing(request, unique_id):
                 'error': 'This campaign has ended or is not yet active'
             })
 
-        # Session key for this campaign
-        session_scan_key = f'scan_{unique_id}'
-        
-        # Device info extraction
+        # Device info extraction (memoized per raw UA string)
         user_agent_string = request.META.get('HTTP_USER_AGENT', '')
-        device_type, browser, os = 'unknown', 'Unknown', 'Unknown'
-        
-        if user_agent_string:
-            ua = user_agent_string.lower()
-            # Device type - prioritize mobile detection
-            if 'mobile' in ua or 'android' in ua or 'iphone' in ua:
-                device_type = 'mobile'
-            elif 'ipad' in ua or 'tablet' in ua:
-                device_type = 'tablet'
-            elif 'windows' in ua or 'mac' in ua or 'linux' in ua:
-                device_type = 'desktop'
-            
-            # Browser detection
-            if 'chrome' in ua and 'edge' not in ua:
-                browser = 'Chrome'
-            elif 'safari' in ua and 'chrome' not in ua:
-                browser = 'Safari'
-            elif 'firefox' in ua:
-                browser = 'Firefox'
-            elif 'edge' in ua:
-                browser = 'Edge'
-            elif 'opera' in ua:
-                browser = 'Opera'
-            
-            # OS detection
-            if 'android' in ua:
-                os = 'Android'
-            elif 'iphone' in ua or 'ipad' in ua or 'ipod' in ua:
-                os = 'iOS'
-            elif 'windows' in ua:
-                os = 'Windows'
-            elif 'mac' in ua:
-                os = 'macOS'
-            elif 'linux' in ua:
-                os = 'Linux'
-
-        # Get IP address
-        ip_address = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip() or \
-                     request.META.get('REMOTE_ADDR', '0.0.0.0')
-        
-        # Create device fingerprint
-        fingerprint_data = f"{user_agent_string}_{ip_address}_{request.META.get('HTTP_ACCEPT_LANGUAGE', '')}"
-        device_fingerprint = hashlib.md5(fingerprint_data.encode()).hexdigest()
+        device_type, browser, os = classify_user_agent(user_agent_string)
+
+        # Get IP address and device fingerprint
+        ip_address = get_client_ip(request)
+        device_fingerprint = get_device_fingerprint(request, user_agent_string, ip_address)
         
+        # Current scan from the signed cookie (no session reads or writes)
+        token = read_scan_cookie(request, campaign)
+
         # Handle POST (form submission)
         if request.method == 'POST':
-            # Get current scan from session
-            scan_id = request.session.get(session_scan_key)
             scan = None
             
-            if scan_id:
+            if token:
                 try:
-                    scan = ScanTracking.objects.get(id=scan_id, campaign=campaign)
+                    scan = ScanTracking.objects.get(id=token.scan_id, campaign_id=campaign.id)
                 except ScanTracking.DoesNotExist:
-                    messages.error(request, 'Session expired. Please scan the QR code again.')
-                    return redirect('sw:adv_landing', unique_id=unique_id)
+                    # A spooled scan the loader hasn't reached yet
+                    if not spool_enabled():
+                        messages.error(request, 'Session expired. Please scan the QR code again.')
+                        return redirect('sw:adv_landing', unique_id=unique_id)
+                    scan = insert_spooled_scan(
+                        campaign, token.scan_id, ip_address, user_agent_string,
+                        device_fingerprint, device_type, browser, os
+                    )
             else:
                 messages.error(request, 'Session expired. Please scan the QR code again.')
                 return redirect('sw:adv_landing', unique_id=unique_id)
@@ -893,64 +770,48 @@ def adv_landing(request, unique_id):
                 messages.error(request, 'Please enter your full name (minimum 3 characters)')
                 return redirect('sw:adv_landing', unique_id=unique_id)
             
-            # Check for duplicate phone submission
-            with transaction.atomic():
-                existing_submission = ScanTracking.objects.filter(
-                    campaign=campaign,
-                    user_phone=phone,
-                    form_submitted=True
-                ).exclude(id=scan.id).exists()
-                
-                if existing_submission:
-                    messages.error(request, 'This phone number has already been registered for this campaign')
-                    return redirect('sw:adv_landing', unique_id=unique_id)
-                
-                # Save form data
-                scan.user_name = name
-                scan.user_phone = phone
-                scan.form_submitted = True
-                scan.form_submitted_at = timezone.now()
-                scan.save()
-                
-                # Mark this scan as submitted
-                request.session[f'submitted_{scan_id}'] = True
-                
-                messages.success(request, 'Registration successful! You will receive your reward within 24 hours.')
+            # Check for duplicate phone submission and save
+            if not submit_scan_form(scan, name, phone):
+                messages.error(request, 'This phone number has already been registered for this campaign')
+                return redirect('sw:adv_landing', unique_id=unique_id)
             
-            return redirect('sw:adv_landing', unique_id=unique_id)
+            messages.success(request, 'Registration successful! You will receive your reward within 24 hours.')
+            
+            # Mark this scan as submitted
+            response = redirect('sw:adv_landing', unique_id=unique_id)
+            return set_scan_cookie(response, campaign, issue_scan_token(campaign.id, scan.id, submitted=True))
         
         # GET request
         # Check for 'new' parameter to force new scan
         force_new = request.GET.get('new', '').lower() == 'true'
         
-        # Get existing scan from session
-        scan_id = request.session.get(session_scan_key)
         scan = None
         
-        if scan_id and not force_new:
+        if token and not force_new:
+            # Submitted scans are answered from the token alone
+            if token.submitted:
+                return render_landing(request, campaign, SUBMITTED_LANDING_STATE)
             try:
-                scan = ScanTracking.objects.get(id=scan_id, campaign=campaign)
+                scan = ScanTracking.objects.get(id=token.scan_id, campaign_id=campaign.id)
                 
                 # Check if already submitted
-                if scan.form_submitted or request.session.get(f'submitted_{scan_id}'):
-                    context = {
-                        'campaign': campaign,
-                        'client': campaign.client,
-                        'already_submitted': True,
-                        'scan_id': 0,
-                        'show_form': False,
-                        'resume_position': 0
-                    }
-                    return render(request, 'campaign/adv_landing.html', context)
+                if scan.form_submitted:
+                    response = render_landing(request, campaign, SUBMITTED_LANDING_STATE)
+                    return set_scan_cookie(response, campaign, issue_scan_token(campaign.id, scan.id, submitted=True))
             except ScanTracking.DoesNotExist:
-                scan = None
+                # Spooled scans only reach the table once the loader catches up
+                scan = spooled_scan(campaign, token)
         
         # Create new scan if needed
         if not scan:
             # Always create new scan for:
-            # 1. First visit (no session)
+            # 1. First visit (no cookie)
             # 2. Forced new scan
-            # 3. Invalid scan in session
+            # 3. Invalid scan in cookie
+            # Only new rows are rate limited: shed ?new=true loops and
+            # scripted scanners, never reloads of the scan in the cookie
+            if not allow_scan(campaign, device_fingerprint, ip_address):
+                return throttled_landing()
             scan = create_new_scan(
                 campaign=campaign,
                 ip_address=ip_address,
@@ -960,36 +821,11 @@ def adv_landing(request, unique_id):
                 browser=browser,
                 os=os
             )
-            request.session[session_scan_key] = scan.id
-            # Clear any previous submission flag
-            if scan_id:
-                request.session.pop(f'submitted_{scan_id}', None)
-        
-        # Determine if should show form directly (video already watched)
-        show_form = scan.video_completed or scan.video_percentage >= 95
-        resume_position = scan.video_watched if not show_form else 0
         
-        context = {
-            'campaign': campaign,
-            'client': campaign.client,
-            'scan_id': scan.id,
-            'already_submitted': False,
-            'show_form': show_form,
-            'resume_position': resume_position,
-            'scan_time': scan.scanned_at,
-            'device_type': device_type,
-            'browser': browser,
-            'os': os,
-            'messages': messages.get_messages(request),
-            'debug': False  # Set to True for testing
-        }
-        
-        return render(request, 'campaign/adv_landing.html', context)
+        scan_token = issue_scan_token(campaign.id, scan.id)
+        response = render_landing(request, campaign, scan_landing_state(scan, scan_token))
+        return set_scan_cookie(response, campaign, scan_token)
     
-    except AdvCampaign.DoesNotExist:
-        return render(request, 'campaign/invalid_qr.html', {
-            'error': 'Invalid or expired QR code'
-        })
     except Exception as e:
         import traceback
         print(f"Error in adv_landing: {str(e)}")
@@ -999,16 +835,60 @@ def adv_landing(request, unique_id):
         })
 
 
-def create_new_scan(campaign, ip_address, user_agent_string, device_fingerprint, 
+def get_client_ip(request):
+    """
+    Client IP address: REMOTE_ADDR, or behind TRUSTED_PROXY_COUNT proxies the
+    X-Forwarded-For hop the outermost of them added. Hops to the left of it
+    come from the client and are ignored.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR') or '0.0.0.0'
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    if not proxies:
+        return remote_addr
+    hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    return hops[-proxies] if len(hops) >= proxies else remote_addr
+
+
+def get_device_fingerprint(request, user_agent_string, ip_address):
+    """Hash of UA, IP and Accept-Language identifying a device"""
+    fingerprint_data = f"{user_agent_string}_{ip_address}_{request.META.get('HTTP_ACCEPT_LANGUAGE', '')}"
+    return hashlib.md5(fingerprint_data.encode()).hexdigest()
+
+
+# Per-scan values read by the landing page script
+SUBMITTED_LANDING_STATE = {
+    'scan_id': 0,
+    'already_submitted': True,
+    'show_form': False,
+    'resume_position': 0,
+}
+
+
+def scan_landing_state(scan, token):
+    """Landing page state for an active scan; ``token`` signs the progress beacons"""
+    # Determine if should show form directly (video already watched)
+    show_form = scan.video_completed or scan.video_percentage >= 95
+    resume_position = scan.video_watched if not show_form else 0
+
+    return {
+        'scan_id': scan.id,
+        'token': token,
+        'already_submitted': False,
+        'show_form': show_form,
+        'resume_position': resume_position,
+    }
+
+
+def build_new_scan(campaign, ip_address, user_agent_string, device_fingerprint,
                    device_type, browser, os):
-    """Helper function to create new scan record"""
+    """Unsaved scan record for a new visit (campaign may be a CampaignSnapshot)"""
     # Generate unique session ID
     session_id = hashlib.md5(
         f"{ip_address}_{timezone.now().isoformat()}_{user_agent_string}_{os}_{uuid.uuid4()}".encode()
     ).hexdigest()
     
-    scan = ScanTracking.objects.create(
-        campaign=campaign,
+    return ScanTracking(
+        campaign_id=campaign.id,
         ip_address=ip_address,
         user_agent=user_agent_string[:500] if user_agent_string else '',
         device_fingerprint=device_fingerprint,
@@ -1021,62 +901,200 @@ def create_new_scan(campaign, ip_address, user_agent_string, device_fingerprint,
         video_completed=False,
         video_percentage=0
     )
+
+
+@retry_on_lock
+def create_new_scan(campaign, ip_address, user_agent_string, device_fingerprint, 
+                   device_type, browser, os):
+    """Helper function to create new scan record"""
+    scan = build_new_scan(
+        campaign, ip_address, user_agent_string, device_fingerprint,
+        device_type, browser, os
+    )
+    # Ingestion mode: append to the local spool, loaded by load_scan_spool
+    if spool_enabled():
+        return scan_spool.append(scan)
+    scan.save(force_insert=True)
+    return scan
+
+
+@retry_on_lock
+def insert_spooled_scan(campaign, scan_id, ip_address, user_agent_string, device_fingerprint,
+                        device_type, browser, os):
+    """
+    Insert a spooled scan ahead of the loader, under its reserved id, when its
+    form is submitted before the load. The loader then skips its spool line.
+    """
+    scan = build_new_scan(
+        campaign, ip_address, user_agent_string, device_fingerprint,
+        device_type, browser, os
+    )
+    scan.id = scan_id
+    try:
+        scan.save(force_insert=True)
+    except IntegrityError:
+        # The loader inserted it meanwhile
+        scan = ScanTracking.objects.get(id=scan_id, campaign_id=campaign.id)
     return scan
 
 
+FORM_FIELDS = ['user_name', 'user_phone', 'form_submitted', 'form_submitted_at', 'reward_status', 'last_activity']
+
+
+def is_duplicate_phone_error(error):
+    """Whether an IntegrityError comes from the unique_phone_per_campaign constraint"""
+    message = str(error)
+    return 'unique_phone_per_campaign' in message or 'user_phone' in message
+
+
+@retry_on_lock
+def submit_scan_form(scan, name, phone):
+    """
+    Save the reward form on ``scan``; False if the phone is already registered.
+
+    The unique_phone_per_campaign constraint does the enforcement, so there is
+    no window between a check and the write. Numbers the campaign's phone
+    filter has never seen skip the duplicate lookup and go straight to the
+    write.
+    """
+    phones = registered_phones(scan.campaign_id)
+    if phone in phones and ScanTracking.objects.filter(
+        campaign_id=scan.campaign_id,
+        user_phone=phone,
+        form_submitted=True
+    ).exclude(id=scan.id).exists():
+        return False
+
+    scan.user_name = name
+    scan.user_phone = phone
+    scan.form_submitted = True
+    scan.form_submitted_at = timezone.now()
+    try:
+        with transaction.atomic():
+            # Only the form columns, so concurrent progress updates survive
+            scan.save(update_fields=FORM_FIELDS)
+    except IntegrityError as e:
+        if not is_duplicate_phone_error(e):
+            raise
+        phones.add(phone)
+        return False
+
+    phones.add(phone)
+    return True
+
+
+def heartbeat_allowed(request):
+    """Rate limit progress posts by device fingerprint and IP"""
+    ip_address = get_client_ip(request)
+    fingerprint = get_device_fingerprint(request, request.META.get('HTTP_USER_AGENT', ''), ip_address)
+    return allow_heartbeat(fingerprint, ip_address)
+
+
+def throttled_progress(entries):
+    """
+    429 for a throttled heartbeat or beacon batch whose progress is still kept,
+    coalesced into the heartbeat buffer: beacons are never retried, and a lost
+    completion would cost the viewer their reward.
+    """
+    for scan_id, state in entries.items():
+        heartbeat_buffer.record(scan_id, *state)
+    return throttled_heartbeat()
+
+
+@login_required
+def rate_limit_stats(request):
+    """Allowed / shed counts of the public endpoint rate limiter (this worker)"""
+    return JsonResponse(rate_limit.stats())
+
+
+def parse_progress(data):
+    """(video_duration, watched_seconds, completed) from a heartbeat payload"""
+    return (
+        int(data.get('video_duration') or 0),
+        int(data.get('watched_seconds') or 0),
+        bool(data.get('completed', False)),
+    )
+
+
+def verified_scan_id(data):
+    """
+    Scan id a progress payload may write to, checked against its signed token.
+
+    Returns 0 for payloads without a scan (nothing to track) and None when the
+    token is missing, forged, expired or doesn't match ``scan_id``.
+    """
+    token = data.get('token')
+    scan_id = data.get('scan_id')
+    if not token:
+        return 0 if not scan_id else None
+    scan = read_scan_token(token)
+    if scan is None or (scan_id and int(scan_id) != scan.scan_id):
+        return None
+    return scan.scan_id
+
+
+INVALID_TOKEN_RESPONSE = {
+    'status': 'error',
+    'message': 'Invalid scan token'
+}
+
+
+def tracked_values(row):
+    """JSON-friendly progress values from an apply_progress() row"""
+    return {
+        'duration': row['video_duration'],
+        'watched': row['video_watched'],
+        'percentage': float(row['video_percentage']),
+        'completed': row['video_completed']
+    }
+
+
 @csrf_exempt
 def track_video_progress(request):
     """AJAX endpoint for video progress tracking"""
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            scan_id = data.get('scan_id')
+            scan_id = verified_scan_id(data)
             
+            # Reject forged scan ids before touching the database
+            if scan_id is None:
+                return JsonResponse(INVALID_TOKEN_RESPONSE, status=403)
+
             # Skip tracking if no valid scan_id
-            if not scan_id or scan_id == 0:
+            if not scan_id:
                 return JsonResponse({'status': 'skipped'})
-            
-            try:
-                scan = ScanTracking.objects.get(id=scan_id)
-            except ScanTracking.DoesNotExist:
+
+            video_duration, watched_seconds, completed = parse_progress(data)
+
+            if not heartbeat_allowed(request):
+                return throttled_progress({scan_id: (watched_seconds, video_duration, completed)})
+
+            # Write-behind mode: coalesce in memory, flushed in batches
+            if getattr(settings, 'HEARTBEAT_BUFFER_ENABLED', False):
+                tracked = heartbeat_buffer.record(
+                    scan_id, watched_seconds, video_duration, completed
+                )
+                return JsonResponse({
+                    'status': 'success',
+                    'buffered': True,
+                    'tracked': tracked
+                })
+
+            # Single UPDATE ... RETURNING, no read-modify-write
+            tracked = apply_progress(scan_id, watched_seconds, video_duration, completed)
+            if tracked is None and spool_progress(scan_id, watched_seconds, video_duration, completed):
+                # Signed but not loaded yet: the loader replays it after the scan
+                return JsonResponse({'status': 'pending'}, status=202)
+            if tracked is None:
                 return JsonResponse({
                     'status': 'error',
                     'message': 'Scan not found'
                 }, status=404)
-            
-            video_duration = data.get('video_duration', 0)
-            watched_seconds = data.get('watched_seconds', 0)
-            completed = data.get('completed', False)
-            
-            # Update video duration if not set
-            if video_duration > 0 and scan.video_duration == 0:
-                scan.video_duration = video_duration
-            
-            # Update watched time (keep maximum)
-            scan.video_watched = max(scan.video_watched, watched_seconds)
-            
-            # Mark as completed
-            if completed:
-                scan.video_completed = True
-                scan.video_watched = scan.video_duration
-            
-            # Calculate percentage
-            if scan.video_duration > 0:
-                scan.video_percentage = round(
-                    min((scan.video_watched / scan.video_duration) * 100, 100), 
-                    2
-                )
-            
-            scan.save()
-            
+
             return JsonResponse({
                 'status': 'success',
-                'tracked': {
-                    'duration': scan.video_duration,
-                    'watched': scan.video_watched,
-                    'percentage': float(scan.video_percentage),
-                    'completed': scan.video_completed
-                }
+                'tracked': tracked_values(tracked)
             })
         
         except Exception as e:
@@ -1091,6 +1109,82 @@ def track_video_progress(request):
     }, status=405)
 
 
+MAX_BATCH_EVENTS = 200
+
+
+def parse_progress_batch(payload):
+    """
+    Coalesce a beacon batch into {scan_id: (watched, duration, completed)}.
+
+    Accepts a list of compact events ``{token, scan_id, t, watched, duration,
+    completed}`` (or ``{"events": [...]}``). Progress only ever moves forward,
+    so events are folded with max/or and their order (``t``) doesn't matter.
+    Returns (entries, rejected) where ``rejected`` counts events whose scan
+    token didn't verify.
+    """
+    events = payload.get('events') if isinstance(payload, dict) else payload
+    if not isinstance(events, list):
+        raise ValueError('Expected a list of progress events')
+    if len(events) > MAX_BATCH_EVENTS:
+        raise ValueError(f'At most {MAX_BATCH_EVENTS} events per batch')
+
+    entries = {}
+    rejected = 0
+    for event in events:
+        scan_id = verified_scan_id(event)
+        if scan_id is None:
+            rejected += 1
+            continue
+        if not scan_id:
+            continue
+        entries[scan_id] = merge_progress(
+            entries.get(scan_id),
+            int(event.get('watched') or 0),
+            int(event.get('duration') or 0),
+            bool(event.get('completed', False)),
+        )
+    return entries, rejected
+
+
+@csrf_exempt
+def track_video_batch(request):
+    """Beacon endpoint: apply a batch of progress events in one transaction"""
+    if request.method != 'POST':
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Method not allowed'
+        }, status=405)
+
+    try:
+        entries, rejected = parse_progress_batch(json.loads(request.body))
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+    if not entries:
+        if rejected:
+            return JsonResponse(INVALID_TOKEN_RESPONSE, status=403)
+        return JsonResponse({'status': 'skipped'})
+
+    if not heartbeat_allowed(request):
+        return throttled_progress(entries)
+
+    if getattr(settings, 'HEARTBEAT_BUFFER_ENABLED', False):
+        for scan_id, state in entries.items():
+            heartbeat_buffer.record(scan_id, *state)
+        return JsonResponse({
+            'status': 'success', 'buffered': True, 'scans': len(entries), 'rejected': rejected
+        })
+
+    updated = apply_progress_batch(entries)
+    if updated < len(entries):
+        # Scans still in the spool: the loader replays their progress
+        spool_unloaded_progress(entries)
+    return JsonResponse({'status': 'success', 'scans': updated, 'rejected': rejected})
+
+
 # ============== EXPORT FUNCTIONALITY ==============
 @login_required
 def export_campaign_data(request, unique_id=None):
@@ -1102,56 +1196,102 @@ def export_campaign_data(request, unique_id=None):
                 campaign = AdvCampaign.objects.get(pk=campaign_id)
             else:
                 campaign = AdvCampaign.objects.get(unique_id=campaign_id)
-            scans = ScanTracking.objects.filter(campaign=campaign)
             filename = f'campaign_{campaign.unique_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
         except AdvCampaign.DoesNotExist:
             messages.error(request, f'Campaign "{campaign_id}" not found.')
             return redirect('sw:report_list')
     else:
-        scans = ScanTracking.objects.all()
         filename = f'all_campaigns_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
     
-    # Create CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    # Write UTF-8 BOM for Excel compatibility
-    response.write('\ufeff')
-    
-    writer = csv.writer(response)
-    
-    # Write headers
-    writer.writerow([
-        'Campaign Name',
-        'Campaign ID',
-        'Scan Date & Time',
-        'Device Type',
-        'Browser',
-        'Operating System',
-        'IP Address',
-        'Video Watch Percentage',
-        'User Name',
-        'User Phone',
-        'Form Submitted'
-    ])
-    
-    # Write data rows
-    for scan in scans.select_related('campaign'):
-        writer.writerow([
-            scan.campaign.camp_name if scan.campaign else 'N/A',
-            scan.campaign.unique_id if scan.campaign else 'N/A',
-            scan.scanned_at.strftime('%Y-%m-%d %H:%M:%S') if scan.scanned_at else '',
-            scan.device_type or 'Unknown',
-            scan.browser or 'Unknown',
-            scan.os or 'Unknown',
-            scan.ip_address or '',
-            f"{scan.video_percentage:.1f}%" if scan.video_percentage else '0%',
-            scan.user_name or '',
-            scan.user_phone or '',
-            'Yes' if scan.form_submitted else 'No'
-        ])
-    
-    return response
+    params = {'campaign': campaign.id} if campaign_id else {}
+    return export_response('scans', params, filename=filename)
+
+
+@login_required
+def export_changes(request, unique_id):
+    """
+    Scans of a campaign changed since ?cursor=, one keyset page at a time, as
+    JSON or (?format=csv) CSV with the next cursor in X-Next-Cursor
+    """
+    campaign = get_object_or_404(AdvCampaign, unique_id=unique_id)
+    try:
+        rows, cursor, has_more = changed_scans(
+            campaign,
+            cursor=request.GET.get('cursor'),
+            limit=request.GET.get('limit'),
+            submitted_only=request.GET.get('submitted') == '1',
+        )
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    if request.GET.get('format') == 'csv':
+        response = streaming_csv_response(
+            f'changes_{campaign.unique_id}.csv', DELTA_FIELDS,
+            ([row[field] for field in DELTA_FIELDS] for row in rows), bom=False,
+        )
+        response['X-Next-Cursor'] = cursor
+        response['X-Has-More'] = '1' if has_more else '0'
+        return response
+
+    return JsonResponse({'results': rows, 'next_cursor': cursor, 'has_more': has_more})
+
+
+@login_required
+def start_export_job(request):
+    """Queue a scan or reward export for run_export_jobs; returns the job to poll"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'POST required'}, status=405)
+
+    export = request.POST.get('export')
+    campaign = None
+    if request.POST.get('campaign'):
+        try:
+            campaign_id = int(request.POST['campaign'])
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid campaign'}, status=400)
+        campaign = AdvCampaign.objects.filter(pk=campaign_id).first()
+        if campaign is None:
+            return JsonResponse({'status': 'error', 'message': 'Campaign not found'}, status=404)
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if export == 'scans':
+        params = {'campaign': campaign.id} if campaign else {}
+        filename = f'campaign_{campaign.unique_id}_{stamp}.csv' if campaign else f'all_campaigns_{stamp}.csv'
+    elif export == 'rewards' and campaign:
+        params = {'campaign': campaign.id}
+        filename = f'rewards_{campaign.unique_id}_{stamp}.csv'
+    else:
+        return JsonResponse({'status': 'error', 'message': 'Unknown export'}, status=400)
+
+    job = start_job(export, params, filename, user=request.user)
+    return JsonResponse(export_job_payload(job), status=202)
+
+
+def export_job_payload(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'rows_done': job.rows_done,
+        'total_rows': job.total_rows,
+        'progress': job.progress,
+        'error': job.error,
+        'status_url': reverse('sw:export_job_status', args=[job.id]),
+        'download_url': reverse('sw:download_export_job', args=[job.id]) if job.status == 'done' else None,
+    }
+
+
+@login_required
+def export_job_status(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, created_by=request.user)
+    return JsonResponse(export_job_payload(job))
+
+
+@login_required
+def download_export_job(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, created_by=request.user, status='done')
+    if not job.file or not job.file.storage.exists(job.file.name):
+        raise Http404('Export file has expired')
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename)
 
 
 
@@ -1163,22 +1303,8 @@ def export_campaign_data(request, unique_id=None):
 @login_required
 def rewards_list(request):
     """List all campaigns with reward management"""
-    campaigns = AdvCampaign.objects.annotate(
-        total_scans=Count('scans'),
-        total_submissions=Count('scans', filter=Q(scans__form_submitted=True)),
-        pending_rewards=Count('scans', filter=Q(
-            scans__form_submitted=True,
-            scans__reward_status='pending'
-        )),
-        granted_rewards=Count('scans', filter=Q(
-            scans__form_submitted=True,
-            scans__reward_status='granted'
-        )),
-        invalid_rewards=Count('scans', filter=Q(
-            scans__form_submitted=True,
-            scans__reward_status='invalid'
-        ))
-    ).select_related('client').order_by('-created_at')
+    # Scan and reward counts are counter columns on the campaign
+    campaigns = AdvCampaign.objects.select_related('client').order_by('-created_at')
     
     # Search
     search_query = request.GET.get('search', '')
@@ -1237,22 +1363,16 @@ def rewards_detail(request, campaign_id):
             bulk_amount = request.POST.get('bulk_amount')
             
             if scan_ids and new_status:
-                updated = 0
-                for sid in scan_ids:
-                    try:
-                        scan = ScanTracking.objects.get(id=sid, campaign=campaign)
-                        scan.reward_status = new_status
-                        
-                        if new_status == 'granted' and bulk_amount:
-                            scan.reward_amount = Decimal(bulk_amount)
-                            scan.reward_granted_at = timezone.now()
-                        
-                        scan.save()
-                        updated += 1
-                    except:
-                        continue
-                
-                messages.success(request, f'Updated {updated} records')
+                try:
+                    result = bulk_update_rewards(campaign, scan_ids, new_status, bulk_amount, user=request.user)
+                except ValueError as e:
+                    messages.error(request, str(e))
+                else:
+                    messages.success(request, f"Updated {result['updated']} records")
+                    if result['rejected']:
+                        messages.warning(
+                            request, f"{result['rejected']} selected records were not submissions of this campaign"
+                        )
         
         return redirect('sw:rewards_detail', campaign_id=campaign_id)
     
@@ -1275,16 +1395,12 @@ def rewards_detail(request, campaign_id):
             Q(user_phone__icontains=search_query)
         )
     
-    # Calculate statistics
-    total_submissions = submissions.count()
+    # Calculate statistics (one aggregate, cached until a submission or reward changes)
+    counts = cached_report(
+        campaign, 'rewards', lambda: reward_summary(submissions), params=(status_filter, search_query)
+    )
     total_budget = campaign.budget_of_rewards or 0
-    
-    # Calculate amounts
-    granted_amount = submissions.filter(
-        reward_status='granted'
-    ).aggregate(
-        total=Sum('reward_amount')
-    )['total'] or Decimal('0')
+    granted_amount = counts['granted_amount']
     
     remaining_budget = total_budget - granted_amount
     
@@ -1294,15 +1410,15 @@ def rewards_detail(request, campaign_id):
         budget_percentage = min((float(granted_amount) / float(total_budget)) * 100, 100)
     
     stats = {
-        'total_scans': campaign.scans.count(),
-        'total_submissions': total_submissions,
-        'pending': submissions.filter(reward_status='pending').count(),
-        'granted': submissions.filter(reward_status='granted').count(),
-        'invalid': submissions.filter(reward_status='invalid').count(),
+        'total_scans': campaign.total_scans,
+        'total_submissions': counts['total'],
+        'pending': counts['pending'],
+        'granted': counts['granted'],
+        'invalid': counts['invalid'],
         'total_budget': total_budget,
         'granted_amount': granted_amount,
         'remaining_budget': remaining_budget,
-        'avg_reward': granted_amount / submissions.filter(reward_status='granted').count() if submissions.filter(reward_status='granted').count() > 0 else 0,
+        'avg_reward': granted_amount / counts['granted'] if counts['granted'] > 0 else 0,
         'budget_percentage': round(budget_percentage, 1),
     }
     
@@ -1328,43 +1444,8 @@ def export_rewards(request, campaign_id):
     """Export reward data to CSV"""
     campaign = get_object_or_404(AdvCampaign, id=campaign_id)
     
-    response = HttpResponse(content_type='text/csv')
     filename = f'rewards_{campaign.unique_id}_{timezone.now().strftime("%Y%m%d")}.csv'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    # Write UTF-8 BOM
-    response.write('\ufeff')
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Date Submitted',
-        'Name',
-        'Phone',
-        'Video Watched %',
-        'Reward Status',
-        'Reward Amount',
-        'Granted Date',
-        'Notes'
-    ])
-    
-    submissions = ScanTracking.objects.filter(
-        campaign=campaign,
-        form_submitted=True
-    ).order_by('-form_submitted_at')
-    
-    for sub in submissions:
-        writer.writerow([
-            sub.form_submitted_at.strftime('%Y-%m-%d %H:%M') if sub.form_submitted_at else '',
-            sub.user_name,
-            sub.user_phone,
-            f"{sub.video_percentage:.1f}%",
-            sub.get_reward_status_display() if hasattr(sub, 'get_reward_status_display') else sub.reward_status,
-            sub.reward_amount if sub.reward_amount else '',
-            sub.reward_granted_at.strftime('%Y-%m-%d %H:%M') if sub.reward_granted_at else '',
-            sub.reward_notes if sub.reward_notes else ''
-        ])
-    
-    return response
+    return export_response('rewards', {'campaign': campaign.id}, filename=filename)
 
 
 
@@ -1429,18 +1510,7 @@ def manufacturer_list(request):
     search_query = request.GET.get('search', '')
     status_filter = request.GET.get('status', '')
     
-    if search_query:
-        manufacturers = manufacturers.filter(
-            Q(name__icontains=search_query) |
-            Q(contact_person__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(city__icontains=search_query)
-        )
-    
-    if status_filter == 'active':
-        manufacturers = manufacturers.filter(is_active=True)
-    elif status_filter == 'inactive':
-        manufacturers = manufacturers.filter(is_active=False)
+    manufacturers = filter_manufacturers(manufacturers, request.GET)
     
     # Pagination
     paginator = Paginator(manufacturers, 20)
@@ -1562,21 +1632,7 @@ def order_list(request):
     status_filter = request.GET.get('status', '')
     priority_filter = request.GET.get('priority', '')
     
-    if search_query:
-        orders = orders.filter(
-            Q(order_number__icontains=search_query) |
-            Q(product_name__icontains=search_query) |
-            Q(manufacturer__name__icontains=search_query)
-        )
-    
-    if manufacturer_id:
-        orders = orders.filter(manufacturer_id=manufacturer_id)
-    
-    if status_filter:
-        orders = orders.filter(status=status_filter)
-    
-    if priority_filter:
-        orders = orders.filter(priority=priority_filter)
+    orders = filter_orders(orders, request.GET)
     
     # Get manufacturers for dropdown
     manufacturers = Manufacturer.objects.filter(is_active=True).order_by('name')
@@ -1677,15 +1733,7 @@ def supplier_list(request):
     search_query = request.GET.get('search', '')
     type_filter = request.GET.get('type', '')
     
-    if search_query:
-        suppliers = suppliers.filter(
-            Q(name__icontains=search_query) |
-            Q(contact_person__icontains=search_query) |
-            Q(city__icontains=search_query)
-        )
-    
-    if type_filter:
-        suppliers = suppliers.filter(supplier_type=type_filter)
+    suppliers = filter_suppliers(suppliers, request.GET)
     
     # Statistics by type
     type_stats = {}
@@ -1786,18 +1834,7 @@ def supply_list(request):
     supplier_id = request.GET.get('supplier', '')
     status_filter = request.GET.get('status', '')
     
-    if search_query:
-        supplies = supplies.filter(
-            Q(supply_number__icontains=search_query) |
-            Q(product_name__icontains=search_query) |
-            Q(supplier__name__icontains=search_query)
-        )
-    
-    if supplier_id:
-        supplies = supplies.filter(supplier_id=supplier_id)
-    
-    if status_filter:
-        supplies = supplies.filter(status=status_filter)
+    supplies = filter_supplies(supplies, request.GET)
     
     # Get suppliers for dropdown
     suppliers = Supplier.objects.filter(is_active=True).order_by('name')
@@ -74,13 +74,45 @@ TEMPLATES = [
 # -------------------------
 # Database
 # -------------------------
+# SOCIALZ_DB_PROFILE=basic restores the stock SQLite settings (rollback
+# journal, Python's 5 s busy timeout, a new connection per request).
+SQLITE_PROFILES = {
+    'basic': {},
+    'production': {
+        'OPTIONS': {
+            # Runs on every new connection; WAL lets dashboard reads proceed
+            # while a scan is being written
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-65536;'      # 64 MB page cache
+                'PRAGMA mmap_size=268435456;'    # 256 MB memory-mapped reads
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            # Take the write lock at BEGIN so writers queue on the busy
+            # timeout instead of failing when upgrading a read lock
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 10,  # busy_timeout, seconds
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+DB_PROFILE = os.environ.get('SOCIALZ_DB_PROFILE', 'production')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **SQLITE_PROFILES[DB_PROFILE],
     }
 }
 
+# Write paths retry "database is locked" errors this many times, sleeping a
+# random 0..DB_LOCK_RETRY_DELAY * 2**attempt seconds in between
+DB_LOCK_RETRIES = 3 if DB_PROFILE == 'production' else 0
+DB_LOCK_RETRY_DELAY = 0.05
+
 # -------------------------
 # Password validation
 # -------------------------
@@ -141,6 +173,113 @@ CSRF_COOKIE_SECURE = False     # True only if HTTPS
 X_FRAME_OPTIONS = 'DENY'
 
 
+# -------------------------
+# Video heartbeat buffering
+# -------------------------
+# When enabled, track_video_progress coalesces heartbeats in memory and
+# flushes them in batched UPDATEs. HEARTBEAT_FLUSH_INTERVAL (seconds) bounds
+# how much progress can be lost if a worker dies without a clean shutdown.
+# HEARTBEAT_MAX_PENDING caps the scans held per worker (also while flushes
+# fail); beyond it the longest-buffered scans are shed and logged.
+HEARTBEAT_BUFFER_ENABLED = False
+HEARTBEAT_FLUSH_INTERVAL = 5
+HEARTBEAT_MAX_PENDING = 5000
+
+# -------------------------
+# Landing page campaign cache
+# -------------------------
+# Per-worker snapshot cache used by adv_landing. Signals drop entries in the
+# worker that made the change; the TTLs bound staleness in the other workers.
+CAMPAIGN_CACHE_TTL = 300
+CAMPAIGN_CACHE_NEGATIVE_TTL = 60
+
+# -------------------------
+# Report cache
+# -------------------------
+# report_detail / rewards_detail metrics are cached per campaign data
+# generation, bumped by every scan, submission and reward change. A stale
+# tolerance > 0 lets reports lag scan/progress changes by that many seconds
+# during spikes; submissions and reward changes always refresh them.
+REPORT_CACHE_ENABLED = True
+REPORT_CACHE_TTL = 3600
+REPORT_CACHE_STALE_SECONDS = 0
+# Returning-device cohorts read every device's history (about a second per
+# 100k scans on SQLite, see benchmark_cohorts): during a scan burst, serve a
+# result up to this many seconds old instead of recomputing on each load
+COHORT_CACHE_STALE_SECONDS = 300
+
+# -------------------------
+# CSV exports
+# -------------------------
+# Rows fetched per server-side cursor round trip and encoded per streamed chunk.
+EXPORT_CHUNK_SIZE = 2000
+# Background exports (`manage.py run_export_jobs --interval 5`) are written to
+# EXPORT_JOB_ROOT and deleted EXPORT_JOB_TTL seconds after they finish. They
+# hold phone numbers: keep the directory outside MEDIA_ROOT and any web root.
+EXPORT_JOB_ROOT = BASE_DIR / 'private' / 'exports'
+EXPORT_JOB_TTL = 60 * 60 * 24
+# A job still running this many seconds after it was claimed is failed as
+# stalled (its worker died); keep it above the longest expected export.
+EXPORT_JOB_TIMEOUT = 60 * 60
+# Delta export (export/changes/<campaign>/?cursor=): rows per keyset page.
+# Pages follow the commit-ordered ScanTracking.change_seq, so no change is
+# held back or skipped however long its transaction ran.
+DELTA_EXPORT_PAGE_SIZE = 1000
+DELTA_EXPORT_MAX_PAGE_SIZE = 5000
+
+# -------------------------
+# Async public endpoints
+# -------------------------
+# Route adv_landing / track_video_progress to campaign.async_views. Enable
+# when serving through socialz.asgi (uvicorn/daphne); keep off under WSGI.
+ASYNC_PUBLIC_VIEWS = False
+
+# -------------------------
+# Scan tokens
+# -------------------------
+# Lifetime (seconds) of the signed scan cookie that replaces the per-scanner
+# Django session on the QR landing page.
+SCAN_TOKEN_MAX_AGE = 60 * 60 * 24 * 14
+
+# -------------------------
+# Scan spool (launch spikes)
+# -------------------------
+# When enabled, new scans are appended to local spool segments and inserted
+# by `manage.py load_scan_spool --interval 1` instead of one INSERT per scan.
+# The loader also batches the campaign counter / hourly rollup writes that a
+# direct insert makes per scan (see campaign/rollups.py).
+# Check the loader lag with `manage.py load_scan_spool --status`. Needs
+# SQLite or PostgreSQL (reserved ids); ignored with a warning elsewhere.
+SCAN_SPOOL_ENABLED = False
+SCAN_SPOOL_DIR = BASE_DIR / 'spool' / 'scans'
+SCAN_SPOOL_FSYNC_INTERVAL = 0.2
+SCAN_SPOOL_SEGMENT_BYTES = 4 * 1024 * 1024
+SCAN_SPOOL_SEGMENT_SECONDS = 10
+SCAN_SPOOL_ID_BLOCK = 500
+# Heartbeats of scans not loaded yet are spooled and replayed by the loader;
+# ones whose scan is still missing after this many seconds are dropped.
+SCAN_SPOOL_PROGRESS_MAX_AGE = 60 * 60
+
+# -------------------------
+# Scan-storm protection
+# -------------------------
+# In-memory token buckets per device fingerprint and per IP, as
+# (requests per minute, burst). Landing limits only charge new scans (not
+# reloads of the scan in the cookie) and can be overridden per campaign
+# unique_id, e.g. 'AC_XYZ_12345': {'fingerprint': (4, 10), 'ip': (120, 300)}.
+# Size the IP limit for venues behind carrier NAT, where a whole crowd scans
+# from one IP. Throttled heartbeats are buffered, not dropped.
+# Shed counts: /sw/rate-limits/ (per worker).
+SCAN_RATE_LIMIT_ENABLED = True
+SCAN_RATE_LIMITS = {
+    'default': {'fingerprint': (10, 20), 'ip': (600, 1200)},
+}
+HEARTBEAT_RATE_LIMITS = {'fingerprint': (30, 30), 'ip': (600, 600)}
+# Reverse proxies in front of the app that append to X-Forwarded-For (1 behind
+# a single nginx). 0 uses REMOTE_ADDR and ignores the header, which clients
+# can set to anything.
+TRUSTED_PROXY_COUNT = 0
+
 SITE_DOMAIN = 'https://socialzwater.in'
 TIME_ZONE = 'Asia/Kolkata'  # This sets IST as default
 USE_TZ = True
\ No newline at end of file